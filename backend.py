@@ -1,31 +1,128 @@
 import os
 import re
+import sys
+import math
+import random
+import asyncio
 import json
 import uuid
 import time
+import io
 import types
+import pickle
+import tokenize
+import hashlib
+import keyword
+import zlib
+import functools
+import threading
+import multiprocessing
+import multiprocessing.connection
+from abc import ABC, abstractmethod
 import numpy as np
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Dict, Any
-from openai import OpenAI
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Общий LLM-слой лежит в vibecode-backend (в Docker-образ копируется рядом с backend.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "vibecode-backend"))
+from contextlib import aclosing
+from llm_client import llm, EMBEDDING_MODEL, RoutePolicy, json_with_keys
+from stream_json import StreamingJSONExtractor, parse_partial_json
+from task_pool import TaskPool, salvage_task, parse_warm_keys, TASK_POOL_WARM
+from prompt_budget import govern
+from fixtures import get_fixtures
+from result_cache import ResultCache, code_hash, is_stable_result
+from profiling import profile_call, short_repr, collect_summary
+from task_bank import open_task_bank
+from task_producer import TaskProducer
+from sandbox_limits import (TIME_LIMIT_SECONDS, TIME_LIMIT, MEMORY_LIMIT, CRASHED, SKIPPED, LIMIT_ICONS,
+                            apply_test_limits, exit_status, remove_cgroup)
 
 # --- CONFIG ---
-API_URL = "https://llm.t1v.scibox.tech/v1"
-API_KEY = "sk-BWpbCDueGfRzWIW7MCmCaQ"
-
 MODEL_TASK = "qwen3-coder-30b-a3b-instruct-fp8"
 MODEL_CHAT = "qwen3-32b-awq"
-
-client = OpenAI(api_key=API_KEY, base_url=API_URL)
+# Маршрутизация по типу вызова: куда уходит hedged-запрос, если основная модель не уложилась
+# в свой p95. Переопределяется LLM_ROUTE_<ТИП>="модель[,модель@alt]" или "off"
+LLM_ROUTES = {
+    "ai_check": RoutePolicy([MODEL_CHAT]),
+    "review": RoutePolicy([MODEL_CHAT]),
+    "complexity": RoutePolicy([MODEL_CHAT]),
+    "efficiency": RoutePolicy([MODEL_CHAT]),
+    "explanation": RoutePolicy([MODEL_CHAT]),
+    "smart_questions": RoutePolicy([MODEL_CHAT]),
+    "help": RoutePolicy([MODEL_TASK]),
+    "chat": RoutePolicy([MODEL_TASK]),
+}
+llm.configure_routes(LLM_ROUTES)
+
+# Лимиты на один тест в режиме parallel — в sandbox_limits.py, общие с InterviewEngine
+# parallel — каждый тест в своем процессе со своими лимитами, inline — exec в процессе сервера
+RUNNER_MODE = os.getenv("RUNNER_MODE", "parallel")
+RUNNER_PARALLELISM = int(os.getenv("RUNNER_PARALLELISM", str(os.cpu_count() or 1)))
+
+# Очередь песочницы: сколько прогонов идет одновременно, сколько ждут и сколько живет задание
+SANDBOX_MAX_CONCURRENCY = int(os.getenv("SANDBOX_MAX_CONCURRENCY", str(os.cpu_count() or 1)))
+SANDBOX_QUEUE_SIZE = int(os.getenv("SANDBOX_QUEUE_SIZE", "32"))
+SANDBOX_JOB_DEADLINE_SECONDS = float(os.getenv("SANDBOX_JOB_DEADLINE_SECONDS", "30"))
+
+# Кэш эмбеддингов по хэшу текста: размер LRU и каталог memmap-хранилища (пусто — только память)
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "")
+
+# Схожесть с эталоном: embedding — косинус эмбеддингов, при сбое сети локальные отпечатки;
+# local — только локальные отпечатки кода (без сети)
+SIMILARITY_MODE = os.getenv("SIMILARITY_MODE", "embedding")
+# Отпечатки: длина k-граммы токенов, окно winnowing и число хэш-функций MinHash
+SIMILARITY_KGRAM = 5
+SIMILARITY_WINDOW = 4
+SIMILARITY_NUM_HASHES = 128
+
+# Эмпирическая оценка сложности: размеры входа, бюджет на замер и порог доверия к результату
+COMPLEXITY_SIZES = [2 ** k for k in range(4, 15)]
+# Для int-аргументов сначала идут мелкие шаги: экспоненту видно только на малых n
+COMPLEXITY_INT_SIZES = list(range(4, 33, 2)) + [2 ** k for k in range(6, 15)]
+COMPLEXITY_BUDGET_SECONDS = 4.0
+COMPLEXITY_MAX_CALL_SECONDS = 0.5
+COMPLEXITY_MIN_CONFIDENCE = 0.6
+# Допуск по относительной ошибке, в пределах которого выбираем более простой класс
+COMPLEXITY_TOLERANCE = 0.05
+# Меньшие n тонут в накладных расходах вызова: при достатке замеров в подгонку не идут
+COMPLEXITY_MIN_N = 64
+# Быстрые вызовы меряются пачкой копий входа: не больше стольких вызовов и байт pickle на пачку
+COMPLEXITY_MAX_BATCH = 1000
+COMPLEXITY_BATCH_BYTES = 4 * 1024 * 1024
+# Сколько секунд замеряем одну точку (минимум один прогон)
+COMPLEXITY_POINT_SECONDS = 0.02
+# Время выросло от малых n к большим меньше чем во столько раз — считаем его постоянным
+# (log n на размерах от 64 до 16384 дает рост около 2.3)
+COMPLEXITY_FLAT_RATIO = 1.5
+
+# Таймауты стадий сдачи раунда (секунды); по таймауту стадия отдает запасной результат
+ROUND_STAGE_TIMEOUTS = {
+    "review": float(os.getenv("ROUND_REVIEW_TIMEOUT", "30")),
+    "ai_check": float(os.getenv("ROUND_AI_CHECK_TIMEOUT", "20")),
+    "similarity": float(os.getenv("ROUND_SIMILARITY_TIMEOUT", "15")),
+    "smart_questions": float(os.getenv("ROUND_SMART_QUESTIONS_TIMEOUT", "30")),
+}
+
+# Сессии: хранилище, сколько живет простаивающая сессия (секунды) и сколько сессий держать всего
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "7200"))
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "10000"))
+# Сколько последних раундов хранить в истории сессии (компактные записи, без отчета)
+SESSION_HISTORY_LIMIT = int(os.getenv("SESSION_HISTORY_LIMIT", "50"))
+# Полные отчеты раундов — append-only JSONL; пустая строка — отчеты не сохраняются
+REPORT_LOG_PATH = os.getenv("REPORT_LOG_PATH", "round_reports.jsonl")
 
 app = FastAPI()
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"],
                    allow_headers=["*"])
 
-sessions = {}
-
 
 # --- MODELS ---
 class StartRequest(BaseModel):
@@ -37,6 +134,7 @@ class RunCodeRequest(BaseModel):
     session_id: str
     code: str
     type: str = "public"
+    fail_fast: bool = False
 
 
 class HelpRequest(BaseModel):
@@ -62,15 +160,8 @@ def parse_json(content):
     try:
         return json.loads(match.group(0)) if match else json.loads(clean)
     except:
-        return {}
-
-
-def get_embedding(text):
-    try:
-        resp = client.embeddings.create(model="text-embedding-3-small", input=text)
-        return np.array(resp.data[0].embedding)
-    except:
-        return None
+        # Битый или оборванный JSON: забираем хотя бы готовые поля
+        return parse_partial_json(clean)
 
 
 def cosine_similarity(a, b):
@@ -79,12 +170,19 @@ def cosine_similarity(a, b):
 
 
 # --- AI FUNCS ---
+# Версии промптов для кэша ответов LLM: поменяли текст промпта — поднимите версию
+PROMPT_VERSION_AI_CHECK = "ai_check/1"
+PROMPT_VERSION_REVIEW = "review/1"
+PROMPT_VERSION_EFFICIENCY = "efficiency/1"
+
 PROMPT_GENERATOR = """Вы — Старший Технический Архитектор Интервью. Сгенерируйте задачу по программированию в строгом формате JSON.
 
 ПРАВИЛА:
 1. Тема/Сложность: следуйте запросу пользователя.
 2. Эталонное решение: предоставьте оптимальное решение.
 3. Тесты: public_tests (2 простых), hidden_tests (3 граничных случая).
+4. "input" и "expected" — только литералы Python: числа, строки, списки, словари, True/False/None.
+   Никаких выражений и вызовов: пишите 1000000000, а не 10**9, и "aaaa", а не 'a'*4.
 
 ВАЖНЫЕ ЯЗЫКОВЫЕ ПРАВИЛА:
 - Ключи JSON на английском (например, "title").
@@ -103,45 +201,76 @@ JSON СХЕМА:
 }"""
 
 
-def generate_task_ai(level, topic):
+async def generate_task_ai_stream(level, topic):
+    """
+    Генерация задачи потоком: field на каждое готовое поле, затем task с итоговым объектом.
+    Поток модели обрывается на закрывающей скобке; оборванный ответ дает частичную задачу.
+    """
+    extractor = StreamingJSONExtractor()
     try:
-        resp = client.chat.completions.create(
-            model=MODEL_TASK,
-            messages=[
-                {"role": "system", "content": PROMPT_GENERATOR},
-                {"role": "user", "content": f"Создай задачу уровня {level} по теме {topic}"}
-            ],
-            temperature=0.9,
-            max_tokens=1500
-        )
-        return parse_json(resp.choices[0].message.content)
-    except:
-        return None
+        async with aclosing(llm.chat_visible_stream(
+                MODEL_TASK,
+                [
+                    {"role": "system", "content": PROMPT_GENERATOR},
+                    {"role": "user", "content": f"Создай задачу уровня {level} по теме {topic}"}
+                ],
+                call_type="task",
+                temperature=0.9,
+                max_tokens=1500
+        )) as tokens:
+            async for text in tokens:
+                for key, value in extractor.feed(text):
+                    yield {"event": "field", "key": key, "value": value}
+                if extractor.done:
+                    break
+    except Exception as e:
+        print(f"Task generation error: {e}")
+    task = salvage_task(extractor.partial())
+    yield {"event": "task", "task": task or None}
 
 
-def ask_help_ai(task_title, task_desc, question):
+def help_messages(task_title, task_desc, question):
+    p = govern("help", text_fields={"task_desc": task_desc, "question": question})
     sys = f"""ВАЖНО: Вы — Сократический Ментор.
 Задача: {task_title}
-Описание: {task_desc}
-Вопрос пользователя: {question}
+Описание: {p['task_desc']}
+Вопрос пользователя: {p['question']}
 
 ПРАВИЛА:
 1. Отвечайте на РУССКОМ языке.
 2. Давайте ПОДСКАЗКУ, НЕ пишите готовое решение.
 3. Будьте кратким."""
+    return [{"role": "user", "content": sys}]
+
+
+async def ask_help_ai(task_title, task_desc, question):
     try:
-        resp = client.chat.completions.create(model=MODEL_CHAT, messages=[{"role": "user", "content": sys}],
-                                              max_tokens=500, temperature=0.6)
-        return clean_text(resp.choices[0].message.content)
-    except:
+        content = await llm.chat(MODEL_CHAT, help_messages(task_title, task_desc, question),
+                                 call_type="help", max_tokens=500, temperature=0.6)
+        return clean_text(content)
+    except Exception:
         return "AI не доступен."
 
 
-def check_ai_generated(code):
+async def ask_help_ai_stream(task_title, task_desc, question):
+    """Подсказка по токенам, без рассуждений <think>."""
+    sent = False
+    try:
+        async for text in llm.chat_visible_stream(MODEL_CHAT, help_messages(task_title, task_desc, question),
+                                                  call_type="help", max_tokens=500, temperature=0.6):
+            sent = True
+            yield text
+    except Exception:
+        if not sent:
+            yield "AI не доступен."
+
+
+async def check_ai_generated(code):
+    p = govern("ai_check", code_fields={"code": code})
     sys = f"""Проверьте, был ли этот код сгенерирован AI (ChatGPT, Copilot и т.д.).
 
 Код:
-{code}
+{p['code']}
 
 Верните JSON:
 {{
@@ -150,14 +279,16 @@ def check_ai_generated(code):
   "reason": "Объяснение на русском"
 }}"""
     try:
-        resp = client.chat.completions.create(model=MODEL_TASK, messages=[{"role": "user", "content": sys}],
-                                              temperature=0.1)
-        return parse_json(resp.choices[0].message.content)
-    except:
+        content = await llm.chat_cached(MODEL_TASK, [{"role": "user", "content": sys}],
+                                        PROMPT_VERSION_AI_CHECK, code_hash(code), call_type="ai_check",
+                                        accept=json_with_keys("is_ai_generated", "confidence_score"),
+                                        temperature=0.1)
+        return parse_json(content)
+    except Exception:
         return {"is_ai_generated": False, "confidence_score": 0}
 
 
-def review_code_ai(task, code):
+async def review_code_ai(task, code):
     sys = """Вы — Главный Инженер. Проведите Code Review.
 
 Верните JSON:
@@ -165,21 +296,41 @@ def review_code_ai(task, code):
   "score": 0-100,
   "feedback": "Конструктивный фидбек на РУССКОМ языке"
 }"""
-    user = f"Задача: {task.get('title')}\n\nКод:\n{code}"
+    p = govern("review", code_fields={"code": code})
+    user = f"Задача: {task.get('title')}\n\nКод:\n{p['code']}"
     try:
-        resp = client.chat.completions.create(model=MODEL_TASK, messages=[{"role": "system", "content": sys},
-                                                                          {"role": "user", "content": user}],
-                                              temperature=0.2)
-        return parse_json(resp.choices[0].message.content)
-    except:
+        content = await llm.chat_cached(MODEL_TASK, [{"role": "system", "content": sys},
+                                                     {"role": "user", "content": user}],
+                                        PROMPT_VERSION_REVIEW, f"{task.get('title')}\0{code_hash(code)}",
+                                        call_type="review", accept=json_with_keys("score", "feedback"),
+                                        temperature=0.2)
+        return parse_json(content)
+    except Exception:
         return {"score": 70, "feedback": "Ошибка оценки"}
 
 
-def analyze_efficiency_ai(code):
+async def explain_complexity_ai(code, complexity):
+    p = govern("complexity", code_fields={"code": code})
+    sys = f"""Замеры времени показали, что сложность этого кода {complexity}.
+
+Код:
+{p['code']}
+
+Коротко объясните на русском, какие части кода дают такую сложность."""
+    try:
+        content = await llm.chat(MODEL_TASK, [{"role": "user", "content": sys}],
+                                 call_type="complexity", temperature=0.1, max_tokens=300)
+        return clean_text(content)
+    except Exception:
+        return ""
+
+
+async def analyze_efficiency_ai(code):
+    p = govern("efficiency", code_fields={"code": code})
     sys = f"""Проанализируйте временную сложность алгоритма.
 
 Код:
-{code}
+{p['code']}
 
 Верните JSON:
 {{
@@ -187,21 +338,24 @@ def analyze_efficiency_ai(code):
   "explanation": "Объяснение на русском"
 }}"""
     try:
-        resp = client.chat.completions.create(model=MODEL_TASK, messages=[{"role": "user", "content": sys}],
-                                              temperature=0.1)
-        return parse_json(resp.choices[0].message.content)
-    except:
+        content = await llm.chat_cached(MODEL_TASK, [{"role": "user", "content": sys}],
+                                        PROMPT_VERSION_EFFICIENCY, code_hash(code), call_type="efficiency",
+                                        accept=json_with_keys("time_complexity", "explanation"),
+                                        temperature=0.1)
+        return parse_json(content)
+    except Exception:
         return {"time_complexity": "Unknown", "explanation": ""}
 
 
-def evaluate_explanation_ai(explanation, code):
+async def evaluate_explanation_ai(explanation, code):
+    p = govern("explanation", code_fields={"code": code}, text_fields={"explanation": explanation})
     sys = f"""Вы — HR Tech Lead. Оцените качество объяснения кандидата.
 
 Код:
-{code}
+{p['code']}
 
 Объяснение кандидата:
-{explanation}
+{p['explanation']}
 
 Верните JSON:
 {{
@@ -210,105 +364,1040 @@ def evaluate_explanation_ai(explanation, code):
   "feedback": "Комментарий на русском"
 }}"""
     try:
-        resp = client.chat.completions.create(model=MODEL_TASK, messages=[{"role": "user", "content": sys}],
-                                              temperature=0.3)
-        return parse_json(resp.choices[0].message.content)
-    except:
+        content = await llm.chat(MODEL_TASK, [{"role": "user", "content": sys}],
+                                 call_type="explanation", temperature=0.3)
+        return parse_json(content)
+    except Exception:
         return {"clarity_score": 5, "technical_score": 5, "feedback": "OK"}
 
 
-def generate_smart_questions_ai(user_code, ref_code, sim):
+async def generate_smart_questions_ai(user_code, ref_code, sim):
+    p = govern("smart_questions", code_fields={"user_code": user_code, "ref_code": ref_code})
     sys = f"""Сравните код пользователя с эталонным решением.
 Схожесть: {sim:.0%}
 
 Код пользователя:
-{user_code}
+{p['user_code']}
 
 Эталонное решение:
-{ref_code}
+{p['ref_code']}
 
 Сгенерируйте 2 уточняющих вопроса на РУССКОМ языке для проверки понимания."""
     try:
-        resp = client.chat.completions.create(model=MODEL_TASK, messages=[{"role": "user", "content": sys}],
-                                              temperature=0.6)
-        return clean_text(resp.choices[0].message.content)
-    except:
+        content = await llm.chat(MODEL_TASK, [{"role": "user", "content": sys}],
+                                 call_type="smart_questions", temperature=0.6)
+        return clean_text(content)
+    except Exception:
         return "Вопросы не сгенерированы."
 
 
-def respond_to_candidate_ai(q, a):
+async def respond_to_candidate_ai(q, a):
+    p = govern("chat", text_fields={"question": q, "answer": a})
     sys = f"""Вы — AI Интервьюер. Дайте короткую реакцию на ответ кандидата.
 
-Вопрос: {q}
-Ответ кандидата: {a}
+Вопрос: {p['question']}
+Ответ кандидата: {p['answer']}
 
 Дайте короткий фидбек/реакцию на РУССКОМ языке."""
     try:
-        resp = client.chat.completions.create(model=MODEL_CHAT, messages=[{"role": "user", "content": sys}],
-                                              temperature=0.5)
-        return clean_text(resp.choices[0].message.content)
-    except:
+        content = await llm.chat(MODEL_CHAT, [{"role": "user", "content": sys}],
+                                 call_type="chat", temperature=0.5)
+        return clean_text(content)
+    except Exception:
         return "Хорошо."
 
 
 # --- CODE EXEC ---
-def run_test_suite(code, test_cases):
+def load_solution(code):
+    safe_globals = {"__builtins__": __builtins__}
+    local_scope = {}
+    exec(code, safe_globals, local_scope)
+
+    user_func = local_scope.get('solution')
+    if not user_func:
+        for v in local_scope.values():
+            if isinstance(v, types.FunctionType):
+                user_func = v
+                break
+    if not user_func:
+        raise Exception("Функция solution не найдена")
+    return user_func
+
+
+def run_single_test(user_func, fixture, i):
+    """Возвращает (passed, log, entry), entry — статус и метрики теста."""
+    entry = {"test": i + 1}
+    try:
+        # Каждый запуск получает свою копию аргументов: решение может менять их на месте
+        parsed = pickle.loads(fixture)
+        if isinstance(parsed, Exception):
+            raise parsed
+        args, expected = parsed
+
+        actual = profile_call(user_func, args, entry)
+
+        if str(actual) == str(expected):
+            entry["status"] = "passed"
+            return True, f"✅ Тест {i + 1}: OK ({entry['wall_ms']:.2f}ms)", entry
+        entry["status"] = "failed"
+        entry["diff"] = {"expected": short_repr(expected), "actual": short_repr(actual)}
+        return False, f"❌ Тест {i + 1}: FAIL. Ожидалось: {expected}, Получено: {actual}", entry
+    except MemoryError:
+        raise
+    except Exception as e:
+        entry["status"] = "error"
+        return False, f"⚠️ Тест {i + 1}: Ошибка {e}", entry
+
+
+def iter_test_suite(code, test_cases):
+    """Отдает {"event": "test", ...} после каждого теста и в конце {"event": "summary", "result": ...}."""
     passed = 0
     logs = []
+    tests = []
     try:
-        safe_globals = {"__builtins__": __builtins__}
-        local_scope = {}
-        exec(code, safe_globals, local_scope)
-
-        user_func = local_scope.get('solution')
-        if not user_func:
-            for v in local_scope.values():
-                if isinstance(v, types.FunctionType):
-                    user_func = v
+        fixtures = get_fixtures(test_cases)
+        user_func = load_solution(code)
+    except Exception as e:
+        yield {"event": "summary", "result": {"status": "error", "traceback": str(e), "logs": [str(e)]}}
+        return
+
+    for i, fixture in enumerate(fixtures):
+        ok, log, entry = run_single_test(user_func, fixture, i)
+        passed += ok
+        logs.append(log)
+        tests.append(entry)
+        yield {"event": "test", "log": log, **entry}
+
+    yield {"event": "summary",
+           "result": {"status": "success", "passed": passed, "total": len(test_cases), "logs": logs, "tests": tests}}
+
+
+def run_test_suite(code, test_cases):
+    return collect_summary(iter_test_suite(code, test_cases))
+
+
+# --- SANDBOX ---
+LIMIT_LOGS = {
+    TIME_LIMIT: "Превышен лимит времени",
+    MEMORY_LIMIT: "Превышен лимит памяти",
+    CRASHED: "Процесс упал",
+    SKIPPED: "Пропущен",
+}
+
+
+def _isolated_test_worker(code, fixture, i, conn):
+    apply_test_limits()
+    try:
+        user_func = load_solution(code)
+    except MemoryError:
+        conn.send({"status": MEMORY_LIMIT})
+        return
+    except Exception as e:
+        conn.send({"status": "load_error", "error": str(e)})
+        return
+    try:
+        ok, log, entry = run_single_test(user_func, fixture, i)
+        conn.send({"status": entry["status"], "passed": ok, "log": log, "entry": entry})
+    except MemoryError:
+        conn.send({"status": MEMORY_LIMIT})
+
+
+def _test_outcome(i, r):
+    """(passed, log, entry) для результата теста из дочернего процесса (None — тест не запускался)."""
+    status = r["status"] if r else SKIPPED
+    log = r["log"] if r and "log" in r else f"{LIMIT_ICONS[status]} Тест {i + 1}: {LIMIT_LOGS[status]}"
+    entry = r["entry"] if r and "entry" in r else {"test": i + 1, "status": status}
+    return bool(r and r.get("passed")), log, entry
+
+
+def run_test_suite_parallel(code, test_cases, fail_fast=False):
+    return collect_summary(iter_test_suite_parallel(code, test_cases, fail_fast))
+
+
+def iter_test_suite_parallel(code, test_cases, fail_fast=False):
+    """
+    Раскидывает тесты по процессам (до RUNNER_PARALLELISM одновременно).
+    У каждого теста свой лимит времени и памяти: зависший тест получает TLE,
+    а уже пройденные тесты сохраняются. fail_fast останавливает прогон на первом провале.
+    События тестов отдаются по мере готовности, в порядке завершения.
+    """
+    fixtures = get_fixtures(test_cases)
+    total = len(fixtures)
+    results = [None] * total
+    waiting = list(range(total))
+    running = {}  # conn -> (index, process, deadline)
+    load_error = None
+
+    try:
+        while (waiting or running) and load_error is None:
+            while waiting and len(running) < RUNNER_PARALLELISM:
+                i = waiting.pop(0)
+                parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+                process = multiprocessing.Process(target=_isolated_test_worker,
+                                                  args=(code, fixtures[i], i, child_conn), daemon=True)
+                process.start()
+                child_conn.close()
+                running[parent_conn] = (i, process, time.time() + TIME_LIMIT_SECONDS)
+
+            timeout = max(0.0, min(deadline for _, _, deadline in running.values()) - time.time())
+            for conn in multiprocessing.connection.wait(list(running), timeout=timeout):
+                i, process, _ = running.pop(conn)
+                try:
+                    results[i] = conn.recv()
+                except EOFError:
+                    results[i] = {"status": exit_status(process)}
+                conn.close()
+                process.join()
+                remove_cgroup(process.pid)
+                if results[i]["status"] == "load_error":
+                    load_error = results[i]["error"]
                     break
-        if not user_func:
-            raise Exception("Функция solution не найдена")
+                _, log, entry = _test_outcome(i, results[i])
+                yield {"event": "test", "log": log, **entry}
+
+            now = time.time()
+            for conn, (i, process, deadline) in list(running.items()):
+                if now >= deadline:
+                    process.kill()
+                    process.join()
+                    remove_cgroup(process.pid)
+                    conn.close()
+                    del running[conn]
+                    results[i] = {"status": TIME_LIMIT}
+                    _, log, entry = _test_outcome(i, results[i])
+                    yield {"event": "test", "log": log, **entry}
+
+            if fail_fast and any(r is not None and not r.get("passed") for r in results):
+                break
+    finally:
+        for conn, (_, process, _) in running.items():
+            process.kill()
+            process.join()
+            remove_cgroup(process.pid)
+            conn.close()
+
+    if load_error is not None:
+        yield {"event": "summary", "result": {"status": "error", "traceback": load_error, "logs": [load_error]}}
+        return
 
-        for i, t in enumerate(test_cases):
+    passed = 0
+    logs = []
+    tests = []
+    for i, r in enumerate(results):
+        ok, log, entry = _test_outcome(i, r)
+        if r is None:
+            yield {"event": "test", "log": log, **entry}
+        passed += ok
+        logs.append(log)
+        tests.append(entry)
+
+    yield {"event": "summary",
+           "result": {"status": "success", "passed": passed, "total": total, "logs": logs, "tests": tests}}
+
+
+# --- COMPLEXITY ---
+COMPLEXITY_CLASSES = {
+    "O(1)": lambda n: np.ones_like(n),
+    "O(log n)": np.log2,
+    "O(n)": lambda n: n,
+    "O(n log n)": lambda n: n * np.log2(n),
+    "O(n^2)": lambda n: n ** 2,
+    "O(n^3)": lambda n: n ** 3,
+    # Сдвиг на max(n) спасает от переполнения, масштаб уходит в коэффициент
+    "O(2^n)": lambda n: np.exp2(n - n.max()),
+}
+
+
+def scale_value(value, n, rng):
+    """
+    Растягивает список/строку до n случайными элементами из исходного значения.
+    Повтор исходника по кругу не годится: на почти упорядоченных данных сортировка линейна.
+    """
+    if isinstance(value, (list, tuple)) and value:
+        if all(isinstance(x, int) and not isinstance(x, bool) for x in value):
+            # Числа разносим по диапазону шире n, чтобы они почти не повторялись
+            lo, hi = min(value), max(value)
+            scaled = [rng.randint(lo, max(hi, lo + 4 * n)) for _ in range(n)]
+        else:
+            scaled = [rng.choice(value) for _ in range(n)]
+        try:
+            # Отсортированный вход (бинарный поиск и т.п.) остается отсортированным
+            if len(value) > 1 and list(value) == sorted(value):
+                scaled.sort()
+        except TypeError:
+            pass
+        return scaled if isinstance(value, list) else tuple(scaled)
+    if isinstance(value, str) and value:
+        return "".join(rng.choice(value) for _ in range(n))
+    return value
+
+
+def input_families(test_cases):
+    """
+    Строит входы растущего размера из тестов задачи: берет тест с самым большим входом
+    и растягивает списки/строки до n. Если растягивать нечего, n подставляется в int-аргументы.
+    """
+    seeds = []
+    for fixture in get_fixtures(test_cases):
+        parsed = pickle.loads(fixture)
+        if not isinstance(parsed, Exception):
+            seeds.append(parsed[0])
+    if not seeds:
+        return []
+
+    def seed_size(args):
+        return sum(len(a) for a in args if isinstance(a, (list, tuple, str)))
+
+    seed = max(seeds, key=seed_size)
+    if seed_size(seed) > 0:
+        sizes = COMPLEXITY_SIZES
+
+        def build(n):
+            # Фиксированное зерно: один и тот же код на задаче меряется на одних и тех же входах
+            rng = random.Random(n)
+            return tuple(scale_value(a, n, rng) for a in seed)
+    elif any(isinstance(a, int) and not isinstance(a, bool) and a >= 0 for a in seed):
+        sizes = COMPLEXITY_INT_SIZES
+        build = lambda n: tuple(n if isinstance(a, int) and not isinstance(a, bool) and a >= 0 else a for a in seed)
+    else:
+        return []
+    return [(n, pickle.dumps(build(n), protocol=pickle.HIGHEST_PROTOCOL)) for n in sizes]
+
+
+def _best_call_time(user_func, fixture):
+    """
+    Минимальное время одного вызова за несколько прогонов. Быстрые вызовы меряем пачкой:
+    одиночный тонет в разрешении таймера. Решение, которое не меняет вход, гоняем в пачке
+    на одной копии; иначе каждый вызов получает свою, чтобы не работать на уже обработанных данных.
+    """
+    args = pickle.loads(fixture)
+    start = time.perf_counter()
+    deadline = start + COMPLEXITY_POINT_SECONDS
+    user_func(*args)
+    best = time.perf_counter() - start
+    pure = pickle.dumps(args, protocol=pickle.HIGHEST_PROTOCOL) == fixture
+    del args
+
+    batch = 1
+    max_batch = COMPLEXITY_MAX_BATCH if pure else max(1, min(COMPLEXITY_MAX_BATCH, COMPLEXITY_BATCH_BYTES // len(fixture)))
+    while time.perf_counter() < deadline:
+        if best < 1e-4:
+            batch = min(batch * 10, max_batch)
+        copies = [pickle.loads(fixture)] * batch if pure else [pickle.loads(fixture) for _ in range(batch)]
+        start = time.perf_counter()
+        for args in copies:
+            user_func(*args)
+        elapsed = time.perf_counter() - start
+        # Иначе последняя копия прошлой пачки освобождалась бы внутри следующего замера
+        del copies, args
+        best = min(best, elapsed / batch)
+    return best
+
+
+def _complexity_worker(code, families, conn):
+    apply_test_limits()
+    try:
+        user_func = load_solution(code)
+        for n, fixture in families:
+            best = _best_call_time(user_func, fixture)
+            conn.send((n, best))
+            if best > COMPLEXITY_MAX_CALL_SECONDS:
+                break
+    except Exception as e:
+        conn.send(("error", str(e)))
+
+
+def measure_complexity(code, families):
+    parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_complexity_worker, args=(code, families, child_conn), daemon=True)
+    process.start()
+    child_conn.close()
+
+    points = []
+    deadline = time.time() + COMPLEXITY_BUDGET_SECONDS
+    try:
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0 or not parent_conn.poll(remaining):
+                break
             try:
-                inp = str(t["input"]).replace("null", "None").replace("true", "True").replace("false", "False")
-                args = eval(f"({inp})")
-                if not isinstance(args, tuple): args = (args,)
-                exp_str = str(t["expected"]).replace("null", "None").replace("true", "True").replace("false", "False")
-                expected = eval(exp_str)
-
-                start = time.perf_counter()
-                actual = user_func(*args)
-                dur = (time.perf_counter() - start) * 1000
-
-                if str(actual) == str(expected):
-                    passed += 1
-                    logs.append(f"✅ Тест {i + 1}: OK ({dur:.2f}ms)")
-                else:
-                    logs.append(f"❌ Тест {i + 1}: FAIL. Ожидалось: {expected}, Получено: {actual}")
+                n, elapsed = parent_conn.recv()
+            except EOFError:
+                break
+            if n == "error":
+                return None
+            points.append((n, elapsed))
+    finally:
+        process.kill()
+        process.join()
+        remove_cgroup(process.pid)
+        parent_conn.close()
+    return points
+
+
+def fit_complexity(points):
+    """
+    Подбирает класс сложности по замерам: t ≈ a + b * f(n), МНК по относительной ошибке.
+    Более сложный класс всегда ложится не хуже простого, поэтому берем самый простой класс,
+    чья ошибка в пределах COMPLEXITY_TOLERANCE от лучшей. Уверенность выше, когда класс
+    ложится точно, а соседние классы — заметно хуже.
+    """
+    n = np.array([p[0] for p in points], dtype=float)
+    t = np.maximum(np.array([p[1] for p in points], dtype=float), 1e-9)
+    large = n >= COMPLEXITY_MIN_N
+    if large.sum() >= 4:
+        n, t = n[large], t[large]
+
+    # Регрессия охотно натягивает шум постоянного времени на log n, поэтому O(1) — по отношению
+    # времени на больших и малых n
+    k = max(1, len(t) // 3)
+    growth = float(np.median(t[-k:]) / np.median(t[:k]))
+    if growth < COMPLEXITY_FLAT_RATIO:
+        return "O(1)", round(min(1.0, (COMPLEXITY_FLAT_RATIO - growth) / (COMPLEXITY_FLAT_RATIO - 1) + 0.5), 2)
+
+    rms = {}
+    for name, f in COMPLEXITY_CLASSES.items():
+        if name == "O(2^n)" and n.max() > 64:
+            continue
+        A = np.column_stack([np.ones_like(n), f(n)]) / t[:, None]
+        coef, *_ = np.linalg.lstsq(A, np.ones_like(t), rcond=None)
+        if name != "O(1)" and coef[1] <= 0:
+            continue
+        rms[name] = float(np.sqrt(np.mean((A @ coef - 1) ** 2)))
+
+    names = list(rms)  # порядок COMPLEXITY_CLASSES: от простого к сложному
+    best_rms = min(rms.values())
+    chosen = next(name for name in names if rms[name] <= best_rms + COMPLEXITY_TOLERANCE)
+
+    quality = max(0.0, 1 - rms[chosen])
+    index = names.index(chosen)
+    simpler = names[index - 1] if index > 0 else None
+    separation = 1 - rms[chosen] / rms[simpler] if simpler and rms[simpler] > 0 else 1.0
+    # Соседний более сложный класс ложится почти так же: разница в log n на наших n тонет
+    # в шуме (длинная арифметика, кэши), уверенность низкая — пусть решает LLM
+    harder = names[index + 1] if index + 1 < len(names) else None
+    if harder and rms[harder] < rms[chosen]:
+        separation = min(separation, 1 - (rms[chosen] - rms[harder]) / COMPLEXITY_TOLERANCE)
+    return chosen, round(max(0.0, min(1.0, quality * separation)), 2)
+
+
+def estimate_complexity(code, task):
+    families = input_families(task.get("public_tests", []) + task.get("hidden_tests", []))
+    if not families:
+        return None
+    points = measure_complexity(code, families)
+    if not points or len(points) < 4:
+        return None
+    complexity, confidence = fit_complexity(points)
+    return {
+        "complexity": complexity,
+        "confidence": confidence,
+        "measurements": [{"n": n, "ms": round(sec * 1000, 4)} for n, sec in points],
+    }
+
+
+def normalize_complexity(s):
+    s = s.lower().replace(" ", "").replace("*", "").replace("·", "")
+    s = s.replace("²", "^2").replace("³", "^3").replace("log(n)", "logn").replace("lgn", "logn")
+    if s.startswith("o(") and s.endswith(")"):
+        s = s[2:-1]
+    return {"n2": "n^2", "nn": "n^2", "n3": "n^3", "2n": "2^n"}.get(s, s)
+
+
+# --- RESULT CACHE ---
+result_cache = ResultCache()
+
+
+def iter_tests_cached(code, test_cases, fail_fast=False):
+    key = ResultCache.make_key(code, test_cases, f"{RUNNER_MODE}:{fail_fast}")
+    cached = result_cache.get(key)
+    if cached is not None:
+        cached["cached"] = True
+        for entry, log in zip(cached.get("tests", []), cached["logs"]):
+            yield {"event": "test", "log": log, **entry}
+        yield {"event": "summary", "result": cached}
+        return
+
+    if RUNNER_MODE == "parallel":
+        events = iter_test_suite_parallel(code, test_cases, fail_fast=fail_fast)
+    else:
+        events = iter_test_suite(code, test_cases)
+
+    for event in events:
+        if event["event"] == "summary":
+            result = event["result"]
+            if is_stable_result(result):
+                result_cache.put(key, result)
+        yield event
+
+
+def run_tests_cached(code, test_cases, fail_fast=False):
+    return collect_summary(iter_tests_cached(code, test_cases, fail_fast))
+
+
+# --- EMBEDDING CACHE ---
+class EmbeddingCache:
+    """
+    Эмбеддинги по sha256(модель + текст): LRU в памяти поверх memmap-файла на диске.
+    На диске два файла: vectors.f32 — строки float32 подряд, index.txt — размерность
+    в первой строке и дальше по одному хэшу на строку в порядке строк vectors.f32.
+    Вызывается только из event loop, поэтому блокировки не нужны.
+    """
+
+    def __init__(self, max_size=EMBEDDING_CACHE_SIZE, cache_dir=EMBEDDING_CACHE_DIR, model=EMBEDDING_MODEL):
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self.model = model
+        self._items = OrderedDict()
+        self._rows = {}
+        self._dim = None
+        self._index_size = 0
+        self._store = None
+        self.hits = 0
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._load_index()
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def _load_index(self):
+        try:
+            with open(self._path("index.txt"), encoding="utf-8") as f:
+                raw = f.read()
+        except OSError:
+            return
+        lines = raw.split()
+        if not lines:
+            return
+        self._dim = int(lines[0])
+        try:
+            stored = os.path.getsize(self._path("vectors.f32")) // (4 * self._dim)
+        except OSError:
+            stored = 0
+        # После сбоя вектор или хэш могли остаться без пары: держим только строки, где есть оба
+        keys = lines[1:stored + 1]
+        for row, key in enumerate(keys):
+            self._rows[key] = row
+        if stored > len(keys):
+            os.truncate(self._path("vectors.f32"), len(keys) * 4 * self._dim)
+        if len(lines) - 1 > len(keys) or not raw.endswith("\n"):
+            raw = "".join(f"{line}\n" for line in [lines[0], *keys])
+            with open(self._path("index.txt"), "w", encoding="utf-8") as f:
+                f.write(raw)
+        self._index_size = len(raw.encode("utf-8"))
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def _read_row(self, row):
+        if self._store is None or self._store.shape[0] <= row:
+            self._store = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r",
+                                    shape=(len(self._rows), self._dim))
+        return np.array(self._store[row])
+
+    def _write_row(self, key, vec):
+        if self._dim is None:
+            self._dim = len(vec)
+            header = f"{self._dim}\n"
+            with open(self._path("index.txt"), "w", encoding="utf-8") as f:
+                f.write(header)
+            self._index_size = len(header)
+        if len(vec) != self._dim:
+            return
+        # Хвосты прошлых неудачных записей отрезаем, иначе все следующие строки сдвинутся.
+        # Хэш пишется только после целиком записанного вектора
+        with open(self._path("vectors.f32"), "ab") as f:
+            f.truncate(len(self._rows) * 4 * self._dim)
+            f.write(np.asarray(vec, dtype=np.float32).tobytes())
+        line = f"{key}\n".encode("utf-8")
+        with open(self._path("index.txt"), "ab") as f:
+            f.truncate(self._index_size)
+            f.write(line)
+        self._index_size += len(line)
+        self._rows[key] = len(self._rows)
+
+    def get(self, key):
+        vec = self._items.get(key)
+        if vec is not None:
+            self._items.move_to_end(key)
+            return vec
+        row = self._rows.get(key)
+        if row is None:
+            return None
+        vec = self._read_row(row)
+        self._remember(key, vec)
+        return vec
+
+    def put(self, key, vec):
+        vec = np.asarray(vec, dtype=np.float32)
+        self._remember(key, vec)
+        if self.cache_dir and key not in self._rows:
+            try:
+                self._write_row(key, vec)
+            except OSError:
+                pass
+
+    def _remember(self, key, vec):
+        self._items[key] = vec
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    async def get_many(self, texts):
+        """Эмбеддинги для texts; все промахи уходят одним запросом. None — если запрос не удался."""
+        keys = [self.key(t) for t in texts]
+        found = {k: self.get(k) for k in set(keys)}
+        missing = {k: t for k, t in zip(keys, texts) if found[k] is None}
+        self.hits += len(keys) - sum(1 for k in keys if k in missing)
+        self.misses += len(missing)
+        if missing:
+            try:
+                vectors = await llm.embed_many(list(missing.values()), self.model)
             except Exception as e:
-                logs.append(f"⚠️ Тест {i + 1}: Ошибка {e}")
+                print(f"Embedding error: {e}")
+                vectors = [None] * len(missing)
+            for k, vec in zip(missing, vectors):
+                if vec is not None:
+                    self.put(k, vec)
+                found[k] = vec
+        return [found[k] for k in keys]
+
+
+embedding_cache = EmbeddingCache()
+
+
+async def get_embeddings(texts):
+    return await embedding_cache.get_many(texts)
+
+
+async def get_embedding(text):
+    return (await get_embeddings([text]))[0]
+
+
+# --- LOCAL SIMILARITY ---
+_MINHASH_PRIME = np.uint64(4294967311)  # простое больше 2^32
+_minhash_rng = np.random.default_rng(20240917)
+# a < 2^31, чтобы a * x для 32-битного x не переполнял uint64
+_MINHASH_A = _minhash_rng.integers(1, 2 ** 31, SIMILARITY_NUM_HASHES, dtype=np.uint64)
+_MINHASH_B = _minhash_rng.integers(0, 2 ** 32, SIMILARITY_NUM_HASHES, dtype=np.uint64)
 
-        return {"status": "success", "passed": passed, "total": len(test_cases), "logs": logs}
+
+def normalized_tokens(code):
+    """Токены кода без комментариев и пробелов; имена, числа и строки обезличены."""
+    tokens = []
+    try:
+        for tok in tokenize.generate_tokens(io.StringIO(code).readline):
+            if tok.type in (tokenize.COMMENT, tokenize.NL, tokenize.ENCODING, tokenize.ENDMARKER):
+                continue
+            if tok.type == tokenize.NAME:
+                tokens.append(tok.string if keyword.iskeyword(tok.string) else "ID")
+            elif tok.type == tokenize.NUMBER:
+                tokens.append("NUM")
+            elif tok.type == tokenize.STRING:
+                tokens.append("STR")
+            elif tok.type in (tokenize.INDENT, tokenize.DEDENT, tokenize.NEWLINE):
+                tokens.append(tokenize.tok_name[tok.type])
+            else:
+                tokens.append(tok.string)
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        tokens = code.split()
+    return tokens
+
+
+def winnow(tokens, k=SIMILARITY_KGRAM, window=SIMILARITY_WINDOW):
+    """Отпечатки winnowing: минимальный хэш k-граммы в каждом окне."""
+    if not tokens:
+        return np.empty(0, dtype=np.uint64)
+    k = min(k, len(tokens))
+    hashes = np.array([zlib.crc32("\x1f".join(tokens[i:i + k]).encode("utf-8"))
+                       for i in range(len(tokens) - k + 1)], dtype=np.uint64)
+    if len(hashes) <= window:
+        return np.unique(hashes)
+    windows = np.lib.stride_tricks.sliding_window_view(hashes, window)
+    return np.unique(windows.min(axis=1))
+
+
+@functools.lru_cache(maxsize=1024)
+def code_signature(code):
+    """MinHash-сигнатура отпечатков кода; эталон считается один раз и берется из кэша."""
+    prints = winnow(normalized_tokens(code))
+    if prints.size == 0:
+        return np.full(SIMILARITY_NUM_HASHES, np.iinfo(np.uint64).max, dtype=np.uint64)
+    # Все хэш-функции сразу: матрица (num_hashes, len(prints)), минимум по строкам
+    return ((_MINHASH_A[:, None] * prints[None, :] + _MINHASH_B[:, None]) % _MINHASH_PRIME).min(axis=1)
+
+
+def local_similarity(code, ref_code):
+    """Оценка Жаккара по MinHash-сигнатурам, 0..1, без обращения к сети."""
+    return float(np.mean(code_signature(code) == code_signature(ref_code)))
+
+
+async def code_similarity(code, ref_code):
+    """Схожесть кода с эталоном по SIMILARITY_MODE; возвращает (значение, метод)."""
+    if SIMILARITY_MODE == "local":
+        return local_similarity(code, ref_code), "local"
+    user_vec, ref_vec = await get_embeddings([code, ref_code])
+    if user_vec is None or ref_vec is None:
+        return local_similarity(code, ref_code), "local"
+    return cosine_similarity(user_vec, ref_vec), "embedding"
+
+
+# --- SANDBOX JOBS ---
+class SandboxJobService:
+    """
+    Очередь заданий песочницы: не больше max_concurrency прогонов одновременно и не больше
+    queue_size в ожидании, сверх этого — 429 с Retry-After. У каждого задания свой дедлайн.
+    Счетчики меняются только из event loop, поэтому блокировки не нужны.
+    """
+
+    def __init__(self, max_concurrency=SANDBOX_MAX_CONCURRENCY, queue_size=SANDBOX_QUEUE_SIZE,
+                 deadline=SANDBOX_JOB_DEADLINE_SECONDS):
+        self.max_concurrency = max_concurrency
+        self.queue_size = queue_size
+        self.deadline = deadline
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="sandbox")
+        self._admitted = 0
+        self._avg_seconds = 1.0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _admit(self):
+        if self._admitted >= self.max_concurrency + self.queue_size:
+            self.rejected += 1
+            waves = (self._admitted - self.max_concurrency) / self.max_concurrency + 1
+            retry_after = max(1, math.ceil(self._avg_seconds * waves))
+            raise HTTPException(429, "Песочница перегружена, повторите позже",
+                                headers={"Retry-After": str(retry_after)})
+        self._admitted += 1
+        return time.perf_counter()
+
+    def _release(self, started):
+        self._admitted -= 1
+        self.completed += 1
+        # Скользящее среднее длительности задания — для оценки Retry-After
+        self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * (time.perf_counter() - started)
+
+    async def run(self, fn, *args):
+        started = self._admit()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, fn, *args)
+        # Слот освобождается, когда поток реально закончил, а не когда истек дедлайн
+        future.add_done_callback(lambda _: self._release(started))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.deadline)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise HTTPException(504, "Превышено время ожидания песочницы")
+
+    def stream(self, events):
+        """Принимает синхронный генератор событий; 429 выбрасывается сразу, до начала ответа."""
+        started = self._admit()
+        return self._stream(events, started)
+
+    async def _stream(self, events, started):
+        loop = asyncio.get_running_loop()
+        end = object()
+        future = None
+        try:
+            while True:
+                remaining = self.deadline - (time.perf_counter() - started)
+                future = loop.run_in_executor(self._executor, next, events, end)
+                try:
+                    event = await asyncio.wait_for(asyncio.shield(future), max(0.0, remaining))
+                except asyncio.TimeoutError:
+                    self.timed_out += 1
+                    yield {"event": "error", "message": "Превышено время ожидания песочницы"}
+                    return
+                if event is end:
+                    return
+                yield event
+        finally:
+            self._close_after(loop, events, future, started)
+
+    def _close_after(self, loop, events, pending, started):
+        # После дедлайна или обрыва клиента поток еще может стоять в next(events):
+        # генератор закрываем только после его возврата, слот освобождаем после закрытия
+        def close(_=None):
+            closing = loop.run_in_executor(self._executor, events.close)
+            closing.add_done_callback(lambda _: self._release(started))
+
+        if pending is not None and not pending.done():
+            pending.add_done_callback(close)
+        else:
+            close()
+
+    def stats(self):
+        return {
+            "running_or_queued": self._admitted,
+            "max_concurrency": self.max_concurrency,
+            "queue_size": self.queue_size,
+            "avg_job_seconds": round(self._avg_seconds, 3),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+sandbox_jobs = SandboxJobService()
+
+
+# --- TASK POOL ---
+task_bank = open_task_bank()
+# Эмбеддинг эталона хранится в банке вместе с задачей и при выдаче возвращается в кэш
+task_producer = TaskProducer(generate_task_ai_stream, task_bank, embed=get_embedding,
+                             remember_embedding=lambda text, vec: embedding_cache.put(embedding_cache.key(text), vec),
+                             run_tests=run_tests_cached)
+task_pool = TaskPool(task_producer.produce)
+
+
+@app.on_event("startup")
+async def warm_task_pool():
+    task_pool.warm(parse_warm_keys(TASK_POOL_WARM))
+
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    await task_pool.stop()
+    await task_producer.stop()
+    await llm.aclose()
+
+
+# --- ROUND PIPELINE ---
+async def run_stage(name, coro, fallback, timings):
+    """Стадия раунда со своим таймаутом: при таймауте или ошибке — fallback, время пишется в timings."""
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        result = await asyncio.wait_for(coro, ROUND_STAGE_TIMEOUTS[name])
+    except asyncio.TimeoutError:
+        status, result = "timeout", fallback
     except Exception as e:
-        return {"status": "error", "traceback": str(e), "logs": [str(e)]}
+        print(f"Round stage {name} error: {e}")
+        status, result = "error", fallback
+    timings[name] = {"ms": round((time.perf_counter() - started) * 1000, 1), "status": status}
+    return result
+
+
+async def run_round_pipeline(task, code):
+    """
+    Анализ сдачи как граф стадий: review, ai_check и similarity идут параллельно,
+    smart_questions ждет только similarity. Итог — результаты стадий и их тайминги.
+    """
+    timings = {}
+    started = time.perf_counter()
+    ref_solution = task.get("reference_solution", "")
+
+    async def questions_after_similarity():
+        if not ref_solution:
+            print("⚠️ WARNING: No reference_solution in task!")
+            return 0.0, None, ""
+        sim, method = await run_stage("similarity", code_similarity(code, ref_solution), (None, None), timings)
+        if sim is None:
+            # Таймаут эмбеддингов — считаем локально, это микросекунды
+            sim, method = local_similarity(code, ref_solution), "local"
+        questions = await run_stage("smart_questions", generate_smart_questions_ai(code, ref_solution, sim),
+                                    "", timings)
+        return sim, method, questions
+
+    review, ai_check, (sim, method, smart_questions) = await asyncio.gather(
+        run_stage("review", review_code_ai(task, code), {"score": 70, "feedback": "Ошибка оценки"}, timings),
+        run_stage("ai_check", check_ai_generated(code), {"is_ai_generated": False, "confidence_score": 0}, timings),
+        questions_after_similarity(),
+    )
+    timings["total"] = {"ms": round((time.perf_counter() - started) * 1000, 1), "status": "ok"}
+    return {"review": review, "ai_check": ai_check, "similarity": sim, "similarity_method": method,
+            "smart_questions": smart_questions, "timings": timings}
+
+
+# --- SESSIONS ---
+class SessionStore(ABC):
+    """
+    Хранилище сессий. Обработчики меняют сессию на месте и затем вызывают save —
+    хранилищу не в памяти процесса этого достаточно, чтобы записать изменения.
+    """
+
+    @abstractmethod
+    def create(self, sess):
+        """Сохраняет новую сессию и возвращает ее id."""
+
+    @abstractmethod
+    def get(self, sid):
+        """Сессия по id или None, если ее нет или она вытеснена."""
+
+    @abstractmethod
+    def save(self, sid, sess):
+        """Записывает изменения сессии, сделанные на месте."""
+
+    @abstractmethod
+    def stats(self):
+        """Счетчики хранилища для /api/sessions/stats."""
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Сессии в памяти процесса в порядке последнего обращения. Простаивающие дольше ttl
+    и лишние сверх max_count вытесняются при обращениях — отдельный таймер не нужен.
+    """
+
+    def __init__(self, ttl=SESSION_TTL_SECONDS, max_count=SESSION_MAX_COUNT):
+        self.ttl = ttl
+        self.max_count = max_count
+        self._items = OrderedDict()  # sid -> (сессия, время последнего обращения)
+        self._lock = threading.Lock()
+        self.evicted_idle = 0
+        self.evicted_capacity = 0
+
+    def _evict(self, now):
+        while self._items:
+            _, (_, seen) = next(iter(self._items.items()))
+            if now - seen <= self.ttl:
+                break
+            self._items.popitem(last=False)
+            self.evicted_idle += 1
+        while len(self._items) > self.max_count:
+            self._items.popitem(last=False)
+            self.evicted_capacity += 1
+
+    def _touch(self, sid, sess, now):
+        self._items[sid] = (sess, now)
+        self._items.move_to_end(sid)
+
+    def create(self, sess):
+        sid = str(uuid.uuid4())
+        now = time.monotonic()
+        with self._lock:
+            self._touch(sid, sess, now)
+            self._evict(now)
+        return sid
+
+    def get(self, sid):
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            item = self._items.get(sid)
+            if item is None:
+                return None
+            self._touch(sid, item[0], now)
+            return item[0]
+
+    def save(self, sid, sess):
+        with self._lock:
+            if sid in self._items:
+                self._touch(sid, sess, time.monotonic())
+
+    def stats(self):
+        with self._lock:
+            return {"store": "memory", "sessions": len(self._items), "ttl_seconds": self.ttl,
+                    "max_count": self.max_count, "evicted_idle": self.evicted_idle,
+                    "evicted_capacity": self.evicted_capacity}
+
+
+def open_session_store(kind=SESSION_STORE):
+    if kind == "memory":
+        return MemorySessionStore()
+    raise ValueError(f"Неизвестное хранилище сессий: {kind}")
+
+
+class ReportLog:
+    """
+    Полные отчеты раундов в append-only JSONL. В истории сессии остается только смещение
+    записи в файле; отчет читается с диска, когда его запросили.
+    """
+
+    def __init__(self, path=REPORT_LOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, record):
+        """Смещение записи или None, если лог выключен или не записался."""
+        if not self.path:
+            return None
+        line = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        with self._lock:
+            try:
+                with open(self.path, "ab") as f:
+                    offset = f.seek(0, os.SEEK_END)
+                    f.write(line)
+            except OSError as e:
+                print(f"Report log error: {e}")
+                return None
+        return offset
+
+    def read(self, offset):
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+
+session_store = open_session_store()
+report_log = ReportLog()
+
+
+def get_session(sid):
+    sess = session_store.get(sid)
+    if sess is None: raise HTTPException(404)
+    return sess
+
+
+def record_round(sid, sess, task, final_score, report):
+    """Полный отчет уходит в лог, в сессии — компактная запись; история ограничена по длине."""
+    sess["rounds"] += 1
+    offset = report_log.append({"session_id": sid, "round": sess["rounds"], "task": task["title"],
+                                "at": time.time(), "report": report})
+    sess["history"].append({"round": sess["rounds"], "task": task["title"], "score": final_score,
+                            "level_update": report["level_update"], "report_offset": offset})
+    del sess["history"][:-SESSION_HISTORY_LIMIT]
+    session_store.save(sid, sess)
 
 
 # --- API ENDPOINTS ---
 @app.post("/api/start")
 def start_session(req: StartRequest):
-    sid = str(uuid.uuid4())
-    sessions[sid] = {"level": req.level, "topic": req.topic, "history": [], "current_task": None, "attempts": 0,
-                     "valid_code": ""}
+    sid = session_store.create({"level": req.level, "topic": req.topic, "history": [], "rounds": 0,
+                                "current_task": None, "attempts": 0, "valid_code": ""})
     return {"session_id": sid, "message": "Сессия создана"}
 
 
+@app.get("/api/session/history")
+def session_history(session_id: str):
+    sess = get_session(session_id)
+    return {"level": sess["level"], "rounds": sess["rounds"],
+            "history": [{k: v for k, v in h.items() if k != "report_offset"} for h in sess["history"]]}
+
+
+@app.get("/api/session/report")
+def session_report(session_id: str, round_no: int = Query(alias="round")):
+    """Полный отчет раунда из лога; в памяти сессии он не хранится."""
+    sess = get_session(session_id)
+    entry = next((h for h in sess["history"] if h["round"] == round_no), None)
+    if entry is None or entry["report_offset"] is None:
+        raise HTTPException(404, "Отчет не найден")
+    try:
+        return report_log.read(entry["report_offset"])["report"]
+    except (OSError, ValueError, KeyError):
+        raise HTTPException(404, "Отчет не найден")
+
+
+@app.get("/api/sessions/stats")
+def sessions_stats_endpoint():
+    return session_store.stats()
+
+
 @app.get("/api/task/next")
-def get_next_task(session_id: str):
-    if session_id not in sessions: raise HTTPException(404)
-    sess = sessions[session_id]
-    task = generate_task_ai(sess["level"], sess["topic"])
+async def get_next_task(session_id: str):
+    sess = get_session(session_id)
+    # Обычно задача уже лежит в пуле; генерация по запросу — только если пул пуст
+    task = await task_pool.get(sess["level"], sess["topic"])
     if not task: raise HTTPException(500, "Ошибка генерации задачи")
+    payload = assign_task(sess, task)
+    session_store.save(session_id, sess)
+    return payload
+
+
+def assign_task(sess, task):
     sess["current_task"] = task
     sess["attempts"] = 0
     sess["valid_code"] = ""
@@ -321,83 +1410,196 @@ def get_next_task(session_id: str):
     }
 
 
+@app.get("/api/task/next/stream")
+async def get_next_task_stream(session_id: str):
+    """
+    То же, что /api/task/next, но как Server-Sent Events: при генерации по запросу
+    field приходит на каждое готовое поле превью (title, description, ...), в конце — task.
+    """
+    sess = get_session(session_id)
+    level, topic = sess["level"], sess["topic"]
+
+    async def events():
+        task = None
+        async for event in task_producer.stream(task_pool, level, topic):
+            if event["event"] == "field":
+                yield sse_event(event)
+            else:
+                task = event["task"]
+        if task is None:
+            yield sse_event({"event": "error", "message": "Ошибка генерации задачи"})
+            return
+        payload = assign_task(sess, task)
+        session_store.save(session_id, sess)
+        yield sse_event({"event": "task", "task": payload})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.post("/api/code/run")
-def run_code_endpoint(req: RunCodeRequest):
-    if req.session_id not in sessions: raise HTTPException(404)
-    sess = sessions[req.session_id]
+async def run_code_endpoint(req: RunCodeRequest):
+    sess = get_session(req.session_id)
     task = sess["current_task"]
     tests = task["public_tests"] if req.type == "public" else task.get("hidden_tests", [])
-    result = run_test_suite(req.code, tests)
+    # Повторный запуск того же кода берется из кэша, но попытка все равно засчитывается
+    result = await sandbox_jobs.run(run_tests_cached, req.code, tests, req.fail_fast)
+    record_run(sess, req, result)
+    return result
+
+
+def record_run(sess, req, result):
     if req.type == "public": sess["attempts"] += 1
-    if result["passed"] == result["total"] and result["total"] > 0:
+    if result.get("passed") == result.get("total") and result.get("total", 0) > 0:
         sess["valid_code"] = req.code
-    return result
+    session_store.save(req.session_id, sess)
+
+
+def sse_event(event):
+    return f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+@app.post("/api/code/run/stream")
+async def run_code_stream_endpoint(req: RunCodeRequest):
+    """
+    То же, что /api/code/run, но как Server-Sent Events: событие test на каждый
+    завершенный тест (статус, время, diff) и итоговое summary.
+    """
+    sess = get_session(req.session_id)
+    task = sess["current_task"]
+    tests = task["public_tests"] if req.type == "public" else task.get("hidden_tests", [])
+
+    jobs = sandbox_jobs.stream(iter_tests_cached(req.code, tests, fail_fast=req.fail_fast))
+
+    async def events():
+        async for event in jobs:
+            if event["event"] == "summary":
+                record_run(sess, req, event["result"])
+            yield sse_event(event)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @app.post("/api/help")
-def get_hint_endpoint(req: HelpRequest):
-    if req.session_id not in sessions: raise HTTPException(404)
-    sess = sessions[req.session_id]
+async def get_hint_endpoint(req: HelpRequest):
+    sess = get_session(req.session_id)
     task = sess["current_task"]
-    hint = ask_help_ai(task["title"], task["description"], req.question)
+    hint = await ask_help_ai(task["title"], task["description"], req.question)
     return {"hint": hint}
 
 
+@app.post("/api/help/stream")
+async def get_hint_stream_endpoint(req: HelpRequest):
+    """
+    То же, что /api/help, но как Server-Sent Events: token на каждый видимый кусок текста
+    и done с полной подсказкой в конце.
+    """
+    task = get_session(req.session_id)["current_task"]
+
+    async def events():
+        parts = []
+        async for text in ask_help_ai_stream(task["title"], task["description"], req.question):
+            parts.append(text)
+            yield sse_event({"event": "token", "text": text})
+        yield sse_event({"event": "done", "hint": "".join(parts).strip()})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/api/tasks/pool")
+def task_pool_stats():
+    return task_pool.stats()
+
+
+@app.get("/api/tasks/bank")
+def task_bank_stats():
+    return task_bank.stats() if task_bank else {"enabled": False}
+
+
+@app.get("/api/llm/stats")
+def llm_stats_endpoint():
+    return llm.stats()
+
+
+@app.get("/api/sandbox/stats")
+def sandbox_stats_endpoint():
+    return sandbox_jobs.stats()
+
+
 @app.post("/api/complexity/check")
-def check_complexity_endpoint(req: dict):
+async def check_complexity_endpoint(req: dict):
     code = req.get("code", "")
     user_estimate = req.get("user_estimate", "")
-    ai_analysis = analyze_efficiency_ai(code)
-    real_complexity = ai_analysis.get('time_complexity', 'Unknown')
-    explanation = ai_analysis.get('explanation', '')
-    is_correct = user_estimate.lower().replace(" ", "") == real_complexity.lower().replace(" ", "")
-    return {"is_correct": is_correct, "real_complexity": real_complexity, "explanation": explanation}
+
+    # Сложность определяют замеры на растущих входах; LLM только объясняет результат
+    sess = session_store.get(req.get("session_id", ""))
+    task = sess["current_task"] if sess else None
+    estimate = await sandbox_jobs.run(estimate_complexity, code, task) if task else None
+
+    if estimate and estimate["confidence"] >= COMPLEXITY_MIN_CONFIDENCE:
+        real_complexity = estimate["complexity"]
+        explanation = await explain_complexity_ai(code, real_complexity)
+        method = "empirical"
+    else:
+        ai_analysis = await analyze_efficiency_ai(code)
+        real_complexity = ai_analysis.get('time_complexity', 'Unknown')
+        explanation = ai_analysis.get('explanation', '')
+        method = "llm"
+
+    is_correct = normalize_complexity(user_estimate) == normalize_complexity(real_complexity)
+    return {
+        "is_correct": is_correct,
+        "real_complexity": real_complexity,
+        "explanation": explanation,
+        "method": method,
+        "confidence": estimate["confidence"] if estimate else None,
+        "measurements": estimate["measurements"] if estimate else [],
+    }
 
 
 @app.post("/api/soft-skills/evaluate")
-def evaluate_soft_skills_endpoint(req: dict):
+async def evaluate_soft_skills_endpoint(req: dict):
     code = req.get("code", "")
     explanation = req.get("explanation", "")
-    result = evaluate_explanation_ai(explanation, code)
+    result = await evaluate_explanation_ai(explanation, code)
     comm_score = (result.get('clarity_score', 0) + result.get('technical_score', 0)) * 5
     return {"comm_score": comm_score, "feedback": result.get('feedback', '')}
 
 
 @app.post("/api/interview/question")
-def ask_interview_question(req: dict):
+async def ask_interview_question(req: dict):
     code = req.get("code", "")
     ref_code = req.get("reference_solution", "")
-    similarity = 0.0
+    similarity, method = 0.0, None
     if ref_code:
-        user_vec = get_embedding(code)
-        ref_vec = get_embedding(ref_code)
-        similarity = cosine_similarity(user_vec, ref_vec)
-    questions_text = generate_smart_questions_ai(code, ref_code, similarity)
+        similarity, method = await code_similarity(code, ref_code)
+    questions_text = await generate_smart_questions_ai(code, ref_code, similarity)
     questions = [q.strip() for q in questions_text.split('\n') if "?" in q]
-    return {"questions": questions[:2], "similarity": similarity}
+    return {"questions": questions[:2], "similarity": similarity, "similarity_method": method}
 
 
 @app.post("/api/interview/respond")
-def respond_to_answer(req: dict):
+async def respond_to_answer(req: dict):
     question = req.get("question", "")
     answer = req.get("answer", "")
-    reaction = respond_to_candidate_ai(question, answer)
+    reaction = await respond_to_candidate_ai(question, answer)
     return {"reaction": reaction}
 
 
 @app.post("/api/round/submit")
-def submit_round_endpoint(req: SubmitRoundRequest):
-    if req.session_id not in sessions: raise HTTPException(404)
-    sess = sessions[req.session_id]
+async def submit_round_endpoint(req: SubmitRoundRequest):
+    sess = get_session(req.session_id)
     task = sess["current_task"]
     code = req.code
 
-    # 1. Code Review
-    review = review_code_ai(task, code)
+    # 1-2. Code Review, AI Detector и Similarity считаются параллельно
+    stages = await run_round_pipeline(task, code)
+    review = stages["review"]
     score = review.get("score", 0)
 
-    # 2. AI Detector
-    ai_check = check_ai_generated(code)
+    ai_check = stages["ai_check"]
     is_ai_generated = ai_check.get("is_ai_generated", False)
     confidence = ai_check.get("confidence_score", 0)
     penalty_ai = 50 if is_ai_generated and confidence > 80 else 0
@@ -411,22 +1613,8 @@ def submit_round_endpoint(req: SubmitRoundRequest):
     penalty_anticheat = blur_count * 3 + copy_count * 5 + paste_count * 10
 
     # 4. Similarity (ОБЯЗАТЕЛЬНО!)
-    sim = 0.0
-    smart_questions = ""
-    ref_solution = task.get("reference_solution", "")
-
-    if ref_solution:  # <-- ВАЖНАЯ ПРОВЕРКА
-        try:
-            user_vec = get_embedding(code)
-            ref_vec = get_embedding(ref_solution)
-            if user_vec is not None and ref_vec is not None:
-                sim = cosine_similarity(user_vec, ref_vec)
-                smart_questions = generate_smart_questions_ai(code, ref_solution, sim)
-        except Exception as e:
-            print(f"Similarity error: {e}")
-            sim = 0.0
-    else:
-        print("⚠️ WARNING: No reference_solution in task!")
+    sim = stages["similarity"]
+    smart_questions = stages["smart_questions"]
 
     # 5. Final Score
     final_score = int(score * 0.6 + sim * 40)
@@ -450,6 +1638,7 @@ def submit_round_endpoint(req: SubmitRoundRequest):
         "level_update": f"{prev_level} -> {sess['level']}",
         "review": review,
         "similarity": sim,  # <-- ОБЯЗАТЕЛЬНО ОТДАЕМ
+        "similarity_method": stages["similarity_method"],
         "ai_cheat_detected": penalty_ai > 0,
         "ai_check": ai_check,  # <-- ДЕТАЛИ AI DETECTOR
         "anti_cheat_violations": {
@@ -458,10 +1647,11 @@ def submit_round_endpoint(req: SubmitRoundRequest):
             "paste": paste_count,
             "total_penalty": penalty_anticheat
         },
-        "smart_questions": smart_questions.split("\n") if smart_questions else []
+        "smart_questions": smart_questions.split("\n") if smart_questions else [],
+        "timings": stages["timings"]
     }
 
-    sess["history"].append({"task": task["title"], "score": final_score, "report": report})
+    record_round(req.session_id, sess, task, final_score, report)
     return report
 
 
@@ -1,9 +1,14 @@
+import json
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool, iterate_in_threadpool
 from pydantic import BaseModel
 from typing import Dict, Any
 from interview_engine import InterviewEngine
+from llm_client import llm
+from task_pool import parse_warm_keys, TASK_POOL_WARM
 
 app = FastAPI()
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"],
@@ -12,6 +17,23 @@ app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True,
 engine = InterviewEngine()
 
 
+@app.on_event("startup")
+async def start_sandbox_pool():
+    # Форкаем воркеры заранее, чтобы первый запуск кода не платил за старт процессов
+    if engine.sandbox_pool:
+        engine.sandbox_pool.start()
+    engine.task_pool.warm(parse_warm_keys(TASK_POOL_WARM))
+
+
+@app.on_event("shutdown")
+async def stop_sandbox_pool():
+    if engine.sandbox_pool:
+        engine.sandbox_pool.shutdown()
+    await engine.task_pool.stop()
+    await engine.task_producer.stop()
+    await llm.aclose()
+
+
 class TaskRequest(BaseModel):
     level: str = "Middle"
     topic: str = "Algorithms"
@@ -30,7 +52,32 @@ class ChatRequest(BaseModel):
 
 @app.post("/generate-task")
 async def generate_task(req: TaskRequest):
-    return engine.generate_task(req.level, req.topic)
+    return await engine.generate_task(req.level, req.topic)
+
+
+@app.post("/generate-task/stream")
+async def generate_task_stream(req: TaskRequest):
+    """
+    Генерация через Server-Sent Events: поля превью (title, description, ...) по мере
+    готовности, затем task. Готовая задача из пула отдается сразу одним событием task.
+    """
+    async def events():
+        async for event in engine.task_producer.stream(engine.task_pool, req.level, req.topic):
+            if event["event"] == "task" and event["task"] is None:
+                event["task"] = engine.get_fallback_task()
+            yield event
+
+    return _sse_response(events())
+
+
+@app.get("/task-pool")
+def task_pool_stats():
+    return engine.task_pool.stats()
+
+
+@app.get("/llm-stats")
+def llm_stats():
+    return llm.stats()
 
 
 @app.post("/test-code")
@@ -39,7 +86,8 @@ async def test_code(req: RunCodeRequest):
     КНОПКА СТАРТ: Просто прогоняем тесты, AI не смотрит.
     """
     all_tests = req.task.get("public_tests", [])  # Скрытые тесты не проверяем пока
-    res = engine.run_code_safely(req.code, all_tests)
+    # Песочница блокирует поток, поэтому уводим ее с event loop
+    res = await run_in_threadpool(engine.run_tests_parallel, req.code, all_tests)
     return res
 
 
@@ -49,7 +97,8 @@ async def submit_run(req: RunCodeRequest):
     КОМАНДА RUN: Финальная проверка + AI анализ.
     """
     all_tests = req.task.get("public_tests", []) + req.task.get("hidden_tests", [])
-    exec_res = engine.run_code_safely(req.code, all_tests)
+    # Сдача отклоняется на первом же провале, поэтому остальные тесты не гоняем
+    exec_res = await run_in_threadpool(engine.run_tests_parallel, req.code, all_tests, True)
 
     if exec_res["status"] == "error" or exec_res["passed"] < exec_res["total"]:
         return {
@@ -59,20 +108,80 @@ async def submit_run(req: RunCodeRequest):
         }
 
     # Если тесты прошли -> запускаем AI
-    ai_res = engine.analyze_solution(req.task, req.code, exec_res)
+    ai_res = await engine.analyze_solution(req.task, req.code, exec_res)
     return {"status": "success", "data": ai_res}
 
 
+def _sse(event: Dict[str, Any]) -> str:
+    return f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+def _sse_response(events) -> StreamingResponse:
+    async def body():
+        async for event in events:
+            yield _sse(event)
+
+    return StreamingResponse(body(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/test-code/stream")
+async def test_code_stream(req: RunCodeRequest):
+    """
+    То же, что /test-code, но через Server-Sent Events: test на каждый тест и итоговый summary.
+    """
+    all_tests = req.task.get("public_tests", [])
+    return _sse_response(iterate_in_threadpool(engine.iter_tests_parallel(req.code, all_tests)))
+
+
+@app.post("/submit-run/stream")
+async def submit_run_stream(req: RunCodeRequest):
+    """
+    Потоковая сдача: результаты тестов по мере готовности, затем fail или analysis.
+    """
+    all_tests = req.task.get("public_tests", []) + req.task.get("hidden_tests", [])
+
+    async def events():
+        exec_res = None
+        async for event in iterate_in_threadpool(engine.iter_tests_parallel(req.code, all_tests, fail_fast=True)):
+            if event["event"] == "summary":
+                exec_res = event["result"]
+            yield event
+
+        if exec_res["status"] == "error" or exec_res["passed"] < exec_res["total"]:
+            yield {"event": "fail",
+                   "message": f"Тесты провалены: {exec_res['passed']}/{exec_res['total']}. Исправьте ошибки перед сдачей."}
+            return
+        yield {"event": "analysis", "data": await engine.analyze_solution(req.task, req.code, exec_res)}
+
+    return _sse_response(events())
+
+
 @app.post("/chat")
 async def chat(req: ChatRequest):
     """
     ОБЫЧНЫЙ ЧАТ: Обработка HELP и вопросов.
     """
     # Важно: мы передаем code, чтобы AI видел контекст
-    answer = engine.chat_with_ai(req.message, req.task_description, req.code)
+    answer = await engine.chat_with_ai(req.message, req.task_description, req.code)
     return {"text": answer}
 
 
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    Чат через Server-Sent Events: token по мере генерации, done с полным текстом.
+    """
+    async def events():
+        parts = []
+        async for text in engine.chat_with_ai_stream(req.message, req.task_description, req.code):
+            parts.append(text)
+            yield {"event": "token", "text": text}
+        yield {"event": "done", "text": "".join(parts).strip()}
+
+    return _sse_response(events())
+
+
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
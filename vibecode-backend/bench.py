@@ -0,0 +1,347 @@
+"""
+Бенчмарки горячих путей backend.py и InterviewEngine с сохраненными базовыми замерами.
+
+micro — разбор ответов LLM, косинус, разбор фикстур, сравнение больших результатов,
+        прогон тестов в процессе, холодный и теплый старт песочницы;
+macro — /api/round/submit целиком против llm_stub.py (поднимается сам на свободном порту).
+
+    python bench.py run --save bench_baseline.json      # записать базу
+    python bench.py run --compare bench_baseline.json   # сравнить текущий код с базой
+    python bench.py compare old.json new.json --threshold 0.15
+
+Сравнение идет по медиане; регрессия — медиана выросла больше чем на threshold.
+Базовые замеры зависят от машины: сравнивайте прогоны на одном и том же железе.
+"""
+import os
+import re
+import atexit
+import sys
+import json
+import time
+import socket
+import asyncio
+import platform
+import argparse
+import subprocess
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+
+DEFAULT_BASELINE = os.path.join(HERE, "bench_baseline.json")
+# Разница медиан меньше этого (секунды) — шум, даже если в процентах много
+NOISE_FLOOR = 20e-6
+
+BENCHMARKS: Dict[str, Dict[str, Any]] = {}
+
+
+def bench(name: str, group: str = "micro", min_time: float = 0.5, max_iters: int = 2000, warmup: int = 2):
+    """
+    Регистрирует бенчмарк. Функция — это setup: возвращает вызываемое без аргументов
+    (обычное или async), время которого и замеряется.
+    """
+    def register(setup: Callable[[], Callable[[], Any]]):
+        BENCHMARKS[name] = {"setup": setup, "group": group, "min_time": min_time,
+                            "max_iters": max_iters, "warmup": warmup}
+        return setup
+    return register
+
+
+# --- ДАННЫЕ ---
+def large_model_output(think_kb: int = 20, feedback_kb: int = 20) -> str:
+    think = ("Рассуждаю о коде {\"шаг\": 1} и проверяю граничные случаи. " * 64)[:think_kb * 1024]
+    feedback = ("Решение корректное, но стоит вынести проверку входа. " * 512)[:feedback_kb * 1024]
+    body = json.dumps({"score": 85, "feedback": feedback}, ensure_ascii=False, indent=2)
+    return f"<think>\n{think}\n</think>\n\nВот оценка:\n```json\n{body}\n```\n"
+
+
+def sum_tests(n: int) -> List[Dict[str, str]]:
+    return [{"input": f"[{', '.join(str(j) for j in range(i % 50))}]", "expected": str(sum(range(i % 50)))}
+            for i in range(n)]
+
+
+SUM_CODE = "def solution(nums):\n    return sum(nums)\n"
+
+
+class Unique:
+    """
+    Уникальный код на каждый вызов: кэши результатов не должны подменять замер.
+    Меняется присваивание, а не комментарий — code_hash комментарии не учитывает.
+    """
+
+    def __init__(self, code: str):
+        self.code = code
+
+    def __call__(self) -> str:
+        return f"{self.code}_bench_run = {time.time_ns()}\n"
+
+
+# --- MICRO ---
+@bench("parse_json.backend.large")
+def _parse_json_backend():
+    import backend
+    content = large_model_output()
+    return lambda: backend.parse_json(content)
+
+
+@bench("parse_json.engine.large")
+def _parse_json_engine():
+    import interview_engine
+    content = large_model_output()
+    return lambda: interview_engine.parse_json(content)
+
+
+@bench("clean_text.large")
+def _clean_text():
+    import backend
+    content = large_model_output(think_kb=64, feedback_kb=64)
+    return lambda: backend.clean_text(content)
+
+
+@bench("cosine_similarity.1536")
+def _cosine():
+    import backend
+    rng = np.random.default_rng(0)
+    a, b = rng.standard_normal(1536).astype(np.float32), rng.standard_normal(1536).astype(np.float32)
+    return lambda: backend.cosine_similarity(a, b)
+
+
+@bench("fixtures.parse.200")
+def _fixtures_parse():
+    import fixtures
+    tests = sum_tests(200)
+    return lambda: [fixtures.parse_fixture(t) for t in tests]
+
+
+@bench("fixtures.cached.200")
+def _fixtures_cached():
+    import fixtures
+    tests = sum_tests(200)
+    fixtures.get_fixtures(tests)
+    return lambda: fixtures.get_fixtures(tests)
+
+
+@bench("compare.large_output.100k")
+def _compare_large():
+    import pickle
+    import backend
+    value = list(range(100_000))
+    fixture = pickle.dumps(((value,), value), protocol=pickle.HIGHEST_PROTOCOL)
+    return lambda: backend.run_single_test(lambda xs: list(xs), fixture, 0)
+
+
+@bench("run_test_suite.inline.50")
+def _run_test_suite():
+    import backend
+    tests = sum_tests(50)
+    backend.get_fixtures(tests)
+    return lambda: backend.run_test_suite(SUM_CODE, tests)
+
+
+@bench("engine.execute_tests.50")
+def _engine_execute():
+    import interview_engine
+    fixtures = interview_engine.get_fixtures(sum_tests(50))
+    # Тело _unsafe_test_runner без лимитов ядра и pipe: их стоимость меряют sandbox.*
+    return lambda: interview_engine._execute_tests(SUM_CODE, fixtures)
+
+
+@bench("sandbox.backend.parallel.cold.5", min_time=1.0, max_iters=50, warmup=1)
+def _backend_parallel():
+    import backend
+    tests = sum_tests(5)
+    code = Unique(SUM_CODE)
+    return lambda: backend.run_test_suite_parallel(code(), tests)
+
+
+@bench("sandbox.engine.cold", min_time=1.0, max_iters=50, warmup=1)
+def _engine_cold():
+    import interview_engine
+    engine = interview_engine.InterviewEngine(sandbox_pool_size=0)
+    tests = sum_tests(5)
+    code = Unique(SUM_CODE)
+    return lambda: engine.run_code_safely(code(), tests)
+
+
+@bench("sandbox.engine.warm", min_time=1.0, max_iters=200, warmup=3)
+def _engine_warm():
+    import interview_engine
+    engine = interview_engine.InterviewEngine(sandbox_pool_size=1)
+    engine.sandbox_pool.start()
+    atexit.register(engine.sandbox_pool.shutdown)
+    tests = sum_tests(5)
+    code = Unique(SUM_CODE)
+    return lambda: engine.run_code_safely(code(), tests)
+
+
+# --- MACRO ---
+@bench("round_submit.e2e", group="macro", min_time=2.0, max_iters=100, warmup=2)
+def _round_submit():
+    import httpx
+    import backend
+    from llm_stub import TASKS
+
+    transport = httpx.ASGITransport(app=backend.app)
+    client = httpx.AsyncClient(transport=transport, base_url="http://bench")
+    code = Unique(TASKS[0]["reference_solution"] + "\n")
+    sid = backend.start_session(backend.StartRequest(level="Middle", topic="Algorithms"))["session_id"]
+    backend.assign_task(backend.session_store.get(sid), dict(TASKS[0]))
+
+    async def submit():
+        resp = await client.post("/api/round/submit", json={"session_id": sid, "code": code(),
+                                                             "anti_cheat_stats": {}})
+        resp.raise_for_status()
+
+    return submit
+
+
+# --- ЗАПУСК ---
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_stub(latency: str) -> subprocess.Popen:
+    """Поднимает llm_stub.py и направляет на него LLM-клиент (до импорта backend)."""
+    port = _free_port()
+    proc = subprocess.Popen([sys.executable, os.path.join(HERE, "llm_stub.py"), "--port", str(port),
+                             "--latency", latency], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    os.environ["LLM_API_URL"] = f"http://127.0.0.1:{port}/v1"
+    return proc
+
+
+def measure(fn: Callable[[], Any], loop: asyncio.AbstractEventLoop, min_time: float, max_iters: int,
+            warmup: int) -> List[float]:
+    is_async = asyncio.iscoroutinefunction(fn)
+
+    def once() -> float:
+        start = time.perf_counter()
+        if is_async:
+            loop.run_until_complete(fn())
+        else:
+            fn()
+        return time.perf_counter() - start
+
+    for _ in range(warmup):
+        once()
+    samples: List[float] = []
+    deadline = time.perf_counter() + min_time
+    while len(samples) < max_iters and (time.perf_counter() < deadline or len(samples) < 5):
+        samples.append(once())
+    return samples
+
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    arr = np.array(samples)
+    return {"iterations": len(samples), "median_s": float(np.median(arr)), "p95_s": float(np.percentile(arr, 95)),
+            "min_s": float(arr.min())}
+
+
+def run(names: List[str], stub_latency: str) -> Dict[str, Any]:
+    stub = start_stub(stub_latency) if any(BENCHMARKS[n]["group"] == "macro" for n in names) else None
+    # Банк задач и дисковые кэши не трогаем: бенчмарк не должен оставлять файлы
+    os.environ["TASK_BANK_PATH"] = ""
+    os.environ["REPORT_LOG_PATH"] = ""
+    loop = asyncio.new_event_loop()
+    results = {}
+    try:
+        for name in names:
+            spec = BENCHMARKS[name]
+            fn = spec["setup"]()
+            stats = summarize(measure(fn, loop, spec["min_time"], spec["max_iters"], spec["warmup"]))
+            results[name] = stats
+            print(f"{name:<36}{fmt(stats['median_s']):>12}{fmt(stats['p95_s']):>12}{stats['iterations']:>8}")
+    finally:
+        loop.close()
+        if stub is not None:
+            stub.terminate()
+            stub.wait()
+    return {"machine": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count()},
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results}
+
+
+def fmt(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds:.2f} s"
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> bool:
+    """Печатает таблицу сравнения; True, если есть регрессии."""
+    regressed = False
+    print(f"\n{'benchmark':<36}{'base':>12}{'now':>12}{'change':>10}")
+    for name, now in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<36}{'—':>12}{fmt(now['median_s']):>12}{'new':>10}")
+            continue
+        change = now["median_s"] / base["median_s"] - 1 if base["median_s"] else 0.0
+        bad = change > threshold and now["median_s"] - base["median_s"] > NOISE_FLOOR
+        regressed |= bad
+        mark = "  REGRESSION" if bad else ("  faster" if change < -threshold else "")
+        print(f"{name:<36}{fmt(base['median_s']):>12}{fmt(now['median_s']):>12}{change:>+10.1%}{mark}")
+    if baseline.get("machine") != current.get("machine"):
+        print("\nВнимание: база снята на другой машине, сравнение неточное")
+    return regressed
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки горячих путей")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="запустить бенчмарки")
+    p_run.add_argument("--group", choices=["micro", "macro", "all"], default="all")
+    p_run.add_argument("--filter", default="", help="регулярное выражение по имени")
+    p_run.add_argument("--save", default="", help="сохранить результаты в файл")
+    p_run.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, default="",
+                       help=f"сравнить с базой (по умолчанию {os.path.basename(DEFAULT_BASELINE)})")
+    p_run.add_argument("--threshold", type=float, default=0.15)
+    p_run.add_argument("--stub-latency", default="fixed:0.02", help="задержка llm_stub для macro")
+
+    p_cmp = sub.add_parser("compare", help="сравнить два сохраненных прогона")
+    p_cmp.add_argument("baseline")
+    p_cmp.add_argument("current")
+    p_cmp.add_argument("--threshold", type=float, default=0.15)
+
+    sub.add_parser("list", help="список бенчмарков")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for name, spec in BENCHMARKS.items():
+            print(f"{spec['group']:<7}{name}")
+        return
+
+    if args.command == "compare":
+        sys.exit(1 if compare(load(args.baseline), load(args.current), args.threshold) else 0)
+
+    names = [n for n, spec in BENCHMARKS.items()
+             if (args.group == "all" or spec["group"] == args.group) and re.search(args.filter, n)]
+    print(f"{'benchmark':<36}{'median':>12}{'p95':>12}{'iters':>8}")
+    result = run(names, args.stub_latency)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        sys.exit(1 if compare(load(args.compare), result, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
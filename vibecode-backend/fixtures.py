@@ -0,0 +1,107 @@
+"""
+Разбор тестов задачи в фикстуры для раннеров backend.py и InterviewEngine.
+Каждый набор тестов разбирается один раз: дальше раннеры берут готовые значения
+(pickle от (args, expected) или от ошибки разбора) из кэша по хэшу содержимого.
+Тесты могут прийти от клиента (req.task), поэтому разбираются только литералы — ничего не выполняется.
+"""
+import ast
+import json
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+FIXTURE_CACHE_SIZE = 256
+
+# хэш набора тестов -> готовые фикстуры
+_fixture_cache: "OrderedDict[str, List[bytes]]" = OrderedDict()
+_fixture_lock = threading.Lock()
+
+
+_JSON_NAMES = {"null": None, "true": True, "false": False}
+
+
+class _JsonNames(ast.NodeTransformer):
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        if node.id in _JSON_NAMES:
+            return ast.copy_location(ast.Constant(_JSON_NAMES[node.id]), node)
+        return node
+
+
+def parse_literal(text: str) -> Any:
+    """Литерал Python (null/true/false из JSON тоже понимаются); вызовы и операции — ValueError."""
+    tree = ast.parse(text.strip(), mode="eval")
+    return ast.literal_eval(_JsonNames().visit(tree).body)
+
+
+def _parse_args(inp_str: str) -> tuple:
+    # Большинство тестов — JSON, а json.loads в разы быстрее ast; кортежей JSON не дает,
+    # поэтому распаковка аргументов та же, что у литерала в скобках
+    try:
+        return tuple(json.loads(f"[{inp_str}]"))
+    except ValueError:
+        args = parse_literal(f"({inp_str})")
+        return args if isinstance(args, tuple) else (args,)
+
+
+def _parse_expected(exp_str: str) -> Any:
+    try:
+        return json.loads(exp_str)
+    except ValueError:
+        return parse_literal(exp_str)
+
+
+def parse_fixture(test: Dict) -> bytes:
+    # AI может вернуть число 123 вместо "123", поэтому оборачиваем в str()
+    inp_str = str(test.get("input", ""))
+    exp_str = str(test.get("expected", ""))
+
+    try:
+        args = _parse_args(inp_str)
+        expected = _parse_expected(exp_str)
+        return pickle.dumps((args, expected), protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        return pickle.dumps(e, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def tests_hash(test_cases: List[Dict]) -> str:
+    raw = json.dumps(test_cases, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get_fixtures(test_cases: List[Dict]) -> List[bytes]:
+    """
+    Тесты разбираются один раз на набор. Задача в InterviewEngine приходит с фронта
+    целиком на каждый запуск, поэтому ключ — хэш содержимого, а не id задачи.
+    """
+    key = tests_hash(test_cases)
+    with _fixture_lock:
+        fixtures = _fixture_cache.get(key)
+        if fixtures is not None:
+            _fixture_cache.move_to_end(key)
+            return fixtures
+
+    fixtures = [parse_fixture(t) for t in test_cases]
+    with _fixture_lock:
+        _fixture_cache[key] = fixtures
+        while len(_fixture_cache) > FIXTURE_CACHE_SIZE:
+            _fixture_cache.popitem(last=False)
+    return fixtures
+
+
+def prepare_task_fixtures(task: Dict[str, Any]) -> Dict[str, List[bytes]]:
+    """Разбирает тесты задачи заранее; возвращает фикстуры по хэшу набора (для банка задач)."""
+    public, hidden = task.get("public_tests", []), task.get("hidden_tests", [])
+    # Сдача в InterviewEngine гоняет public + hidden одним набором, его тоже разбираем заранее
+    return {tests_hash(tests): get_fixtures(tests) for tests in (public, hidden, public + hidden)}
+
+
+def seed_fixtures(fixtures: Dict[str, List[bytes]]):
+    """Кладет в кэш уже разобранные фикстуры, например из банка задач."""
+    with _fixture_lock:
+        for key, items in fixtures.items():
+            _fixture_cache[key] = items
+            _fixture_cache.move_to_end(key)
+        while len(_fixture_cache) > FIXTURE_CACHE_SIZE:
+            _fixture_cache.popitem(last=False)
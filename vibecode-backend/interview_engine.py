@@ -1,25 +1,58 @@
 import json
+import pickle
 import re
 import traceback
 import multiprocessing
+import multiprocessing.connection
+import os
+import queue
+import signal
+import threading
 import time
 import sys
 import io
 import psutil
 import random
-from typing import List, Dict, Any
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Iterator, AsyncIterator
+from contextlib import aclosing
+from llm_client import llm, RoutePolicy, json_with_keys
+from stream_json import StreamingJSONExtractor, parse_partial_json
+from task_pool import TaskPool, salvage_task
+from prompt_budget import govern
+from fixtures import get_fixtures
+from result_cache import ResultCache, code_hash, is_stable_result
+from profiling import profile_call, short_repr, collect_summary
+from task_bank import open_task_bank
+from task_producer import TaskProducer
+from sandbox_limits import (TIME_LIMIT_SECONDS, MEMORY_LIMIT_MB, TIME_LIMIT, MEMORY_LIMIT, CRASHED, SKIPPED, LIMIT_ICONS,
+                            kernel_limits_enabled, apply_memory_limit, arm_cpu_limit, remove_cgroup,
+                            exit_code_status, exit_status)
 
 # --- КОНФИГУРАЦИЯ ---
-# Замените на ваш API ключ или используйте os.getenv('OPENAI_API_KEY')
-API_URL = "https://llm.t1v.scibox.tech/v1"
-API_KEY = "sk-BWpbCDueGfRzWIW7MCmCaQ"
-
+# Адрес и ключ LLM задаются в llm_client.py (LLM_API_URL / LLM_API_KEY)
 MODEL_TASK = "qwen3-coder-30b-a3b-instruct-fp8"
 MODEL_CHAT = "qwen3-32b-awq"
+# Запасная модель для hedged-запроса по типу вызова (LLM_ROUTE_<ТИП> в окружении важнее)
+LLM_ROUTES = {
+    "analyze": RoutePolicy([MODEL_CHAT]),
+    "chat": RoutePolicy([MODEL_TASK]),
+}
+llm.configure_routes(LLM_ROUTES)
+# Версия промпта analyze_solution для кэша ответов LLM: поменяли промпт — поднимите версию
+PROMPT_VERSION_ANALYZE = "analyze/1"
+
+# Пул песочниц: 0 отключает пул, и каждый запуск идет в новом процессе
+SANDBOX_POOL_SIZE = int(os.getenv("SANDBOX_POOL_SIZE", "4"))
+SANDBOX_MAX_JOBS_PER_WORKER = int(os.getenv("SANDBOX_MAX_JOBS_PER_WORKER", "50"))
+
+TLE_ERROR = {"status": "error", "traceback": "Time Limit Exceeded"}
+MLE_ERROR = {"status": "error", "traceback": "Memory Limit Exceeded"}
+CRASH_ERROR = {"status": "error", "traceback": "Process crashed unexpectedly"}
 
-TIME_LIMIT_SECONDS = 5.0
-MEMORY_LIMIT_MB = 256.0
+LIMIT_ERRORS = {TIME_LIMIT: TLE_ERROR, MEMORY_LIMIT: MLE_ERROR, CRASHED: CRASH_ERROR}
+# Статус отдельного теста, если его песочница не вернула результат
+LIMIT_TEST_STATUSES = {error["traceback"]: status for status, error in LIMIT_ERRORS.items()}
 
 
 class ResourceLimitExceeded(Exception):
@@ -43,11 +76,12 @@ def parse_json(content: str) -> Dict[str, Any]:
             return json.loads(match.group(0))
         return json.loads(clean)
     except Exception:
-        return {}
+        # Битый или оборванный JSON: забираем хотя бы готовые поля
+        return parse_partial_json(clean)
 
 
 # --- SANDBOX WORKER ---
-def _unsafe_test_runner(code: str, test_cases: List[Dict], result_queue: multiprocessing.Queue):
+def _execute_tests(code: str, fixtures: List[bytes], first_index: int = 0) -> Dict[str, Any]:
     import types
 
     capture = io.StringIO()
@@ -57,9 +91,10 @@ def _unsafe_test_runner(code: str, test_cases: List[Dict], result_queue: multipr
     response = {
         "status": "ok",
         "passed": 0,
-        "total": len(test_cases),
+        "total": len(fixtures),
         "logs": [],
-        "output": ""
+        "output": "",
+        "tests": []
     }
 
     try:
@@ -82,46 +117,307 @@ def _unsafe_test_runner(code: str, test_cases: List[Dict], result_queue: multipr
         if not user_func:
             raise Exception("Функция solution(...) не найдена.")
 
-        for i, test in enumerate(test_cases):
-            # --- БЕЗОПАСНОЕ ПРИВЕДЕНИЕ К СТРОКЕ ---
-            # AI может вернуть число 123 вместо "123", поэтому оборачиваем в str()
-            inp_str = str(test.get("input", ""))
-            exp_str = str(test.get("expected", ""))
-
-            # Теперь replace сработает без ошибок
-            safe_inp = inp_str.replace("null", "None").replace("true", "True").replace("false", "False")
-            safe_exp = exp_str.replace("null", "None").replace("true", "True").replace("false", "False")
-
+        for i, fixture in enumerate(fixtures, start=first_index):
+            entry = {"test": i + 1}
             try:
-                args = eval(f"({safe_inp})")
-                if not isinstance(args, tuple): args = (args,)
-                expected = eval(safe_exp)
+                # Своя копия аргументов на каждый запуск: решение может менять их на месте
+                parsed = pickle.loads(fixture)
+                if isinstance(parsed, Exception):
+                    raise parsed
+                args, expected = parsed
 
-                actual = user_func(*args)
+                actual = profile_call(user_func, args, entry)
 
                 if str(actual) == str(expected):
                     response["passed"] += 1
+                    entry["status"] = "passed"
                 else:
                     response["logs"].append(f"❌ Test {i + 1}: FAIL. Exp: {expected}, Got: {actual}")
+                    entry["status"] = "failed"
+                    entry["diff"] = {"expected": short_repr(expected), "actual": short_repr(actual)}
+            except MemoryError:
+                raise
             except Exception as e:
                 response["logs"].append(f"⚠️ Test {i + 1}: Error {e}")
+                entry["status"] = "error"
+            response["tests"].append(entry)
 
         response["output"] = capture.getvalue()
 
+    except MemoryError:
+        # В режиме kernel сюда приводит RLIMIT_AS: аллокация не прошла
+        response = dict(MLE_ERROR)
     except Exception as e:
         response["status"] = "error"
         response["traceback"] = traceback.format_exc()
     finally:
         sys.stdout = original_stdout
-        result_queue.put(response)
 
+    return response
 
-# --- MAIN ENGINE CLASS ---
-class InterviewEngine:
+
+def _unsafe_test_runner(code: str, fixtures: List[bytes], result_conn, first_index: int = 0):
+    if kernel_limits_enabled():
+        apply_memory_limit()
+        arm_cpu_limit()
+    result_conn.send(_execute_tests(code, fixtures, first_index))
+
+
+def _sandbox_worker_loop(conn):
+    # Прогреваем модули, которые чаще всего импортируют решения,
+    # чтобы первый запуск в воркере не платил за их загрузку
+    import types, math, collections, itertools, functools, heapq, bisect, string  # noqa: F401
+
+    kernel_limits = kernel_limits_enabled()
+    if kernel_limits:
+        apply_memory_limit()
+
+    # Сам воркер кода кандидатов не выполняет: на каждое задание форк от прогретого воркера,
+    # поэтому подмена builtins или состояние модулей не переживают задание
+    forking = hasattr(os, "fork")
+    child = {"pid": 0}
+
+    def stop(signum, frame):
+        # Пул останавливает воркер по таймауту: вместе с ним убиваем и зависший форк
+        if child["pid"]:
+            try:
+                os.kill(child["pid"], signal.SIGKILL)
+            except OSError:
+                pass
+        os._exit(0)
+
+    if forking:
+        signal.signal(signal.SIGTERM, stop)
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+        if forking:
+            conn.send(_run_forked(job, kernel_limits, child))
+            continue
+        code, fixtures, first_index = job
+        if kernel_limits:
+            arm_cpu_limit()
+        conn.send(_execute_tests(code, fixtures, first_index))
+
+
+def _run_forked(job, kernel_limits: bool, child: Dict[str, int]) -> Dict[str, Any]:
+    code, fixtures, first_index = job
+    result_r, result_w = multiprocessing.Pipe(duplex=False)
+    pid = os.fork()
+    if pid == 0:
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            result_r.close()
+            if kernel_limits:
+                arm_cpu_limit()
+            result_w.send(_execute_tests(code, fixtures, first_index))
+        finally:
+            os._exit(0)
+
+    child["pid"] = pid
+    result_w.close()
+    try:
+        # Сначала читаем результат, потом ждем выход: иначе большой результат заблокирует форк в send
+        result = result_r.recv()
+    except EOFError:
+        result = None
+    finally:
+        result_r.close()
+    _, status = os.waitpid(pid, 0)
+    child["pid"] = 0
+    if result is None:
+        # Форк убит лимитом ядра; cgroup у воркера и форка общий
+        return _exit_code_error(os.waitstatus_to_exitcode(status), os.getpid())
+    return result
+
+
+# --- RESOURCE LIMITS ---
+def _exit_code_error(exitcode: int, cgroup_pid: int) -> Dict[str, Any]:
+    # Процесс умер, не отправив результат: причину берем из сигнала
+    return dict(LIMIT_ERRORS[exit_code_status(exitcode, cgroup_pid)])
+
+
+def _exit_status_error(process: multiprocessing.Process) -> Dict[str, Any]:
+    return dict(LIMIT_ERRORS[exit_status(process)])
+
+
+def _tree_rss_mb(ps_proc) -> float:
+    # Задание воркера из пула выполняется в его форке, поэтому смотрим и на дочерние процессы
+    rss = ps_proc.memory_info().rss
+    for child in ps_proc.children():
+        try:
+            rss = max(rss, child.memory_info().rss)
+        except Exception:
+            pass
+    return rss / 1024 / 1024
+
+
+def _wait_for_result(conn, process: multiprocessing.Process, ps_proc=None):
+    """
+    Ждет результат из пайпа или завершения процесса, без sleep.
+    Возвращает (result, finished): finished=False, если процесс пришлось остановить.
+    """
+    deadline = time.time() + TIME_LIMIT_SECONDS
+    # В режиме kernel память держит ядро, и будить себя раньше дедлайна незачем
+    step = None if kernel_limits_enabled() else 0.1
+
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return dict(TLE_ERROR), False
+
+        ready = multiprocessing.connection.wait(
+            [conn, process.sentinel], timeout=min(remaining, step) if step else remaining
+        )
+        if conn in ready:
+            try:
+                return conn.recv(), True
+            except EOFError:
+                return _exit_status_error(process), False
+        if process.sentinel in ready:
+            return _exit_status_error(process), False
+
+        if step and ps_proc:
+            try:
+                if _tree_rss_mb(ps_proc) > MEMORY_LIMIT_MB:
+                    return dict(MLE_ERROR), False
+            except Exception:
+                pass
+
+
+# --- SANDBOX POOL ---
+class _SandboxWorker:
     def __init__(self):
-        self.client = OpenAI(api_key=API_KEY, base_url=API_URL)
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_sandbox_worker_loop, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs_done = 0
+        try:
+            self.ps_proc = psutil.Process(self.process.pid)
+        except Exception:
+            self.ps_proc = None
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
 
-    def generate_task(self, level: str, topic: str) -> Dict[str, Any]:
+    def memory_mb(self) -> float:
+        if not self.ps_proc:
+            return 0.0
+        try:
+            return self.ps_proc.memory_info().rss / 1024 / 1024
+        except Exception:
+            return 0.0
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except Exception:
+            pass
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+        self.conn.close()
+        remove_cgroup(self.process.pid)
+
+
+class SandboxPool:
+    """
+    Пул заранее запущенных воркеров-песочниц.
+    Воркер пересоздается после max_jobs запусков или после нарушения лимитов.
+    """
+
+    def __init__(self, size: int = SANDBOX_POOL_SIZE, max_jobs: int = SANDBOX_MAX_JOBS_PER_WORKER):
+        self.size = size
+        self.max_jobs = max_jobs
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for _ in range(self.size):
+                self._idle.put(_SandboxWorker())
+
+    def shutdown(self):
+        with self._lock:
+            self._started = False
+            while True:
+                try:
+                    worker = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                worker.stop()
+
+    def acquire(self, timeout: float = 0.0):
+        # None -> свободных воркеров нет, вызывающий запускает отдельный процесс
+        if not self._started:
+            self.start()
+        try:
+            worker = self._idle.get(timeout=timeout) if timeout > 0 else self._idle.get_nowait()
+        except queue.Empty:
+            return None
+        if not worker.is_alive():
+            worker.kill()
+            worker = _SandboxWorker()
+        return worker
+
+    def release(self, worker: _SandboxWorker, broken: bool = False):
+        # Python не отдает память ОС, поэтому "раздувшийся" воркер тоже пересоздаем,
+        # иначе следующий запуск получит ложный Memory Limit Exceeded
+        worn_out = worker.jobs_done >= self.max_jobs or worker.memory_mb() > MEMORY_LIMIT_MB / 2
+        if broken or worn_out or not worker.is_alive():
+            worker.kill()
+            if not self._started:
+                return
+            worker = _SandboxWorker()
+        if self._started:
+            self._idle.put(worker)
+        else:
+            worker.stop()
+
+
+def _test_outcome(i: int, res):
+    """(passed, logs, output, entry) для результата одного теста (None — тест не запускался)."""
+    if res is None:
+        return 0, [f"{LIMIT_ICONS[SKIPPED]} Test {i + 1}: Skipped"], "", {"test": i + 1, "status": SKIPPED}
+    if res["status"] == "error":
+        status = LIMIT_TEST_STATUSES[res["traceback"]]
+        return 0, [f"{LIMIT_ICONS[status]} Test {i + 1}: {res['traceback']}"], "", {"test": i + 1, "status": status}
+    return res["passed"], res["logs"], res["output"], res["tests"][0]
+
+
+# --- MAIN ENGINE CLASS ---
+class InterviewEngine:
+    def __init__(self, sandbox_pool_size: int = SANDBOX_POOL_SIZE):
+        self.llm = llm
+        self.task_bank = open_task_bank()
+        self.task_producer = TaskProducer(self.generate_task_stream, self.task_bank, run_tests=self.run_code_safely)
+        self.task_pool = TaskPool(self.task_producer.produce)
+        self.sandbox_pool = SandboxPool(sandbox_pool_size) if sandbox_pool_size > 0 else None
+        self.result_cache = ResultCache()
+
+    async def generate_task(self, level: str, topic: str) -> Dict[str, Any]:
+        # Обычно задача уже готова в пуле; пустой пул — генерация по запросу, затем запасные задачи
+        task = await self.task_pool.get(level, topic)
+        return task if task is not None else self.get_fallback_task()
+
+    async def generate_task_stream(self, level: str, topic: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Генерация потоком: field на каждое готовое поле, затем task (возможно, частичный).
+        Поток модели обрывается на закрывающей скобке JSON, а не на max_tokens.
+        """
         seed = random.randint(1, 10000)
 
         prompt = f"""You are a Senior Tech Interviewer. Generate a coding problem in STRICT JSON.
@@ -134,6 +430,7 @@ class InterviewEngine:
     IMPORTANT: 
     - 'input' fields in tests MUST be valid Python arguments string (e.g. "[1, 2], 5" or "'hello'").
     - DO NOT write variable assignments like "s = 'abc'" in input. Just write "'abc'".
+    - 'input' and 'expected' MUST be plain literals only: no expressions or calls. Write 1000000000, not 10**9; "'aaaa'", not "'a'*4".
 
     JSON SCHEMA:
     {{
@@ -144,20 +441,27 @@ class InterviewEngine:
     "hidden_tests": [{{"input": "5, 5", "expected": "10"}}]
     }}"""
 
+        extractor = StreamingJSONExtractor()
         try:
-            resp = self.client.chat.completions.create(
-                model=MODEL_TASK,
-                messages=[
-                    {"role": "system", "content": prompt},
-                    {"role": "user", "content": f"Create a {level} problem about {topic}"}
-                    ],
-                max_tokens=1200,
-                temperature=0.8
-                )
-            return parse_json(resp.choices[0].message.content)
+            async with aclosing(self.llm.chat_visible_stream(
+                    MODEL_TASK,
+                    [
+                        {"role": "system", "content": prompt},
+                        {"role": "user", "content": f"Create a {level} problem about {topic}"}
+                        ],
+                    call_type="task",
+                    max_tokens=1200,
+                    temperature=0.8
+                    )) as tokens:
+                async for text in tokens:
+                    for key, value in extractor.feed(text):
+                        yield {"event": "field", "key": key, "value": value}
+                    if extractor.done:
+                        break
         except Exception as e:
             print(f"Generate Task Error: {e}")
-            return self.get_fallback_task()
+        task = salvage_task(extractor.partial())
+        yield {"event": "task", "task": task or None}
 
     def get_fallback_task(self):
         # Если AI упал, возвращаем одну из готовых задач
@@ -180,50 +484,159 @@ class InterviewEngine:
         return random.choice(tasks)
 
     def run_code_safely(self, code: str, test_cases: List[Dict]) -> Dict[str, Any]:
-        queue = multiprocessing.Queue()
-        process = multiprocessing.Process(target=_unsafe_test_runner, args=(code, test_cases, queue))
+        return self._cached_run(code, test_cases, "suite",
+                                lambda: self._run_fixtures(code, get_fixtures(test_cases)))
+
+    def _cached_run(self, code: str, test_cases: List[Dict], mode: str, run) -> Dict[str, Any]:
+        # Кандидаты жмут Run без изменений в коде: одинаковый прогон берем из кэша
+        key = ResultCache.make_key(code, test_cases, mode)
+        cached = self.result_cache.get(key)
+        if cached is not None:
+            cached["cached"] = True
+            return cached
+        result = run()
+        if is_stable_result(result, LIMIT_TEST_STATUSES):
+            self.result_cache.put(key, result)
+        return result
+
+    def _run_fixtures(self, code: str, fixtures: List[bytes], first_index: int = 0) -> Dict[str, Any]:
+        worker = self.sandbox_pool.acquire() if self.sandbox_pool else None
+        if worker is None:
+            return self._run_in_fresh_process(code, fixtures, first_index)
+        return self._run_in_worker(worker, code, fixtures, first_index)
+
+    def run_tests_parallel(self, code: str, test_cases: List[Dict], fail_fast: bool = False) -> Dict[str, Any]:
+        """
+        Каждый тест запускается отдельным заданием в песочнице со своим лимитом времени и памяти.
+        Зависший тест получает TLE, но уже пройденные тесты не теряются.
+        fail_fast=True прекращает запуск новых тестов после первого провала.
+        """
+        return collect_summary(self.iter_tests_parallel(code, test_cases, fail_fast))
+
+    def iter_tests_parallel(self, code: str, test_cases: List[Dict],
+                            fail_fast: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Потоковый вариант run_tests_parallel: {"event": "test", ...} на каждый завершенный тест
+        (в порядке завершения) и в конце {"event": "summary", "result": ...}.
+        """
+        key = ResultCache.make_key(code, test_cases, f"parallel:{fail_fast}")
+        cached = self.result_cache.get(key)
+        if cached is not None:
+            cached["cached"] = True
+            # Лог и вывод теста в итоге не разложены по тестам, поэтому хранятся рядом для повтора событий
+            replay = cached.pop("replay", [])
+            for entry, extra in zip(cached.get("tests", []), replay):
+                yield {"event": "test", **extra, **entry}
+            yield {"event": "summary", "result": cached}
+            return
+
+        replay = {}
+        for event in self._iter_parallel(code, test_cases, fail_fast):
+            if event["event"] == "test":
+                replay[event["test"]] = {"log": event.get("log"), "output": event.get("output", "")}
+            elif is_stable_result(event["result"], LIMIT_TEST_STATUSES):
+                result = event["result"]
+                tests = result.get("tests", [])
+                self.result_cache.put(key, dict(result, replay=[replay.get(t["test"], {}) for t in tests]))
+            yield event
+
+    def _iter_parallel(self, code: str, test_cases: List[Dict], fail_fast: bool) -> Iterator[Dict[str, Any]]:
+        fixtures = get_fixtures(test_cases)
+        total = len(fixtures)
+        if total == 0:
+            yield {"event": "summary", "result": self._run_fixtures(code, fixtures)}
+            return
+
+        parallelism = self.sandbox_pool.size if self.sandbox_pool else (os.cpu_count() or 1)
+        executor = ThreadPoolExecutor(max_workers=max(1, min(total, parallelism)))
+        futures = {executor.submit(self._run_fixtures, code, [fixture], i): i for i, fixture in enumerate(fixtures)}
+        results: List[Any] = [None] * total
+        pending = set(futures)
+
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                stop = False
+                for future in done:
+                    i = futures[future]
+                    res = future.result()
+                    results[i] = res
+                    if res["status"] == "error" and res.get("traceback") not in LIMIT_TEST_STATUSES:
+                        # Код не запустился вообще (синтаксис, нет solution) — остальные тесты не помогут
+                        yield {"event": "summary", "result": dict(res, total=total)}
+                        return
+                    passed, logs, output, entry = _test_outcome(i, res)
+                    yield {"event": "test", "log": logs[0] if logs else None, "output": output, **entry}
+                    # TLE/MLE/падение приходят без passed — смотрим на уже разобранный исход теста
+                    if fail_fast and not passed:
+                        stop = True
+                if stop:
+                    break
+        finally:
+            # Уже запущенные тесты доработают в фоне и вернут воркеры в пул
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        response = {"status": "ok", "passed": 0, "total": total, "logs": [], "output": "", "tests": []}
+        for i, res in enumerate(results):
+            passed, logs, output, entry = _test_outcome(i, res)
+            if res is None:
+                yield {"event": "test", "log": logs[0], **entry}
+            response["passed"] += passed
+            response["logs"].extend(logs)
+            response["output"] += output
+            response["tests"].append(entry)
+        yield {"event": "summary", "result": response}
+
+    def _run_in_worker(self, worker: _SandboxWorker, code: str, fixtures: List[bytes],
+                       first_index: int = 0) -> Dict[str, Any]:
+        broken = True
+
+        try:
+            worker.conn.send((code, fixtures, first_index))
+            result, finished = _wait_for_result(worker.conn, worker.process, worker.ps_proc)
+            if finished:
+                worker.jobs_done += 1
+                # Счетчик OOM в cgroup воркера не сбрасывается: после нарушения лимита воркер меняем
+                broken = result.get("traceback") in LIMIT_TEST_STATUSES
+            return result
+
+        except Exception as e:
+            return {"status": "error", "traceback": str(e)}
+        finally:
+            # Воркер, превысивший лимит или упавший, не возвращается в пул
+            self.sandbox_pool.release(worker, broken=broken)
+
+    def _run_in_fresh_process(self, code: str, fixtures: List[bytes], first_index: int = 0) -> Dict[str, Any]:
+        parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=_unsafe_test_runner,
+                                          args=(code, fixtures, child_conn, first_index))
 
         process.start()
-        pid = process.pid
+        child_conn.close()
 
         try:
-            ps_proc = psutil.Process(pid)
+            ps_proc = psutil.Process(process.pid)
         except:
             ps_proc = None
 
-        start_time = time.time()
-
         try:
-            while process.is_alive():
-                if time.time() - start_time > TIME_LIMIT_SECONDS:
-                    process.terminate()
-                    process.join()
-                    return {"status": "error", "traceback": "Time Limit Exceeded"}
-
-                if ps_proc:
-                    try:
-                        mem = ps_proc.memory_info().rss / 1024 / 1024
-                        if mem > MEMORY_LIMIT_MB:
-                            process.terminate()
-                            process.join()
-                            return {"status": "error", "traceback": "Memory Limit Exceeded"}
-                    except:
-                        pass
-
-                time.sleep(0.1)
-
-            process.join()
-
-            if not queue.empty():
-                return queue.get()
-            return {"status": "error", "traceback": "Process crashed unexpectedly"}
+            result, _ = _wait_for_result(parent_conn, process, ps_proc)
+            return result
 
         except Exception as e:
             return {"status": "error", "traceback": str(e)}
+        finally:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+            parent_conn.close()
+            remove_cgroup(process.pid)
 
-    def chat_with_ai(self, message: str, task_desc: str, code: str) -> str:
-        print(f"--- CHAT REQUEST ---\nUser: {message}\nTask: {task_desc[:50]}...")  # ЛОГ В КОНСОЛЬ СЕРВЕРА
+    def _chat_prompt(self, message: str, task_desc: str, code: str) -> str:
         msg_upper = message.strip().upper()
+        # Вставки кандидата не должны раздувать каждый вызов чата
+        p = govern("chat", code_fields={"code": code}, text_fields={"task_desc": task_desc, "message": message})
+        message, task_desc, code = p["message"], p["task_desc"], p["code"]
 
         if "HELP" in msg_upper or "ПОМОГИТЕ" in msg_upper:
             sys_prompt = f"""You are a Socratic Mentor.
@@ -238,33 +651,56 @@ class InterviewEngine:
     Current Task: "{task_desc}"
 
     Answer politely as an organizer. Do not give hints unless they ask for HELP. Answer in Russian."""
+        return sys_prompt
+
+    async def chat_with_ai(self, message: str, task_desc: str, code: str) -> str:
+        print(f"--- CHAT REQUEST ---\nUser: {message}\nTask: {task_desc[:50]}...")  # ЛОГ В КОНСОЛЬ СЕРВЕРА
+        sys_prompt = self._chat_prompt(message, task_desc, code)
 
         try:
-            resp = self.client.chat.completions.create(
-                model=MODEL_CHAT,
-                messages=[{"role": "system", "content": sys_prompt}],
+            content = await self.llm.chat(
+                MODEL_CHAT,
+                [{"role": "system", "content": sys_prompt}],
+                call_type="chat",
                 temperature=0.7,
                 timeout=45  # <-- Добавим таймаут, чтобы долго не висеть
             )
-            reply = clean_text(resp.choices[0].message.content)
+            reply = clean_text(content)
             print(f"AI Reply: {reply}")  # ЛОГ ОТВЕТА
             return reply
         except Exception as e:
             print(f"CHAT ERROR: {e}")  # ЛОГ ОШИБКИ
             return f"Извини, я задумался (Ошибка: {str(e)})"
 
-    def analyze_solution(self, task: Dict, code: str, exec_res: Dict) -> Dict:
+    async def chat_with_ai_stream(self, message: str, task_desc: str, code: str) -> AsyncIterator[str]:
+        """Ответ чата по токенам: рассуждения <think> скрываются прямо в потоке."""
+        print(f"--- CHAT STREAM ---\nUser: {message}\nTask: {task_desc[:50]}...")
+        sent = False
+        try:
+            async for text in self.llm.chat_visible_stream(
+                    MODEL_CHAT, [{"role": "system", "content": self._chat_prompt(message, task_desc, code)}],
+                    call_type="chat", temperature=0.7, timeout=45):
+                sent = True
+                yield text
+        except Exception as e:
+            print(f"CHAT ERROR: {e}")
+            if not sent:
+                yield f"Извини, я задумался (Ошибка: {str(e)})"
+
+    async def analyze_solution(self, task: Dict, code: str, exec_res: Dict) -> Dict:
         ai_complexity = "O(?)"
         feedback = "Good job!"
 
         try:
-            resp = self.client.chat.completions.create(
-                model=MODEL_TASK,
-                messages=[{"role": "user",
-                           "content": f"Analyze complexity of this Python code:\n{code}\nOutput JSON: {{'time_complexity': '...', 'feedback': '...'}}"}],
+            content = await self.llm.chat_cached(
+                MODEL_TASK,
+                [{"role": "user",
+                  "content": f"Analyze complexity of this Python code:\n{govern('analyze', code_fields={'code': code})['code']}\nOutput JSON: {{'time_complexity': '...', 'feedback': '...'}}"}],
+                PROMPT_VERSION_ANALYZE, code_hash(code), call_type="analyze",
+                accept=json_with_keys("time_complexity", "feedback"),
                 temperature=0.1
             )
-            data = parse_json(resp.choices[0].message.content)
+            data = parse_json(content)
             ai_complexity = data.get("time_complexity", "Unknown")
             feedback = data.get("feedback", "Code looks okay.")
         except:
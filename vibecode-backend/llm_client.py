@@ -0,0 +1,649 @@
+"""
+Общий асинхронный LLM-слой для backend.py и InterviewEngine.
+Один AsyncOpenAI-клиент с общим пулом HTTP-соединений: параллельные интервью
+упираются в LLM-бэкенд, а не в потоки Python.
+"""
+import os
+import json
+import re
+import asyncio
+import time
+import random
+import hashlib
+from contextlib import aclosing
+from collections import OrderedDict, deque
+from typing import List, Dict, Any, AsyncIterator, Awaitable, Callable, Optional, Sequence, Tuple
+
+import httpx
+import numpy as np
+import openai
+from openai import AsyncOpenAI
+
+from prompt_budget import count_tokens
+from result_cache import disk_keys, remove_file
+
+# --- КОНФИГУРАЦИЯ ---
+API_URL = os.getenv("LLM_API_URL", "https://llm.t1v.scibox.tech/v1")
+API_KEY = os.getenv("LLM_API_KEY", "sk-BWpbCDueGfRzWIW7MCmCaQ")
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Пул соединений и таймауты (секунды)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+# Общий дедлайн вызова вместе с ретраями (секунды) и база экспоненциальной паузы с jitter
+LLM_CALL_DEADLINE = float(os.getenv("LLM_CALL_DEADLINE", "40"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.2"))
+# Бюджет ретраев: за окно не больше RATIO от числа запросов плюс MIN штук
+LLM_RETRY_BUDGET_RATIO = float(os.getenv("LLM_RETRY_BUDGET_RATIO", "0.2"))
+LLM_RETRY_BUDGET_MIN = int(os.getenv("LLM_RETRY_BUDGET_MIN", "3"))
+LLM_RETRY_BUDGET_WINDOW = 10.0
+# Circuit breaker на модель: сколько сбоев подряд открывают его и через сколько секунд пробовать снова
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+# Кэш ответов для детерминированных вызовов: размер, время жизни (секунды), каталог на диске
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "2048"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "")
+
+# Одинаковые одновременные запросы склеиваются в один. Только до этой температуры:
+# выше ответы намеренно случайные (генерация задач), и склейка дала бы повторы
+LLM_SINGLE_FLIGHT_MAX_TEMPERATURE = float(os.getenv("LLM_SINGLE_FLIGHT_MAX_TEMPERATURE", "0.5"))
+
+# Hedged-запросы: если основная модель не ответила за свой p95 (по типу вызова), тот же запрос
+# уходит в запасную модель и берется первый ответ. Окно замеров и сколько их нужно для p95
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "200"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+# Пока замеров мало, hedge идет через фиксированную паузу; раньше минимальной паузы — никогда
+LLM_HEDGE_COLD_DELAY = float(os.getenv("LLM_HEDGE_COLD_DELAY", "15"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+# Hedged-запросов за окно не больше этой доли от всех: при общей деградации нагрузку не удваиваем
+LLM_HEDGE_BUDGET_RATIO = float(os.getenv("LLM_HEDGE_BUDGET_RATIO", "0.1"))
+# Запасной эндпоинт: модели с суффиксом "@alt" в маршрутах идут туда
+LLM_ALT_API_URL = os.getenv("LLM_ALT_API_URL", "")
+LLM_ALT_API_KEY = os.getenv("LLM_ALT_API_KEY", API_KEY)
+ALT_SUFFIX = "@alt"
+
+
+class ThinkFilter:
+    """
+    Вырезает <think>...</think> из потока токенов по мере поступления.
+    Тег может прийти разрезанным между чанками, поэтому возможное начало тега придерживаем.
+    """
+    OPEN, CLOSE = "<think>", "</think>"
+
+    def __init__(self):
+        self._buf = ""
+        self._inside = False
+        self._started = False
+
+    @staticmethod
+    def _partial_tag(text: str, tag: str) -> int:
+        for k in range(min(len(tag) - 1, len(text)), 0, -1):
+            if text.endswith(tag[:k]):
+                return k
+        return 0
+
+    def _visible(self, text: str) -> str:
+        # Пробелы и переводы строк перед первым видимым символом (обычно после </think>) не шлем
+        if not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        return text
+
+    def feed(self, chunk: str) -> str:
+        self._buf += chunk
+        out = []
+        while True:
+            tag = self.CLOSE if self._inside else self.OPEN
+            i = self._buf.find(tag)
+            if i < 0:
+                break
+            if not self._inside:
+                out.append(self._visible(self._buf[:i]))
+            self._buf = self._buf[i + len(tag):]
+            self._inside = not self._inside
+        keep = self._partial_tag(self._buf, self.CLOSE if self._inside else self.OPEN)
+        if not self._inside:
+            out.append(self._visible(self._buf[:len(self._buf) - keep]))
+        self._buf = self._buf[len(self._buf) - keep:]
+        return "".join(out)
+
+    def flush(self) -> str:
+        # Незакрытый <think> так и остается скрытым
+        rest = "" if self._inside else self._visible(self._buf)
+        self._buf = ""
+        return rest
+
+
+# Сбои, при которых модель считается недоступной: их ретраим и считаем в breaker
+RETRYABLE_ERRORS = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError,
+                    asyncio.TimeoutError)
+
+
+class CircuitOpenError(Exception):
+    """Breaker модели открыт: вызов отклонен сразу, без обращения к сети."""
+
+
+class CircuitBreaker:
+    """
+    closed -> open после failures сбоев подряд; через reset_seconds — half_open,
+    пропускается один пробный вызов: успех закрывает breaker, сбой снова открывает.
+    """
+
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, reset_seconds: float = LLM_BREAKER_RESET_SECONDS):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.rejected = 0
+        self.opened = 0
+
+    def before_call(self):
+        if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self.state = "half_open"
+        if self.state == "open" or (self.state == "half_open" and self._probing):
+            self.rejected += 1
+            raise CircuitOpenError("LLM недоступна (circuit breaker открыт)")
+        if self.state == "half_open":
+            self._probing = True
+
+    def record_success(self):
+        self.state = "closed"
+        self._consecutive = 0
+        self._probing = False
+
+    def record_cancel(self):
+        # Пробный вызов отменен (клиент ушел) — следующий вызов снова сможет пробовать
+        self._probing = False
+
+    def record_failure(self):
+        self._consecutive += 1
+        if self.state == "half_open" or self._consecutive >= self.failures:
+            if self.state != "open":
+                self.opened += 1
+            self.state = "open"
+            self._opened_at = time.monotonic()
+        self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self._consecutive,
+                "opened": self.opened, "rejected": self.rejected}
+
+
+class RetryBudget:
+    """Ретраев за окно не больше ratio * запросов + min: при общем сбое ретраи не удваивают нагрузку."""
+
+    def __init__(self, ratio: float = LLM_RETRY_BUDGET_RATIO, minimum: int = LLM_RETRY_BUDGET_MIN,
+                 window: float = LLM_RETRY_BUDGET_WINDOW):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.window = window
+        self._requests: deque = deque()
+        self._retries: deque = deque()
+        self.exhausted = 0
+
+    def _trim(self, now: float):
+        for q in (self._requests, self._retries):
+            while q and now - q[0] > self.window:
+                q.popleft()
+
+    def record_request(self):
+        # Без ретраев try_retry не вызывается, поэтому окно чистим и здесь — иначе очередь растет бесконечно
+        now = time.monotonic()
+        self._trim(now)
+        self._requests.append(now)
+
+    def try_retry(self) -> bool:
+        now = time.monotonic()
+        self._trim(now)
+        if len(self._retries) >= self.minimum + self.ratio * len(self._requests):
+            self.exhausted += 1
+            return False
+        self._retries.append(now)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        self._trim(time.monotonic())
+        return {"requests": len(self._requests), "retries": len(self._retries), "exhausted": self.exhausted}
+
+
+class LatencyTracker:
+    """Скользящее окно длительностей вызовов по (модель, тип вызова)."""
+
+    def __init__(self, window: int = LLM_LATENCY_WINDOW, min_samples: int = LLM_HEDGE_MIN_SAMPLES):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[Tuple[str, str], deque] = {}
+
+    def record(self, model: str, call_type: str, seconds: float):
+        key = (model, call_type)
+        if key not in self._samples:
+            self._samples[key] = deque(maxlen=self.window)
+        self._samples[key].append(seconds)
+
+    def percentile(self, model: str, call_type: str, q: float) -> Optional[float]:
+        """None, пока замеров меньше min_samples."""
+        samples = self._samples.get((model, call_type))
+        if not samples or len(samples) < self.min_samples:
+            return None
+        return float(np.percentile(samples, q))
+
+    def stats(self) -> Dict[str, Any]:
+        return {f"{model}:{call_type}": {"samples": len(s),
+                                         "p50": round(float(np.percentile(s, 50)), 3),
+                                         "p95": round(float(np.percentile(s, 95)), 3)}
+                for (model, call_type), s in self._samples.items() if s}
+
+
+class RoutePolicy:
+    """
+    Маршрут типа вызова. Основная модель задается в месте вызова, alternates — куда
+    слать hedged-запрос (по порядку, первая с не открытым breaker).
+    """
+
+    def __init__(self, alternates: Sequence[str] = (), hedge: bool = True,
+                 percentile: float = LLM_HEDGE_PERCENTILE):
+        self.alternates = list(alternates)
+        self.hedge = hedge
+        self.percentile = percentile
+
+    def __repr__(self):
+        return f"RoutePolicy({self.alternates!r}, hedge={self.hedge})"
+
+
+def parse_route(spec: str) -> RoutePolicy:
+    """"off" — без hedge; иначе запасные модели через запятую: "qwen3-32b-awq,qwen3-32b-awq@alt"."""
+    if spec.strip().lower() == "off":
+        return RoutePolicy(hedge=False)
+    return RoutePolicy([m.strip() for m in spec.split(",") if m.strip()])
+
+
+class ResponseCache:
+    """
+    LRU ответов LLM с TTL и необязательным сохранением на диск (по JSON-файлу на ключ).
+    Вытесненный или просроченный ключ удаляется и с диска. Используется только из event loop,
+    поэтому блокировки не нужны.
+    """
+
+    def __init__(self, max_size: int = LLM_CACHE_SIZE, ttl: float = LLM_CACHE_TTL, cache_dir: str = LLM_CACHE_DIR):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self._items: "OrderedDict[str, Optional[tuple]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Файлы прошлых запусков — ключи без значения, читаются при первом get
+            for key in disk_keys(cache_dir, max_age=ttl):
+                self._items[key] = None
+            self._evict()
+
+    @staticmethod
+    def make_key(model: str, version: str, key_input: str) -> str:
+        return hashlib.sha256(f"{model}\0{version}\0{key_input}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        item = self._items.get(key)
+        if item is None and key in self._items:
+            try:
+                with open(self._path(key), encoding="utf-8") as f:
+                    data = json.load(f)
+                item = self._items[key] = (data["expires_at"], data["value"])
+            except (OSError, ValueError, KeyError):
+                item = None
+        if item is None or item[0] < time.time():
+            if key in self._items:
+                self._forget(key)
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def put(self, key: str, value: str):
+        item = (time.time() + self.ttl, value)
+        self._remember(key, item)
+        if self.cache_dir:
+            tmp = self._path(key) + ".tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump({"expires_at": item[0], "value": value}, f, ensure_ascii=False)
+                os.replace(tmp, self._path(key))
+            except OSError:
+                pass
+
+    def _remember(self, key: str, item: tuple):
+        self._items[key] = item
+        self._items.move_to_end(key)
+        self._evict()
+
+    def _evict(self):
+        while len(self._items) > self.max_size:
+            self._forget(next(iter(self._items)))
+
+    def _forget(self, key: str):
+        self._items.pop(key, None)
+        if self.cache_dir:
+            remove_file(self._path(key))
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"size": len(self._items), "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0}
+
+
+def json_with_keys(*keys: str) -> Callable[[str], bool]:
+    """accept для chat_cached: в кэш идет только целый JSON-объект со всеми нужными полями."""
+    def accept(content: str) -> bool:
+        clean = re.sub(r'<think>.*?</think>', '', content, flags=re.DOTALL)
+        match = re.search(r'\{.*\}', clean, re.DOTALL)
+        try:
+            data = json.loads(match.group(0) if match else clean)
+        except ValueError:
+            return False
+        return isinstance(data, dict) and all(k in data for k in keys)
+    return accept
+
+
+class LLMClient:
+    def __init__(self, api_key: str = API_KEY, base_url: str = API_URL,
+                 max_connections: int = LLM_MAX_CONNECTIONS, max_keepalive: int = LLM_MAX_KEEPALIVE,
+                 timeout: float = LLM_TIMEOUT):
+        self.http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive),
+            timeout=httpx.Timeout(timeout, connect=LLM_CONNECT_TIMEOUT),
+        )
+        # Ретраи делаем сами (с бюджетом и breaker), встроенные в SDK выключены
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=self.http, max_retries=0)
+        self.alt_client = (AsyncOpenAI(api_key=LLM_ALT_API_KEY, base_url=LLM_ALT_API_URL, http_client=self.http,
+                                       max_retries=0) if LLM_ALT_API_URL else None)
+        self.timeout = timeout
+        self.cache = ResponseCache()
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.retry_budget = RetryBudget()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+        self.prompt_tokens: Dict[str, Dict[str, int]] = {}
+        self.routes: Dict[str, Optional[RoutePolicy]] = {}
+        self.latency = LatencyTracker()
+        self.hedge_budget = RetryBudget(ratio=LLM_HEDGE_BUDGET_RATIO, minimum=1)
+        self.hedges = {"fired": 0, "won": 0, "rerouted": 0}
+
+    def _log_prompt(self, call_type: str, model: str, messages: List[Dict[str, str]]):
+        """Пишет в лог и в счетчики, сколько токенов промпта реально уходит в модель."""
+        tokens = sum(count_tokens(m.get("content", "")) for m in messages)
+        stat = self.prompt_tokens.setdefault(call_type, {"calls": 0, "tokens": 0, "max": 0})
+        stat["calls"] += 1
+        stat["tokens"] += tokens
+        stat["max"] = max(stat["max"], tokens)
+        print(f"[llm] {call_type} -> {model}: {tokens} prompt tokens")
+
+    async def _single_flight(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Ждет уже идущий запрос с тем же ключом или запускает новый.
+        shield: отмена одного ожидающего (клиент ушел) не отменяет запрос для остальных.
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            future = self._inflight[key] = asyncio.ensure_future(call())
+            future.add_done_callback(lambda f: self._forget(key, f))
+        return await asyncio.shield(future)
+
+    def _forget(self, key: str, future: asyncio.Future):
+        self._inflight.pop(key, None)
+        # Если все ожидающие ушли, ошибку запроса некому забрать — забираем сами, без warning в лог
+        if not future.cancelled():
+            future.exception()
+
+    @staticmethod
+    def _request_key(kind: str, payload: Dict[str, Any]) -> str:
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(f"{kind}\0{raw}".encode("utf-8")).hexdigest()
+
+    def configure_routes(self, routes: Dict[str, RoutePolicy]):
+        """Маршруты по типу вызова; LLM_ROUTE_<ТИП> из окружения важнее переданных."""
+        for call_type, policy in routes.items():
+            spec = os.getenv(f"LLM_ROUTE_{call_type.upper()}")
+            self.routes[call_type] = parse_route(spec) if spec else policy
+
+    def route(self, call_type: str) -> Optional[RoutePolicy]:
+        if call_type not in self.routes:
+            spec = os.getenv(f"LLM_ROUTE_{call_type.upper()}")
+            self.routes[call_type] = parse_route(spec) if spec else None
+        return self.routes[call_type]
+
+    def _resolve(self, target: str) -> Tuple[AsyncOpenAI, str]:
+        """Клиент и имя модели для цели маршрута ("модель" или "модель@alt")."""
+        if target.endswith(ALT_SUFFIX) and self.alt_client is not None:
+            return self.alt_client, target[:-len(ALT_SUFFIX)]
+        return self.client, target
+
+    def hedge_delay(self, model: str, call_type: str, policy: RoutePolicy) -> float:
+        p = self.latency.percentile(model, call_type, policy.percentile)
+        return max(LLM_HEDGE_MIN_DELAY, LLM_HEDGE_COLD_DELAY if p is None else p)
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        if model not in self.breakers:
+            self.breakers[model] = CircuitBreaker()
+        return self.breakers[model]
+
+    async def _guarded(self, model: str, call: Callable[[float], Awaitable[Any]],
+                       timeout: Optional[float] = None, deadline: float = LLM_CALL_DEADLINE) -> Any:
+        """
+        Вызов модели через breaker: ретраи с jitter, пока позволяют бюджет и дедлайн.
+        call получает таймаут одной попытки. Открытый breaker — CircuitOpenError сразу.
+        """
+        breaker = self.breaker(model)
+        ends_at = time.monotonic() + deadline
+        self.retry_budget.record_request()
+        attempt = 0
+        while True:
+            breaker.before_call()
+            remaining = ends_at - time.monotonic()
+            try:
+                attempt_timeout = max(0.1, min(timeout or self.timeout, remaining))
+                result = await asyncio.wait_for(call(attempt_timeout), attempt_timeout)
+            except RETRYABLE_ERRORS:
+                breaker.record_failure()
+                attempt += 1
+                delay = random.uniform(0, LLM_RETRY_BASE_DELAY * 2 ** attempt)
+                if (attempt > LLM_MAX_RETRIES or ends_at - time.monotonic() <= delay
+                        or not self.retry_budget.try_retry()):
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except asyncio.CancelledError:
+                breaker.record_cancel()
+                raise
+            except Exception:
+                # Ошибка запроса (4xx и т.п.): модель отвечает, значит она доступна
+                breaker.record_success()
+                raise
+            breaker.record_success()
+            return result
+
+    async def _chat_upstream(self, model: str, messages: List[Dict[str, str]], call_type: str,
+                             **params: Any) -> str:
+        self._log_prompt(call_type, model, messages)
+        timeout = params.pop("timeout", None)
+        deadline = params.pop("deadline", LLM_CALL_DEADLINE)
+        client, model_name = self._resolve(model)
+
+        async def call(attempt_timeout: float) -> str:
+            resp = await client.chat.completions.create(model=model_name, messages=messages,
+                                                        timeout=attempt_timeout, **params)
+            return resp.choices[0].message.content or ""
+
+        started = time.monotonic()
+        try:
+            result = await self._guarded(model, call, timeout, deadline)
+        except asyncio.CancelledError:
+            # Проигравший hedge отменяется; его время — оценка снизу, без нее p95 медленной модели занижался бы
+            self.latency.record(model, call_type, time.monotonic() - started)
+            raise
+        self.latency.record(model, call_type, time.monotonic() - started)
+        return result
+
+    async def _chat_routed(self, model: str, messages: List[Dict[str, str]], call_type: str,
+                           **params: Any) -> Tuple[str, str]:
+        """
+        Вызов по маршруту call_type; возвращает (ответ, модель, которая его дала).
+        Основная модель не ответила за свой p95 — тот же запрос уходит в запасную и берется
+        первый ответ. Основная сразу недоступна (breaker, сбой) — запрос переводится на запасную целиком.
+        """
+        policy = self.route(call_type)
+        alternates = [t for t in policy.alternates if t != model] if policy and policy.hedge else []
+        if not alternates:
+            return await self._chat_upstream(model, messages, call_type, **params), model
+
+        self.hedge_budget.record_request()
+        primary = asyncio.ensure_future(self._chat_upstream(model, messages, call_type, **params))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay(model, call_type, policy))
+            failed = bool(done) and isinstance(primary.exception(), RETRYABLE_ERRORS + (CircuitOpenError,))
+            if done and not failed:
+                return primary.result(), model
+            alternate = next((t for t in alternates if self.breaker(t).state != "open"), None)
+            if alternate is None:
+                return await primary, model
+            if failed:
+                self.hedges["rerouted"] += 1
+                return await self._chat_upstream(alternate, messages, call_type, **params), alternate
+            if not self.hedge_budget.try_retry():
+                return await primary, model
+            self.hedges["fired"] += 1
+            hedge = asyncio.ensure_future(self._chat_upstream(alternate, messages, call_type, **params))
+            winner = await self._first_success(primary, hedge)
+            if winner is hedge:
+                self.hedges["won"] += 1
+                return winner.result(), alternate
+            return winner.result(), model
+        finally:
+            primary.cancel()
+
+    @staticmethod
+    async def _first_success(*futures: asyncio.Future) -> asyncio.Future:
+        """Первый успешно завершившийся; остальные отменяются. Все упали — ошибка последнего."""
+        pending = set(futures)
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        return future
+                    error = future.exception()
+            raise error
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def chat(self, model: str, messages: List[Dict[str, str]], call_type: str = "chat", **params: Any) -> str:
+        content, _ = await self._chat_answered(model, messages, call_type, **params)
+        return content
+
+    async def _chat_answered(self, model: str, messages: List[Dict[str, str]], call_type: str = "chat",
+                             **params: Any) -> Tuple[str, str]:
+        if params.get("temperature", 1.0) > LLM_SINGLE_FLIGHT_MAX_TEMPERATURE:
+            return await self._chat_routed(model, messages, call_type, **params)
+        key = self._request_key("chat", {"model": model, "messages": messages, **params})
+        return await self._single_flight(key, lambda: self._chat_routed(model, messages, call_type, **params))
+
+    async def chat_cached(self, model: str, messages: List[Dict[str, str]], version: str, key_input: str,
+                          accept: Callable[[str], bool] = bool, **params: Any) -> str:
+        """
+        chat для почти детерминированных вызовов: ключ — (модель, версия промпта, нормализованный вход).
+        В кэш попадает только ответ, прошедший accept (например, разобравшийся JSON), и только
+        от запрошенной модели: ответ запасной (hedge, перевод маршрута) под ее ключом не сохраняем.
+        """
+        key = ResponseCache.make_key(model, version, key_input)
+        content = self.cache.get(key)
+        if content is not None:
+            return content
+        content, answered_by = await self._chat_answered(model, messages, **params)
+        if answered_by == model and accept(content):
+            self.cache.put(key, content)
+        return content
+
+    async def chat_stream(self, model: str, messages: List[Dict[str, str]], call_type: str = "chat",
+                          **params: Any) -> AsyncIterator[str]:
+        """Текст ответа по чанкам, как их отдает модель (вместе с <think>)."""
+        self._log_prompt(call_type, model, messages)
+        timeout = params.pop("timeout", None)
+        deadline = params.pop("deadline", LLM_CALL_DEADLINE)
+
+        client, model_name = self._resolve(model)
+
+        # Через breaker и ретраи идет только открытие потока: начатый ответ не повторяем
+        async def call(attempt_timeout: float):
+            return await client.chat.completions.create(model=model_name, messages=messages, stream=True,
+                                                        timeout=attempt_timeout, **params)
+
+        stream = await self._guarded(model, call, timeout, deadline)
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Потребитель может бросить поток раньше (JSON уже закрыт) — обрываем генерацию на сервере
+            await stream.close()
+
+    async def chat_visible_stream(self, model: str, messages: List[Dict[str, str]],
+                                  **params: Any) -> AsyncIterator[str]:
+        """То же, что chat_stream, но без рассуждений <think>...</think>."""
+        think = ThinkFilter()
+        async with aclosing(self.chat_stream(model, messages, **params)) as tokens:
+            async for token in tokens:
+                text = think.feed(token)
+                if text:
+                    yield text
+        tail = think.flush()
+        if tail:
+            yield tail
+
+    async def embed(self, text: str, model: str = EMBEDDING_MODEL) -> np.ndarray:
+        return (await self.embed_many([text], model))[0]
+
+    async def embed_many(self, texts: List[str], model: str = EMBEDDING_MODEL) -> List[np.ndarray]:
+        """Один запрос embeddings.create на весь список; порядок ответа совпадает с texts."""
+        key = self._request_key("embed", {"model": model, "input": texts})
+        # Список копируем: его получают все склеенные вызывающие
+        return list(await self._single_flight(key, lambda: self._embed_upstream(texts, model)))
+
+    async def _embed_upstream(self, texts: List[str], model: str) -> List[np.ndarray]:
+        async def call(attempt_timeout: float) -> List[np.ndarray]:
+            resp = await self.client.embeddings.create(model=model, input=texts, timeout=attempt_timeout)
+            data = sorted(resp.data, key=lambda d: d.index)
+            return [np.array(d.embedding, dtype=np.float32) for d in data]
+
+        return await self._guarded(model, call)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"cache": self.cache.stats(),
+                "single_flight": {"in_flight": len(self._inflight), "coalesced": self.coalesced},
+                "breakers": {model: b.stats() for model, b in self.breakers.items()},
+                "retry_budget": self.retry_budget.stats(),
+                "prompt_tokens": self.prompt_tokens,
+                "routing": {"routes": {t: repr(p) for t, p in self.routes.items() if p},
+                            "latency": self.latency.stats(), "hedges": self.hedges,
+                            "hedge_budget": self.hedge_budget.stats()}}
+
+    async def aclose(self):
+        await self.http.aclose()
+
+
+llm = LLMClient()
@@ -0,0 +1,264 @@
+"""
+Локальная замена LLM-эндпоинта для нагрузочных тестов: OpenAI-совместимые
+/v1/chat/completions (обычный ответ и stream) и /v1/embeddings.
+Ответы заготовлены по типу промпта (задача, review, AI-детектор, сложность...),
+задержки берутся из заданного распределения. Все детерминировано: одинаковый
+запрос при одинаковом LLM_STUB_SEED дает тот же ответ и ту же задержку.
+
+Запуск:  python llm_stub.py --port 9000 --latency lognormal:0.8,0.5
+Сервисы: LLM_API_URL=http://localhost:9000/v1 uvicorn backend:app --port 8000
+"""
+import os
+import re
+import json
+import time
+import zlib
+import random
+import asyncio
+import hashlib
+import argparse
+from typing import Any, Dict, List
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# --- КОНФИГУРАЦИЯ ---
+# Распределение задержки ответа (до первого токена для stream):
+# fixed:S | uniform:LO,HI | lognormal:MEDIAN,SIGMA — в секундах
+LLM_STUB_LATENCY = os.getenv("LLM_STUB_LATENCY", "lognormal:0.8,0.5")
+# Отдельные распределения для моделей: "qwen3-32b-awq=lognormal:2,0.6;other=fixed:1"
+LLM_STUB_MODEL_LATENCY = os.getenv("LLM_STUB_MODEL_LATENCY", "")
+LLM_STUB_EMBED_LATENCY = os.getenv("LLM_STUB_EMBED_LATENCY", "fixed:0.05")
+# Пауза между чанками потока и длина чанка в символах (примерно один токен)
+LLM_STUB_TOKEN_DELAY = float(os.getenv("LLM_STUB_TOKEN_DELAY", "0.01"))
+LLM_STUB_CHUNK_CHARS = int(os.getenv("LLM_STUB_CHUNK_CHARS", "4"))
+# Доля запросов, на которые отвечаем 503 (проверка ретраев и breaker)
+LLM_STUB_ERROR_RATE = float(os.getenv("LLM_STUB_ERROR_RATE", "0"))
+LLM_STUB_SEED = int(os.getenv("LLM_STUB_SEED", "42"))
+LLM_STUB_EMBEDDING_DIM = int(os.getenv("LLM_STUB_EMBEDDING_DIM", "1536"))
+# Модель с рассуждениями: ответ начинается с <think>...</think>, как у настоящей
+LLM_STUB_THINK_MODEL = os.getenv("LLM_STUB_THINK_MODEL", "qwen3-32b-awq")
+
+TASKS = [
+    {
+        "title": "Сумма чисел",
+        "description": "Дан список целых чисел `nums`. Верните сумму всех элементов.",
+        "difficulty": "Junior",
+        "initial_code": "def solution(nums):\n    pass",
+        "reference_solution": "def solution(nums):\n    return sum(nums)",
+        "public_tests": [{"input": "[1, 2, 3]", "expected": "6"}, {"input": "[]", "expected": "0"}],
+        "hidden_tests": [{"input": "[-1, 1]", "expected": "0"},
+                         {"input": "[1000000000, 1000000000]", "expected": "2000000000"},
+                         {"input": "[5]", "expected": "5"}],
+    },
+    {
+        "title": "Палиндром",
+        "description": "Дана строка `s`. Верните `True`, если она читается одинаково в обе стороны.",
+        "difficulty": "Junior",
+        "initial_code": "def solution(s):\n    pass",
+        "reference_solution": "def solution(s):\n    return s == s[::-1]",
+        "public_tests": [{"input": "'abba'", "expected": "True"}, {"input": "'abc'", "expected": "False"}],
+        "hidden_tests": [{"input": "''", "expected": "True"}, {"input": "'a'", "expected": "True"},
+                         {"input": "'ab'", "expected": "False"}],
+    },
+    {
+        "title": "Два числа с суммой",
+        "description": "Дан список `nums` и число `target`. Верните индексы двух элементов с суммой `target`.",
+        "difficulty": "Middle",
+        "initial_code": "def solution(nums, target):\n    pass",
+        "reference_solution": ("def solution(nums, target):\n    seen = {}\n    for i, x in enumerate(nums):\n"
+                               "        if target - x in seen:\n            return [seen[target - x], i]\n"
+                               "        seen[x] = i\n    return []"),
+        "public_tests": [{"input": "[2, 7, 11, 15], 9", "expected": "[0, 1]"},
+                         {"input": "[3, 2, 4], 6", "expected": "[1, 2]"}],
+        "hidden_tests": [{"input": "[3, 3], 6", "expected": "[0, 1]"}, {"input": "[1, 2], 7", "expected": "[]"},
+                         {"input": "[0, 4, 3, 0], 0", "expected": "[0, 3]"}],
+    },
+]
+
+
+def parse_latency(spec: str):
+    """Функция rng -> задержка в секундах по строке вида lognormal:0.8,0.5."""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda rng: median * float(np.exp(rng.gauss(0, sigma)))
+    raise ValueError(f"Неизвестное распределение задержки: {spec}")
+
+
+def parse_model_latency(spec: str) -> Dict[str, Any]:
+    result = {}
+    for item in spec.split(";"):
+        model, _, latency = item.strip().partition("=")
+        if model and latency:
+            result[model] = parse_latency(latency)
+    return result
+
+
+def request_rng(*parts: Any) -> random.Random:
+    raw = json.dumps([LLM_STUB_SEED, *parts], sort_keys=True, ensure_ascii=False, default=str)
+    return random.Random(hashlib.sha256(raw.encode("utf-8")).hexdigest())
+
+
+def canned_reply(model: str, prompt: str, rng: random.Random) -> str:
+    """Ответ по типу промпта, в том формате, который ждут парсеры сервисов."""
+    if "JSON СХЕМА" in prompt or "JSON SCHEMA" in prompt:
+        text = json.dumps(rng.choice(TASKS), ensure_ascii=False, indent=2)
+    elif "сгенерирован AI" in prompt:
+        text = json.dumps({"is_ai_generated": rng.random() < 0.1, "confidence_score": rng.randint(5, 95),
+                           "reason": "Стиль кода типичен для человека."}, ensure_ascii=False)
+    elif "Code Review" in prompt:
+        text = json.dumps({"score": rng.randint(50, 95), "feedback": "Решение корректное, стоит добавить проверки."},
+                          ensure_ascii=False)
+    elif "временную сложность" in prompt or "Analyze complexity" in prompt:
+        text = json.dumps({"time_complexity": rng.choice(["O(n)", "O(n log n)", "O(1)"]),
+                           "explanation": "Один проход по входным данным.", "feedback": "Code looks okay."},
+                          ensure_ascii=False)
+    elif "HR Tech Lead" in prompt:
+        text = json.dumps({"clarity_score": rng.randint(4, 10), "technical_score": rng.randint(4, 10),
+                           "feedback": "Объяснение понятное."}, ensure_ascii=False)
+    elif "уточняющих вопроса" in prompt:
+        text = "1. Почему выбрана такая структура данных?\n2. Как решение ведет себя на пустом входе?"
+    elif "сложность этого кода" in prompt:
+        text = "Основное время уходит на цикл по входному списку."
+    else:
+        text = "Подумайте, какие граничные случаи есть у задачи, и проверьте их по очереди."
+    if model == LLM_STUB_THINK_MODEL:
+        text = f"<think>\nРазбираю запрос и выбираю ответ.\n</think>\n\n{text}"
+    return text
+
+
+def embed_text(text: str, dim: int) -> List[float]:
+    """Хэширование слов в вектор: похожие тексты дают близкие векторы, как у настоящих эмбеддингов."""
+    vec = np.zeros(dim, dtype=np.float32)
+    for word in re.findall(r"\w+", text.lower()):
+        h = zlib.crc32(word.encode("utf-8"))
+        vec[h % dim] += 1.0 if h & 1 << 31 else -1.0
+    norm = np.linalg.norm(vec)
+    if norm == 0:
+        vec[0], norm = 1.0, 1.0
+    return (vec / norm).tolist()
+
+
+class StubState:
+    def __init__(self, latency: str = LLM_STUB_LATENCY, model_latency: str = LLM_STUB_MODEL_LATENCY,
+                 error_rate: float = LLM_STUB_ERROR_RATE):
+        self.latency = parse_latency(latency)
+        self.model_latency = parse_model_latency(model_latency)
+        self.embed_latency = parse_latency(LLM_STUB_EMBED_LATENCY)
+        self.error_rate = error_rate
+        # Сколько раз уже приходил тот же промпт: повтор генерации задачи дает следующий вариант
+        self.seen: Dict[str, int] = {}
+        self.requests = {"chat": 0, "stream": 0, "embeddings": 0, "errors": 0}
+
+    def rng_for(self, kind: str, payload: Any) -> random.Random:
+        key = hashlib.sha256(json.dumps([kind, payload], sort_keys=True, ensure_ascii=False,
+                                        default=str).encode("utf-8")).hexdigest()
+        n = self.seen[key] = self.seen.get(key, 0) + 1
+        return request_rng(key, n)
+
+    def delay(self, model: str, rng: random.Random) -> float:
+        return max(0.0, self.model_latency.get(model, self.latency)(rng))
+
+
+state = StubState()
+app = FastAPI(title="LLM stub")
+
+
+def _error() -> JSONResponse:
+    state.requests["errors"] += 1
+    return JSONResponse({"error": {"message": "stub: injected failure", "type": "server_error"}}, status_code=503)
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "")
+    messages = body.get("messages", [])
+    rng = state.rng_for("chat", {"model": model, "messages": messages})
+    if rng.random() < state.error_rate:
+        return _error()
+    prompt = "\n".join(str(m.get("content", "")) for m in messages)
+    text = canned_reply(model, prompt, rng)
+    delay = state.delay(model, rng)
+    created = int(time.time())
+    completion_id = f"chatcmpl-stub-{rng.getrandbits(48):x}"
+    usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4,
+             "total_tokens": (len(prompt) + len(text)) // 4}
+
+    if not body.get("stream"):
+        state.requests["chat"] += 1
+        await asyncio.sleep(delay)
+        return {"id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": "stop"}],
+                "usage": usage}
+
+    state.requests["stream"] += 1
+
+    def chunk(delta: Dict[str, Any], finish: Any = None) -> str:
+        return "data: " + json.dumps({"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                                      "model": model,
+                                      "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]},
+                                     ensure_ascii=False) + "\n\n"
+
+    async def events():
+        await asyncio.sleep(delay)
+        yield chunk({"role": "assistant", "content": ""})
+        for i in range(0, len(text), LLM_STUB_CHUNK_CHARS):
+            yield chunk({"content": text[i:i + LLM_STUB_CHUNK_CHARS]})
+            await asyncio.sleep(LLM_STUB_TOKEN_DELAY)
+        yield chunk({}, "stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    model = body.get("model", "")
+    texts = body.get("input", [])
+    if isinstance(texts, str):
+        texts = [texts]
+    rng = state.rng_for("embeddings", {"model": model, "input": texts})
+    if rng.random() < state.error_rate:
+        return _error()
+    state.requests["embeddings"] += 1
+    await asyncio.sleep(max(0.0, state.embed_latency(rng)))
+    return {"object": "list", "model": model,
+            "data": [{"object": "embedding", "index": i, "embedding": embed_text(t, LLM_STUB_EMBEDDING_DIM)}
+                     for i, t in enumerate(texts)],
+            "usage": {"prompt_tokens": sum(len(t) // 4 for t in texts), "total_tokens": sum(len(t) // 4 for t in texts)}}
+
+
+@app.get("/v1/models")
+def models():
+    return {"object": "list", "data": [{"id": m, "object": "model", "owned_by": "stub"}
+                                       for m in ("qwen3-coder-30b-a3b-instruct-fp8", "qwen3-32b-awq",
+                                                 "text-embedding-3-small")]}
+
+
+@app.get("/stats")
+def stats():
+    return state.requests
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Локальная замена LLM для нагрузочных тестов")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", default=LLM_STUB_LATENCY)
+    parser.add_argument("--model-latency", default=LLM_STUB_MODEL_LATENCY)
+    parser.add_argument("--error-rate", type=float, default=LLM_STUB_ERROR_RATE)
+    args = parser.parse_args()
+    state = StubState(args.latency, args.model_latency, args.error_rate)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
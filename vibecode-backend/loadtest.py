@@ -0,0 +1,162 @@
+"""
+Нагрузочный тест: виртуальные кандидаты параллельно проходят полный сценарий интервью,
+в конце — пропускная способность и p50/p95/p99 по каждому эндпоинту.
+
+backend (порт 8000): start -> task/next -> code/run -> help -> round/submit
+engine  (порт 8001): generate-task -> test-code -> chat -> submit-run
+
+Сервисы при этом смотрят в llm_stub.py, а не в настоящий LLM:
+    python llm_stub.py --port 9000
+    LLM_API_URL=http://localhost:9000/v1 uvicorn backend:app --port 8000
+    python loadtest.py --target backend --users 20 --flows 200
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+LEVELS = ["Junior", "Middle", "Senior"]
+TOPICS = ["Algorithms", "Strings", "Arrays"]
+
+
+class Recorder:
+    """Длительности запросов по эндпоинту; ошибкой считается сетевой сбой или статус >= 400."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.flows = 0
+        self.failed_flows = 0
+
+    async def call(self, client: httpx.AsyncClient, method: str, path: str, **kwargs: Any) -> Optional[Any]:
+        name = f"{method} {path.split('?')[0]}"
+        started = time.perf_counter()
+        try:
+            resp = await client.request(method, path, **kwargs)
+            ok = resp.status_code < 400
+        except httpx.HTTPError:
+            resp, ok = None, False
+        self.samples.setdefault(name, []).append(time.perf_counter() - started)
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+            return None
+        return resp.json()
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        endpoints = {}
+        for name, samples in self.samples.items():
+            arr = np.array(samples)
+            endpoints[name] = {"requests": len(samples), "errors": self.errors.get(name, 0),
+                               "rps": round(len(samples) / elapsed, 2),
+                               "p50_ms": round(float(np.percentile(arr, 50)) * 1000, 1),
+                               "p95_ms": round(float(np.percentile(arr, 95)) * 1000, 1),
+                               "p99_ms": round(float(np.percentile(arr, 99)) * 1000, 1),
+                               "max_ms": round(float(arr.max()) * 1000, 1)}
+        return {"elapsed_s": round(elapsed, 2), "flows": self.flows, "failed_flows": self.failed_flows,
+                "flows_per_s": round(self.flows / elapsed, 2), "endpoints": endpoints}
+
+
+async def backend_flow(client: httpx.AsyncClient, rec: Recorder, rng: random.Random, args) -> bool:
+    start = await rec.call(client, "POST", "/api/start", json={"level": rng.choice(LEVELS),
+                                                               "topic": rng.choice(TOPICS)})
+    if not start:
+        return False
+    sid = start["session_id"]
+    task = await rec.call(client, "GET", f"/api/task/next?session_id={sid}")
+    if not task:
+        return False
+    # Сдаем эталон: сценарий проходит до конца, а не обрывается на провале тестов
+    code = task.get("reference_solution") or task.get("initial_code", "")
+    for _ in range(args.runs):
+        await rec.call(client, "POST", "/api/code/run", json={"session_id": sid, "code": code, "type": "public"})
+    for _ in range(args.help):
+        await rec.call(client, "POST", "/api/help", json={"session_id": sid, "question": "С чего начать?"})
+    report = await rec.call(client, "POST", "/api/round/submit",
+                            json={"session_id": sid, "code": code, "anti_cheat_stats": {}})
+    return report is not None
+
+
+async def engine_flow(client: httpx.AsyncClient, rec: Recorder, rng: random.Random, args) -> bool:
+    task = await rec.call(client, "POST", "/generate-task", json={"level": rng.choice(LEVELS),
+                                                                  "topic": rng.choice(TOPICS)})
+    if not task:
+        return False
+    code = task.get("reference_solution") or task.get("initial_code", "")
+    for _ in range(args.runs):
+        await rec.call(client, "POST", "/test-code", json={"task": task, "code": code})
+    for _ in range(args.help):
+        await rec.call(client, "POST", "/chat", json={"message": "HELP с чего начать?",
+                                                      "task_description": task.get("description", ""),
+                                                      "code": code})
+    result = await rec.call(client, "POST", "/submit-run", json={"task": task, "code": code})
+    return result is not None
+
+
+async def run(args) -> Dict[str, Any]:
+    flow = backend_flow if args.target == "backend" else engine_flow
+    base_url = args.base_url or ("http://localhost:8000" if args.target == "backend" else "http://localhost:8001")
+    rec = Recorder()
+    remaining = args.flows
+    deadline = time.perf_counter() + args.duration if args.duration else None
+
+    def take() -> bool:
+        nonlocal remaining
+        if deadline is not None:
+            return time.perf_counter() < deadline
+        remaining -= 1
+        return remaining >= 0
+
+    async def user(n: int):
+        rng = random.Random(args.seed * 1000 + n)
+        while take():
+            ok = await flow(client, rec, rng, args)
+            rec.flows += 1
+            if not ok:
+                rec.failed_flows += 1
+
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(user(n) for n in range(args.users)))
+        return rec.report(time.perf_counter() - started)
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\nСценариев: {report['flows']} (с ошибкой: {report['failed_flows']}), "
+          f"{report['flows_per_s']}/с за {report['elapsed_s']} с\n")
+    print(f"{'endpoint':<28}{'req':>7}{'err':>6}{'rps':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, s in report["endpoints"].items():
+        print(f"{name:<28}{s['requests']:>7}{s['errors']:>6}{s['rps']:>8}"
+              f"{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}{s['max_ms']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест сценария интервью")
+    parser.add_argument("--target", choices=["backend", "engine"], default="backend")
+    parser.add_argument("--base-url", default="")
+    parser.add_argument("--users", type=int, default=10, help="одновременных кандидатов")
+    parser.add_argument("--flows", type=int, default=50, help="всего сценариев (если не задан --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="длительность теста в секундах")
+    parser.add_argument("--runs", type=int, default=2, help="запусков public-тестов на сценарий")
+    parser.add_argument("--help-questions", dest="help", type=int, default=1, help="вопросов HELP на сценарий")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", default="", help="сохранить отчет в файл")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    sys.exit(1 if report["failed_flows"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Замер одного вызова решения для раннеров backend.py и InterviewEngine:
+wall/CPU время, пик памяти и (в режиме tracemalloc) топ мест аллокаций.
+"""
+import os
+import time
+import tracemalloc
+from typing import Any, Dict, Iterator, List
+
+try:
+    import resource
+except ImportError:  # Windows: ru_maxrss недоступен, пик памяти не считаем
+    resource = None
+
+# Пик памяти теста: rusage — рост ru_maxrss (бесплатно; точен в отдельном процессе теста,
+# в воркере пула виден только новый максимум), tracemalloc — точный пик кучи Python,
+# но замедляет решение в разы; off — не считать
+PROFILE_MEMORY = os.getenv("PROFILE_MEMORY", "rusage")
+# Сколько мест аллокаций отдавать в результате (только в режиме tracemalloc)
+PROFILE_TOP_ALLOCATIONS = int(os.getenv("PROFILE_TOP_ALLOCATIONS", "5"))
+
+
+def max_rss_kb() -> int:
+    # ru_maxrss на Linux в КБ; без модуля resource пик не считаем
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else 0
+
+
+def top_allocations(limit: int) -> List[Dict[str, Any]]:
+    # Живые аллокации из кода кандидата (exec дает имя файла "<string>")
+    snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(True, "<string>")])
+    return [
+        {"line": stat.traceback[0].lineno, "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+        for stat in snapshot.statistics("lineno")[:limit]
+    ]
+
+
+def profile_call(user_func, args: tuple, metrics: Dict[str, Any]):
+    """Вызывает решение и пишет в metrics wall/CPU время, пик памяти и топ мест аллокаций."""
+    tracing = PROFILE_MEMORY == "tracemalloc"
+    started_tracing = tracing and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start(1)
+    if tracing:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+    elif PROFILE_MEMORY == "rusage":
+        base = max_rss_kb()
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    try:
+        return user_func(*args)
+    finally:
+        metrics["wall_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        metrics["cpu_ms"] = round((time.process_time() - cpu_start) * 1000, 3)
+        if tracing:
+            metrics["peak_kb"] = round(max(0, tracemalloc.get_traced_memory()[1] - base) / 1024, 1)
+            if PROFILE_TOP_ALLOCATIONS > 0:
+                metrics["top_allocations"] = top_allocations(PROFILE_TOP_ALLOCATIONS)
+        elif PROFILE_MEMORY == "rusage":
+            metrics["peak_kb"] = max(0, max_rss_kb() - base)
+        if started_tracing:
+            tracemalloc.stop()
+
+
+def short_repr(value, limit: int = 200) -> str:
+    text = str(value)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def collect_summary(events: Iterator[Dict[str, Any]]) -> Dict[str, Any]:
+    """Прогоняет поток событий раннера и возвращает итоговый результат."""
+    for event in events:
+        if event["event"] == "summary":
+            return event["result"]
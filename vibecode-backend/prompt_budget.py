@@ -0,0 +1,153 @@
+"""
+Бюджет токенов на промпт: входы промпта (код кандидата, эталон, описание задачи)
+ужимаются под лимит своего типа вызова, чтобы огромная вставка не делала каждый
+анализ медленным и дорогим. Код сначала чистится от комментариев и пустых строк,
+потом сводится к solution и тому, что она вызывает, и только потом обрезается.
+"""
+import os
+import re
+import ast
+import io
+import tokenize
+from typing import Dict, List, Set
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except ImportError:  # без tiktoken считаем приблизительно
+    _encoding = None
+
+# --- КОНФИГУРАЦИЯ ---
+# Бюджет (в токенах) на все подставляемые в промпт входы, по типу вызова
+_DEFAULT_BUDGETS = {
+    "smart_questions": 2000,
+    "explanation": 1500,
+    "chat": 1500,
+    "help": 800,
+    "review": 2500,
+    "ai_check": 2000,
+    "efficiency": 2000,
+    "complexity": 1500,
+    "analyze": 2000,
+}
+PROMPT_BUDGETS = {name: int(os.getenv(f"PROMPT_BUDGET_{name.upper()}", str(default)))
+                  for name, default in _DEFAULT_BUDGETS.items()}
+PROMPT_DEFAULT_BUDGET = int(os.getenv("PROMPT_DEFAULT_BUDGET", "2000"))
+
+_PIECE = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    # Оценка сверху: слова и знаки по отдельности, но не меньше 1 токена на 4 символа
+    return max(len(_PIECE.findall(text)), len(text) // 4)
+
+
+def compact_code(code: str) -> str:
+    """Код без комментариев и пустых строк."""
+    lines = code.splitlines()
+    try:
+        for tok in tokenize.generate_tokens(io.StringIO(code).readline):
+            if tok.type == tokenize.COMMENT:
+                row, col = tok.start
+                lines[row - 1] = lines[row - 1][:col].rstrip()
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        pass
+    return "\n".join(line for line in lines if line.strip())
+
+
+def focus_solution(code: str, entry: str = "solution") -> str:
+    """Оставляет импорты, функцию entry и все определения верхнего уровня, до которых она дотягивается."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return code
+    defined: Dict[str, ast.stmt] = {}
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            defined[node.name] = node
+        elif isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    defined[target.id] = node
+    if entry not in defined:
+        return code
+
+    keep: Set[int] = set()
+    stack: List[str] = [entry]
+    seen: Set[str] = set()
+    while stack:
+        name = stack.pop()
+        if name in seen or name not in defined:
+            continue
+        seen.add(name)
+        node = defined[name]
+        keep.add(id(node))
+        stack.extend(n.id for n in ast.walk(node) if isinstance(n, ast.Name))
+
+    parts = []
+    for node in tree.body:
+        if id(node) in keep or isinstance(node, (ast.Import, ast.ImportFrom)):
+            segment = ast.get_source_segment(code, node)
+            if segment:
+                parts.append(segment)
+    return "\n".join(parts)
+
+
+def truncate_code(code: str, budget: int) -> str:
+    kept, used = [], 0
+    lines = code.splitlines()
+    for line in lines:
+        cost = count_tokens(line) + 1
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    if len(kept) < len(lines):
+        kept.append(f"# ... обрезано строк: {len(lines) - len(kept)}")
+    return "\n".join(kept)
+
+
+def shorten_text(text: str, budget: int) -> str:
+    tokens = count_tokens(text)
+    if tokens <= budget:
+        return text
+    cut = int(len(text) * budget / tokens)
+    # Режем по границе слова, чтобы не оставлять обрывок
+    head = text[:cut].rsplit(" ", 1)[0] if " " in text[:cut] else text[:cut]
+    return head.rstrip() + " …"
+
+
+def fit_code(code: str, budget: int) -> str:
+    if count_tokens(code) <= budget:
+        return code
+    code = compact_code(code)
+    if count_tokens(code) <= budget:
+        return code
+    code = focus_solution(code)
+    if count_tokens(code) <= budget:
+        return code
+    return truncate_code(code, budget)
+
+
+def govern(call_type: str, code_fields: Dict[str, str] = None, text_fields: Dict[str, str] = None) -> Dict[str, str]:
+    """
+    Ужимает входы промпта под бюджет call_type. Бюджет делится поровну, а недобор
+    коротких полей отдается длинным. Возвращает поля в том же виде, по имени.
+    """
+    fields = {**{k: ("code", v or "") for k, v in (code_fields or {}).items()},
+              **{k: ("text", v or "") for k, v in (text_fields or {}).items()}}
+    remaining = PROMPT_BUDGETS.get(call_type, PROMPT_DEFAULT_BUDGET)
+    sizes = {k: count_tokens(v) for k, (_, v) in fields.items()}
+    result = {}
+    for i, name in enumerate(sorted(fields, key=sizes.get)):
+        kind, value = fields[name]
+        share = remaining // (len(fields) - i)
+        if sizes[name] > share:
+            value = fit_code(value, share) if kind == "code" else shorten_text(value, share)
+        result[name] = value
+        remaining -= min(sizes[name], share)
+    return result
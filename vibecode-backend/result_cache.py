@@ -0,0 +1,140 @@
+"""
+Кэш результатов прогона тестов для backend.py и InterviewEngine.
+Ключ — хэш кода без комментариев и отступов, хэш набора тестов и режим запуска,
+поэтому повторный Run без изменений в коде не доходит до песочницы.
+"""
+import io
+import os
+import copy
+import json
+import time
+import hashlib
+import tokenize
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from fixtures import tests_hash
+
+# Кэш результатов прогона: размер в памяти и каталог для сохранения на диск (пусто — без диска)
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "")
+
+# Эти статусы зависят от нагрузки на машину, такой результат не кэшируем
+UNSTABLE_TEST_STATUSES = {"time_limit", "memory_limit", "crashed"}
+
+
+def code_hash(code: str) -> str:
+    """Хэш кода без комментариев, пустых строк и различий в отступах."""
+    try:
+        tokens = []
+        for tok in tokenize.generate_tokens(io.StringIO(code).readline):
+            if tok.type in (tokenize.COMMENT, tokenize.NL):
+                continue
+            layout = tok.type in (tokenize.INDENT, tokenize.NEWLINE)
+            tokens.append(f"{tok.type}:{'' if layout else tok.string}")
+        normalized = "\n".join(tokens)
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        normalized = code
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def is_stable_result(result: Dict[str, Any], unstable_tracebacks=()) -> bool:
+    # TLE/MLE/падение всего прогона приходят текстом в traceback, отдельного теста — статусом
+    if result.get("traceback") in unstable_tracebacks:
+        return False
+    return not any(t.get("status") in UNSTABLE_TEST_STATUSES for t in result.get("tests", []))
+
+
+class ResultCache:
+    """
+    LRU результатов прогона тестов с необязательным сохранением на диск.
+    На диске лежат ровно ключи LRU: вытесненный ключ удаляется и из каталога. Файлы прошлых
+    запусков попадают в LRU ключами без значения и читаются с диска при первом get.
+    """
+
+    def __init__(self, max_size: int = RESULT_CACHE_SIZE, cache_dir: str = RESULT_CACHE_DIR):
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self._items: "OrderedDict[str, Optional[Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            for key in disk_keys(cache_dir):
+                self._items[key] = None
+            self._evict()
+
+    @staticmethod
+    def make_key(code: str, test_cases: List[Dict], mode: str) -> str:
+        raw = f"{code_hash(code)}:{tests_hash(test_cases)}:{mode}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str):
+        with self._lock:
+            if key not in self._items:
+                return None
+            result = self._items[key]
+            self._items.move_to_end(key)
+            if result is not None:
+                return copy.deepcopy(result)
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self._items.pop(key, None)
+            return None
+        self._remember(key, result)
+        return copy.deepcopy(result)
+
+    def put(self, key: str, result: Dict[str, Any]):
+        self._remember(key, copy.deepcopy(result))
+        if self.cache_dir:
+            tmp = self._path(key) + ".tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(result, f, ensure_ascii=False)
+                os.replace(tmp, self._path(key))
+            except (OSError, TypeError, ValueError):
+                pass
+
+    def _remember(self, key: str, result: Dict[str, Any]):
+        with self._lock:
+            self._items[key] = result
+            self._items.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        while len(self._items) > self.max_size:
+            key, _ = self._items.popitem(last=False)
+            if self.cache_dir:
+                remove_file(self._path(key))
+
+
+def disk_keys(cache_dir: str, max_age: Optional[float] = None) -> List[str]:
+    """
+    Ключи кэша в каталоге, от старых к новым. Недописанные .tmp и файлы старше max_age
+    (по времени записи) удаляются.
+    """
+    now = time.time()
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            continue
+        if name.endswith(".tmp") or (name.endswith(".json") and max_age is not None and mtime + max_age < now):
+            remove_file(path)
+        elif name.endswith(".json"):
+            entries.append((mtime, name[:-len(".json")]))
+    return [key for _, key in sorted(entries)]
+
+
+def remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,131 @@
+"""
+Лимиты песочницы для раннеров backend.py и InterviewEngine: память (RLIMIT_AS и cgroup v2,
+если он делегирован), CPU (RLIMIT_CPU) и причина смерти процесса, не вернувшего результат.
+"""
+import os
+import signal
+import multiprocessing
+from typing import Optional
+
+import psutil
+
+try:
+    import resource
+except ImportError:  # Windows: rlimit недоступны, остается режим poll
+    resource = None
+
+TIME_LIMIT_SECONDS = 5.0
+MEMORY_LIMIT_MB = 256.0
+
+# kernel — лимиты держит ядро (RLIMIT_AS/RLIMIT_CPU, cgroup v2 если делегирован),
+# poll — старый режим с опросом RSS через psutil (только InterviewEngine)
+SANDBOX_LIMIT_MODE = os.getenv("SANDBOX_LIMIT_MODE", "kernel")
+SANDBOX_CGROUP_ROOT = os.getenv("SANDBOX_CGROUP_ROOT", "/sys/fs/cgroup/vibecode-sandbox")
+
+# Статусы теста, чья песочница не вернула результат
+TIME_LIMIT = "time_limit"
+MEMORY_LIMIT = "memory_limit"
+CRASHED = "crashed"
+SKIPPED = "skipped"
+# Значок статуса в логе теста: у обоих сервисов строка лога вида "<значок> Тест N: <причина>"
+LIMIT_ICONS = {TIME_LIMIT: "⏱️", MEMORY_LIMIT: "💾", CRASHED: "💥", SKIPPED: "⏭️"}
+
+
+def kernel_limits_enabled() -> bool:
+    return SANDBOX_LIMIT_MODE == "kernel" and resource is not None
+
+
+def apply_memory_limit():
+    # Форк наследует адресное пространство родителя (FastAPI, openai, ...),
+    # поэтому лимит считаем как "текущий размер + MEMORY_LIMIT_MB"
+    if resource is None:
+        return
+    limit_bytes = int(MEMORY_LIMIT_MB * 1024 * 1024)
+    me = psutil.Process()
+    try:
+        address_space = me.memory_info().vms + limit_bytes
+        resource.setrlimit(resource.RLIMIT_AS, (address_space, address_space))
+    except (ValueError, OSError):
+        pass
+    _join_cgroup(me.memory_info().rss + limit_bytes)
+
+
+def arm_cpu_limit():
+    # RLIMIT_CPU накопительный, поэтому для воркера из пула сдвигаем его на каждый запуск.
+    # При превышении ядро шлет SIGXCPU, и процесс завершается
+    if resource is None:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = int(usage.ru_utime + usage.ru_stime + TIME_LIMIT_SECONDS) + 1
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    try:
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def apply_test_limits():
+    """Оба лимита для одноразового процесса теста."""
+    apply_memory_limit()
+    arm_cpu_limit()
+
+
+def _cgroup_path(pid: int) -> str:
+    return os.path.join(SANDBOX_CGROUP_ROOT, f"sandbox-{pid}")
+
+
+def _join_cgroup(memory_max: int):
+    # cgroup v2 работает только если SANDBOX_CGROUP_ROOT делегирован процессу;
+    # иначе молча остаемся на RLIMIT_AS
+    if not os.path.exists("/sys/fs/cgroup/cgroup.controllers"):
+        return
+    path = _cgroup_path(os.getpid())
+    try:
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "memory.max"), "w") as f:
+            f.write(str(memory_max))
+        with open(os.path.join(path, "memory.swap.max"), "w") as f:
+            f.write("0")
+        with open(os.path.join(path, "cgroup.procs"), "w") as f:
+            f.write("0")
+    except OSError:
+        pass
+
+
+def _cgroup_oom_kills(pid: int) -> Optional[int]:
+    """Сколько раз OOM killer срабатывал в cgroup процесса; None — cgroup у процесса нет."""
+    try:
+        with open(os.path.join(_cgroup_path(pid), "memory.events")) as f:
+            for line in f:
+                key, _, value = line.partition(" ")
+                if key == "oom_kill":
+                    return int(value)
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def remove_cgroup(pid: int):
+    try:
+        os.rmdir(_cgroup_path(pid))
+    except OSError:
+        pass
+
+
+def exit_code_status(exitcode: int, cgroup_pid: int) -> str:
+    """Процесс умер, не отправив результат: причину берем из сигнала и счетчика OOM в cgroup."""
+    if exitcode == -signal.SIGXCPU:
+        return TIME_LIMIT
+    oom_kills = _cgroup_oom_kills(cgroup_pid)
+    if oom_kills is not None:
+        # В cgroup счетчик OOM точен: SIGKILL без него — не память, а падение
+        return MEMORY_LIMIT if oom_kills > 0 else CRASHED
+    # Без cgroup SIGKILL почти всегда от OOM killer: RLIMIT_AS сам дает MemoryError, RLIMIT_CPU — SIGXCPU
+    return MEMORY_LIMIT if exitcode == -signal.SIGKILL else CRASHED
+
+
+def exit_status(process: multiprocessing.Process) -> str:
+    process.join()
+    return exit_code_status(process.exitcode, process.pid)
@@ -0,0 +1,155 @@
+"""
+Потоковый разбор JSON-объекта из ответа LLM.
+Текст приходит по токенам; как только значение поля верхнего уровня закрыто, оно
+отдается наружу, не дожидаясь конца ответа. Закрывающая скобка объекта — сигнал,
+что генерацию можно прерывать. Оборванный ответ не теряется: готовые поля плюс
+то, что удается достроить из недописанного значения.
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def repair_json(fragment: str, max_tries: int = 64) -> Optional[Any]:
+    """
+    Достраивает оборванный JSON-фрагмент: отрезает недописанный хвост по последней
+    запятой и дописывает закрывающие скобки.
+    """
+    stack: List[str] = []
+    in_string = escape = False
+    cuts: List[Tuple[int, Tuple[str, ...]]] = []
+    for i, ch in enumerate(fragment):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in _CLOSERS:
+            stack.append(_CLOSERS[ch])
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            cuts.append((i + 1, tuple(stack)))
+        elif ch == ",":
+            cuts.append((i, tuple(stack)))
+
+    # Недописанную строку не закрываем: обрывок кода или текста хуже, чем его отсутствие
+    candidates = [] if in_string else [fragment.rstrip().rstrip(",") + "".join(reversed(stack))]
+    for pos, open_stack in reversed(cuts[-max_tries:]):
+        candidates.append(fragment[:pos] + "".join(reversed(open_stack)))
+    for text in candidates:
+        try:
+            return json.loads(text)
+        except ValueError:
+            continue
+    return None
+
+
+class StreamingJSONExtractor:
+    """
+    Разбирает первый JSON-объект в потоке текста. feed() возвращает поля верхнего уровня,
+    закрытые этим куском, как [(key, value)]. Текст до первой "{" (пояснения, ```json) пропускается.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        # Состояние на верхнем уровне: key -> key_str -> colon -> value -> in_value
+        self._expect = "key"
+        self._key: Optional[str] = None
+        self._key_start = 0
+        self._value_start: Optional[int] = None
+        self.fields: Dict[str, Any] = {}
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        completed: List[Tuple[str, Any]] = []
+        if self.done:
+            return completed
+        self._text += chunk
+        while self._pos < len(self._text) and not self.done:
+            self._step(self._pos, self._text[self._pos], completed)
+            self._pos += 1
+        return completed
+
+    def _step(self, pos: int, ch: str, completed: List[Tuple[str, Any]]):
+        if not self._started:
+            if ch == "{":
+                self._started = True
+                self._depth = 1
+            return
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                if self._depth == 1 and self._expect == "key_str":
+                    self._key = json.loads(self._text[self._key_start:pos + 1])
+                    self._expect = "colon"
+            return
+        if ch == '"':
+            self._in_string = True
+            if self._depth == 1 and self._expect == "key":
+                self._expect, self._key_start = "key_str", pos
+            elif self._depth == 1 and self._expect == "value":
+                self._expect, self._value_start = "in_value", pos
+        elif ch in _CLOSERS:
+            if self._depth == 1 and self._expect == "value":
+                self._expect, self._value_start = "in_value", pos
+            self._depth += 1
+        elif ch in "}]":
+            self._depth -= 1
+            if self._depth == 0:
+                self._finish_value(pos, completed)
+                self.done = True
+        elif self._depth == 1:
+            if ch == ":" and self._expect == "colon":
+                self._expect = "value"
+            elif ch == ",":
+                self._finish_value(pos, completed)
+                self._expect = "key"
+            elif not ch.isspace() and self._expect == "value":
+                self._expect, self._value_start = "in_value", pos
+
+    def _finish_value(self, end: int, completed: List[Tuple[str, Any]]):
+        key, start = self._key, self._value_start
+        self._key, self._value_start = None, None
+        if key is None or start is None:
+            return
+        raw = self._text[start:end].strip()
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = repair_json(raw)
+            if value is None:
+                return
+        self.fields[key] = value
+        completed.append((key, value))
+
+    def partial(self) -> Dict[str, Any]:
+        """Готовые поля и, если получится, достроенное недописанное значение."""
+        result = dict(self.fields)
+        if not self.done and self._key is not None and self._value_start is not None:
+            value = repair_json(self._text[self._value_start:].strip())
+            if value is not None:
+                result[self._key] = value
+        return result
+
+
+def parse_partial_json(text: str) -> Dict[str, Any]:
+    """Разбор объекта целиком с восстановлением оборванного ответа; {} — только если ничего не нашлось."""
+    extractor = StreamingJSONExtractor()
+    extractor.feed(text)
+    return extractor.partial()
@@ -0,0 +1,162 @@
+"""
+Банк сгенерированных задач в SQLite с индексом почти-дубликатов.
+Задача хранится вместе с разобранными фикстурами тестов и эмбеддингом эталона,
+поэтому выданная из банка задача сразу готова к запуску. Почти-дубликаты ищутся
+по MinHash-сигнатуре title + description через LSH-бакеты в памяти.
+"""
+import os
+import re
+import json
+import time
+import zlib
+import pickle
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# --- КОНФИГУРАЦИЯ ---
+# Файл банка; пустая строка — банк выключен
+TASK_BANK_PATH = os.getenv("TASK_BANK_PATH", "task_bank.sqlite3")
+# Оценка Жаккара, начиная с которой новая задача считается повтором
+TASK_BANK_DUP_THRESHOLD = float(os.getenv("TASK_BANK_DUP_THRESHOLD", "0.6"))
+# Сколько ждать LLM, прежде чем отдать задачу из банка (только если для пары там что-то есть),
+# и сколько раз генерировать заново невалидную задачу или повтор (последний раз повтор выдается)
+TASK_BANK_LLM_TIMEOUT = float(os.getenv("TASK_BANK_LLM_TIMEOUT", "20"))
+TASK_BANK_GENERATE_ATTEMPTS = int(os.getenv("TASK_BANK_GENERATE_ATTEMPTS", "2"))
+# Сколько слов в шингле и сколько хэшей в сигнатуре (BANDS * ROWS)
+TASK_BANK_SHINGLE = 3
+TASK_BANK_BANDS = 32
+TASK_BANK_ROWS = 4
+
+_NUM_HASHES = TASK_BANK_BANDS * TASK_BANK_ROWS
+_PRIME = np.uint64(4294967311)  # простое больше 2^32
+_rng = np.random.default_rng(7331)
+# a < 2^31, чтобы a * x для 32-битного x не переполнял uint64
+_A = _rng.integers(1, 2 ** 31, _NUM_HASHES, dtype=np.uint64)
+_B = _rng.integers(0, 2 ** 32, _NUM_HASHES, dtype=np.uint64)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    level TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    title TEXT NOT NULL,
+    task_json TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    fixtures BLOB,
+    ref_embedding BLOB,
+    created_at REAL NOT NULL,
+    served INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS tasks_pair ON tasks (level, topic, served);
+"""
+
+
+def task_signature(task: Dict[str, Any]) -> np.ndarray:
+    """MinHash по словесным шинглам title + description."""
+    words = re.findall(r"\w+", f"{task.get('title', '')} {task.get('description', '')}".lower())
+    k = max(1, min(TASK_BANK_SHINGLE, len(words)))
+    shingles = np.array(sorted({zlib.crc32(" ".join(words[i:i + k]).encode("utf-8"))
+                                for i in range(len(words) - k + 1)}), dtype=np.uint64)
+    if shingles.size == 0:
+        return np.full(_NUM_HASHES, np.iinfo(np.uint64).max, dtype=np.uint64)
+    return ((_A[:, None] * shingles[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+
+
+def _bands(sig: np.ndarray) -> List[Tuple[int, bytes]]:
+    return [(b, sig[b * TASK_BANK_ROWS:(b + 1) * TASK_BANK_ROWS].tobytes()) for b in range(TASK_BANK_BANDS)]
+
+
+class TaskBank:
+    """
+    Все сигнатуры держатся в памяти: проверка на повтор — поиск кандидатов по LSH-бакетам
+    и сравнение только с ними. Доступ к SQLite под блокировкой, запросы короткие.
+    """
+
+    def __init__(self, path: str = TASK_BANK_PATH, threshold: float = TASK_BANK_DUP_THRESHOLD):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._signatures: Dict[int, np.ndarray] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        for task_id, blob in self._db.execute("SELECT id, signature FROM tasks"):
+            self._index(task_id, np.frombuffer(blob, dtype=np.uint64))
+        self.duplicates = 0
+
+    def _index(self, task_id: int, sig: np.ndarray):
+        self._signatures[task_id] = sig
+        for band in _bands(sig):
+            self._buckets.setdefault(band, []).append(task_id)
+
+    def find_duplicate(self, task: Dict[str, Any], sig: Optional[np.ndarray] = None) -> Optional[int]:
+        """id похожей задачи из банка или None."""
+        sig = task_signature(task) if sig is None else sig
+        candidates = {i for band in _bands(sig) for i in self._buckets.get(band, ())}
+        if not candidates:
+            return None
+        ids = list(candidates)
+        scores = (np.stack([self._signatures[i] for i in ids]) == sig).mean(axis=1)
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        self.duplicates += 1
+        return ids[best]
+
+    def add(self, level: str, topic: str, task: Dict[str, Any],
+            fixtures: Optional[Dict[str, List[bytes]]] = None,
+            ref_embedding: Optional[np.ndarray] = None) -> Optional[int]:
+        """Сохраняет задачу; None, если в банке уже есть почти такая же."""
+        sig = task_signature(task)
+        with self._lock:
+            if self.find_duplicate(task, sig) is not None:
+                return None
+            cur = self._db.execute(
+                "INSERT INTO tasks (level, topic, title, task_json, signature, fixtures, ref_embedding, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (level, topic, task.get("title", ""), json.dumps(task, ensure_ascii=False), sig.tobytes(),
+                 pickle.dumps(fixtures, protocol=pickle.HIGHEST_PROTOCOL) if fixtures else None,
+                 np.asarray(ref_embedding, dtype=np.float32).tobytes() if ref_embedding is not None else None,
+                 time.time()))
+            self._db.commit()
+            self._index(cur.lastrowid, sig)
+            return cur.lastrowid
+
+    def has(self, level: str, topic: str) -> bool:
+        """Есть ли у пары задача, то есть вернет ли take() не None."""
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM tasks WHERE level = ? AND topic = ? LIMIT 1",
+                                    (level, topic)).fetchone() is not None
+
+    def take(self, level: str, topic: str) -> Optional[Tuple[Dict[str, Any], Dict[str, List[bytes]],
+                                                             Optional[np.ndarray]]]:
+        """Наименее выдававшаяся задача пары: (task, фикстуры по хэшу тестов, эмбеддинг эталона)."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, task_json, fixtures, ref_embedding FROM tasks WHERE level = ? AND topic = ?"
+                " ORDER BY served, RANDOM() LIMIT 1", (level, topic)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE tasks SET served = served + 1 WHERE id = ?", (row[0],))
+            self._db.commit()
+        fixtures = pickle.loads(row[2]) if row[2] else {}
+        embedding = np.frombuffer(row[3], dtype=np.float32) if row[3] else None
+        return json.loads(row[1]), fixtures, embedding
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pairs = self._db.execute("SELECT level, topic, COUNT(*) FROM tasks GROUP BY level, topic").fetchall()
+        return {"tasks": len(self._signatures), "duplicates_rejected": self.duplicates,
+                "by_pair": {f"{level}:{topic}": n for level, topic, n in pairs}}
+
+
+def open_task_bank(path: str = TASK_BANK_PATH) -> Optional[TaskBank]:
+    if not path:
+        return None
+    try:
+        return TaskBank(path)
+    except sqlite3.Error as e:
+        print(f"Task bank disabled: {e}")
+        return None
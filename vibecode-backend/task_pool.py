@@ -0,0 +1,167 @@
+"""
+Пул заранее сгенерированных задач по паре (level, topic).
+Фоновый производитель держит для каждой пары ограниченную очередь готовых задач,
+поэтому выдача задачи обычно не ждет LLM. Пустая очередь — генерация по запросу.
+"""
+import os
+import pickle
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fixtures import get_fixtures
+
+# --- КОНФИГУРАЦИЯ ---
+# Сколько готовых задач держать на пару, сколько генераций идет одновременно на весь пул
+TASK_POOL_DEPTH = int(os.getenv("TASK_POOL_DEPTH", "3"))
+TASK_POOL_CONCURRENCY = int(os.getenv("TASK_POOL_CONCURRENCY", "2"))
+# Пары (level, topic), для которых пул не держится дольше всех остальных
+TASK_POOL_MAX_KEYS = int(os.getenv("TASK_POOL_MAX_KEYS", "32"))
+# Пары для прогрева при старте: "Junior:Algorithms,Middle:Algorithms"
+TASK_POOL_WARM = os.getenv("TASK_POOL_WARM", "")
+
+Producer = Callable[[str, str], Awaitable[Optional[Dict[str, Any]]]]
+
+
+# Поля задачи, которые можно показать кандидату, пока остальное еще генерируется
+TASK_PREVIEW_FIELDS = ("title", "description", "initial_code", "public_tests")
+
+
+def _complete_test(t: Any) -> bool:
+    return isinstance(t, dict) and "input" in t and ("expected" in t or "output" in t)
+
+
+def salvage_task(task: Dict[str, Any]) -> Dict[str, Any]:
+    """Из оборванного ответа выбрасывает недописанные тесты, чтобы остаток прошел validate_task."""
+    for key in ("public_tests", "hidden_tests"):
+        if isinstance(task.get(key), list):
+            task[key] = [t for t in task[key] if _complete_test(t)]
+    return task
+
+
+def validate_task(task: Any) -> bool:
+    """
+    Задача годится в выдачу: есть текст, публичные тесты, которые разбираются как литералы,
+    и компилируемый эталон (если он есть).
+    """
+    if not isinstance(task, dict):
+        return False
+    if not task.get("title") or not task.get("description"):
+        return False
+    tests = task.get("public_tests")
+    if not isinstance(tests, list) or not tests:
+        return False
+    tests = tests + list(task.get("hidden_tests") or [])
+    if not all(_complete_test(t) for t in tests):
+        return False
+    # Тест вида [10**9] раннер не разберет, и задача сломается у каждого кандидата
+    if any(isinstance(pickle.loads(f), Exception) for f in get_fixtures(tests)):
+        return False
+    ref = task.get("reference_solution")
+    if ref:
+        try:
+            compile(ref, "<reference>", "exec")
+        except (SyntaxError, ValueError):
+            return False
+    return True
+
+
+def parse_warm_keys(spec: str) -> List[Tuple[str, str]]:
+    keys = []
+    for item in spec.split(","):
+        level, _, topic = item.strip().partition(":")
+        if level and topic:
+            keys.append((level, topic))
+    return keys
+
+
+class TaskPool:
+    """
+    produce(level, topic) возвращает готовую к выдаче задачу или None.
+    Работает только внутри event loop, поэтому блокировки не нужны.
+    """
+
+    def __init__(self, produce: Producer, depth: int = TASK_POOL_DEPTH,
+                 concurrency: int = TASK_POOL_CONCURRENCY, max_keys: int = TASK_POOL_MAX_KEYS):
+        self.produce = produce
+        self.depth = depth
+        self.max_keys = max_keys
+        self._sem = asyncio.Semaphore(concurrency)
+        self._queues: "OrderedDict[Tuple[str, str], asyncio.Queue]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], int] = {}
+        self._tasks = set()
+        self.hits = 0
+        self.misses = 0
+        self.failed = 0
+
+    def _queue(self, key: Tuple[str, str]) -> asyncio.Queue:
+        q = self._queues.get(key)
+        if q is None:
+            q = self._queues[key] = asyncio.Queue(maxsize=self.depth)
+            while len(self._queues) > self.max_keys:
+                self._queues.popitem(last=False)
+        self._queues.move_to_end(key)
+        return q
+
+    def _refill(self, key: Tuple[str, str]):
+        q = self._queue(key)
+        while q.qsize() + self._inflight.get(key, 0) < self.depth:
+            self._inflight[key] = self._inflight.get(key, 0) + 1
+            job = asyncio.create_task(self._produce_one(key))
+            self._tasks.add(job)
+            job.add_done_callback(self._tasks.discard)
+
+    async def _produce_one(self, key: Tuple[str, str]):
+        try:
+            async with self._sem:
+                task = await self.produce(*key)
+        except Exception as e:
+            print(f"Task pool error {key}: {e}")
+            task = None
+        finally:
+            self._inflight[key] -= 1
+        if task is None:
+            # Пул не перезапускает неудачную генерацию сам: при лежащем LLM это был бы горячий цикл
+            self.failed += 1
+            return
+        q = self._queues.get(key)
+        if q is not None and not q.full():
+            q.put_nowait(task)
+
+    def warm(self, keys: List[Tuple[str, str]]):
+        for key in keys:
+            self._refill(key)
+
+    def take_ready(self, level: str, topic: str) -> Optional[Dict[str, Any]]:
+        """Готовая задача из очереди или None; в любом случае очередь пары начинает пополняться."""
+        key = (level, topic)
+        q = self._queue(key)
+        try:
+            task = q.get_nowait()
+            self.hits += 1
+        except asyncio.QueueEmpty:
+            task = None
+            self.misses += 1
+        self._refill(key)
+        return task
+
+    async def get(self, level: str, topic: str) -> Optional[Dict[str, Any]]:
+        task = self.take_ready(level, topic)
+        if task is None:
+            task = await self.produce(level, topic)
+        return task
+
+    async def stop(self):
+        for job in list(self._tasks):
+            job.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self.depth,
+            "ready": {f"{level}:{topic}": q.qsize() for (level, topic), q in self._queues.items()},
+            "generating": sum(self._inflight.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "failed": self.failed,
+        }
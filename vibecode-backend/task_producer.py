@@ -0,0 +1,153 @@
+"""
+Производство задач для backend.py и InterviewEngine: свежая задача от LLM проверяется,
+ее тесты разбираются заранее, и она ложится в банк; если LLM медленный или лежит —
+выдается задача из банка. Промпт у каждого сервиса свой, поэтому поток генерации
+(field на каждое готовое поле, затем task) передается снаружи.
+"""
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from fixtures import prepare_task_fixtures, seed_fixtures
+from task_bank import TaskBank, TASK_BANK_LLM_TIMEOUT, TASK_BANK_GENERATE_ATTEMPTS
+from task_pool import TaskPool, validate_task, TASK_PREVIEW_FIELDS
+
+GenerateStream = Callable[[str, str], AsyncIterator[Dict[str, Any]]]
+
+
+class TaskProducer:
+    """
+    embed(text) — необязательный эмбеддинг эталона: считается один раз при создании задачи
+    и хранится в банке; remember_embedding(text, vec) возвращает его в кэш при выдаче из банка.
+    run_tests(code, tests) — необязательный раннер сервиса: эталон должен пройти все тесты задачи.
+    """
+
+    def __init__(self, generate_stream: GenerateStream, bank: Optional[TaskBank],
+                 embed: Optional[Callable[[str], Awaitable[Any]]] = None,
+                 remember_embedding: Optional[Callable[[str, Any], None]] = None,
+                 run_tests: Optional[Callable[[str, List[Dict]], Dict[str, Any]]] = None):
+        self.generate_stream = generate_stream
+        self.bank = bank
+        self.embed = embed
+        self.remember_embedding = remember_embedding
+        self.run_tests = run_tests
+        self._background = set()
+
+    async def generate(self, level: str, topic: str) -> Optional[Dict[str, Any]]:
+        """Сырая задача от LLM (возможно, частичная) или None."""
+        task = None
+        async for event in self.generate_stream(level, topic):
+            if event["event"] == "task":
+                task = event["task"]
+        return task
+
+    async def finalize(self, level: str, topic: str, task: Optional[Dict[str, Any]],
+                       allow_repeat: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Проверяет сгенерированную задачу, разбирает тесты и кладет в банк; None — невалидна.
+        Повтор задачи из банка (возможно, другой пары) в банк не кладется, но выдается,
+        если allow_repeat; иначе None, чтобы сгенерировать еще раз.
+        """
+        if not validate_task(task):
+            print("Task generation error: invalid task JSON")
+            return None
+        if not await self.reference_passes(task):
+            print("Task generation error: reference solution fails its own tests")
+            return None
+        repeat = self.bank is not None and self.bank.find_duplicate(task) is not None
+        if repeat and not allow_repeat:
+            return None
+        fixtures = prepare_task_fixtures(task)
+        if repeat:
+            return task
+        ref = task.get("reference_solution")
+        ref_vec = await self.embed(ref) if self.embed and ref else None
+        if self.bank:
+            self.bank.add(level, topic, task, fixtures, ref_vec)
+        return task
+
+    async def reference_passes(self, task: Dict[str, Any]) -> bool:
+        ref = task.get("reference_solution")
+        if not self.run_tests or not ref:
+            return True
+        tests = task["public_tests"] + list(task.get("hidden_tests") or [])
+        result = await asyncio.to_thread(self.run_tests, ref, tests)
+        return result.get("passed") == result.get("total") == len(tests)
+
+    async def generate_fresh(self, level: str, topic: str) -> Optional[Dict[str, Any]]:
+        """Новая задача от LLM, не повторяющая банк; None, если LLM упал или не успел, а банку есть что отдать."""
+        for attempt in range(TASK_BANK_GENERATE_ATTEMPTS):
+            if self.bank and self.bank.has(level, topic):
+                job = asyncio.ensure_future(self.generate(level, topic))
+                try:
+                    done, _ = await asyncio.wait({job}, timeout=TASK_BANK_LLM_TIMEOUT)
+                except asyncio.CancelledError:
+                    job.cancel()
+                    raise
+                if not done:
+                    # Отдаем задачу из банка, а генерация дорабатывает в фоне и пополняет банк
+                    self._bank_when_done(level, topic, job)
+                    return None
+                task = job.result()
+            else:
+                # Банку отдать нечего: обрывать генерацию по таймауту бессмысленно
+                task = await self.generate(level, topic)
+            if task is None:
+                return None
+            # Повтор перегенерируем, но последняя попытка отдает и его: банк пары может быть пуст
+            last = attempt == TASK_BANK_GENERATE_ATTEMPTS - 1
+            task = await self.finalize(level, topic, task, allow_repeat=last)
+            if task is not None:
+                return task
+        return None
+
+    def _bank_when_done(self, level: str, topic: str, job: "asyncio.Future"):
+        async def finish():
+            try:
+                task = await job
+            except Exception as e:
+                print(f"Background task generation error: {e}")
+                return
+            if task is not None:
+                await self.finalize(level, topic, task)
+
+        background = asyncio.create_task(finish())
+        self._background.add(background)
+        background.add_done_callback(self._background.discard)
+
+    def take_banked(self, level: str, topic: str) -> Optional[Dict[str, Any]]:
+        """Задача из банка с уже разобранными тестами и эмбеддингом эталона."""
+        banked = self.bank.take(level, topic) if self.bank else None
+        if banked is None:
+            return None
+        task, fixtures, ref_vec = banked
+        seed_fixtures(fixtures)
+        if self.remember_embedding and ref_vec is not None and task.get("reference_solution"):
+            self.remember_embedding(task["reference_solution"], ref_vec)
+        return task
+
+    async def produce(self, level: str, topic: str) -> Optional[Dict[str, Any]]:
+        """Задача, готовая к выдаче (производитель для TaskPool)."""
+        task = await self.generate_fresh(level, topic)
+        return task if task is not None else self.take_banked(level, topic)
+
+    async def stop(self):
+        for job in list(self._background):
+            job.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+
+    async def stream(self, pool: TaskPool, level: str, topic: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Готовая задача из пула отдается сразу; иначе field на каждое готовое поле превью
+        по мере генерации. В конце task — задача или None, если не вышло ни у LLM, ни у банка.
+        """
+        task = pool.take_ready(level, topic)
+        if task is None:
+            async for event in self.generate_stream(level, topic):
+                if event["event"] == "field":
+                    if event["key"] in TASK_PREVIEW_FIELDS:
+                        yield event
+                elif event["task"]:
+                    task = await self.finalize(level, topic, event["task"])
+            if task is None:
+                task = self.take_banked(level, topic)
+        yield {"event": "task", "task": task}
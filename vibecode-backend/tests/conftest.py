@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Модули сервиса лежат на уровень выше, backend.py — в корне репозитория; банк задач в тестах не нужен
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+sys.path.insert(1, os.path.dirname(SERVICE_DIR))
+os.environ.setdefault("TASK_BANK_PATH", "")
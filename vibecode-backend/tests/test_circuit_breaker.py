@@ -0,0 +1,139 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import backend
+from llm_client import LLMClient, CircuitBreaker, CircuitOpenError, RetryBudget, RoutePolicy
+
+MESSAGES = [{"role": "user", "content": "q"}]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("llm_client.time.monotonic", lambda: now[0])
+    return now
+
+
+def offline_client(failing=()):
+    """Клиент с подмененной сетью: модель отвечает своим именем, модели из failing — таймаутом."""
+    client = LLMClient()
+    calls = []
+
+    async def create(model, messages, timeout, **params):
+        calls.append(model)
+        if model in failing:
+            raise asyncio.TimeoutError()
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"answer from {model}"))])
+
+    client.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    client.retry_budget = RetryBudget(ratio=1.0, minimum=10)
+    return client, calls
+
+
+def open_breaker(client, model):
+    breaker = client.breaker(model)
+    for _ in range(breaker.failures):
+        breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_breaker_closed_open_half_open_probe(clock):
+    breaker = CircuitBreaker(failures=2, reset_seconds=10)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock[0] += 10
+    # После паузы пропускается ровно один пробный вызов
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    # Сбой пробы открывает breaker сразу, не дожидаясь failures сбоев подряд
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    clock[0] += 10
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+    assert breaker.stats() == {"state": "closed", "consecutive_failures": 0, "opened": 2, "rejected": 2}
+
+
+def test_cancelled_probe_lets_next_call_probe(clock):
+    breaker = CircuitBreaker(failures=1, reset_seconds=10)
+    breaker.record_failure()
+    clock[0] += 10
+    breaker.before_call()
+    breaker.record_cancel()
+    breaker.before_call()
+    assert breaker.state == "half_open"
+
+
+def test_guarded_opens_breaker_and_stops_calling(monkeypatch):
+    monkeypatch.setattr("llm_client.LLM_RETRY_BASE_DELAY", 0)
+
+    async def scenario():
+        client, calls = offline_client(failing={"m"})
+        client.breakers["m"] = CircuitBreaker(failures=2, reset_seconds=60)
+        # Второй сбой открывает breaker, и третья попытка отклоняется без сети
+        with pytest.raises(CircuitOpenError):
+            await client.chat("m", MESSAGES)
+        with pytest.raises(CircuitOpenError):
+            await client.chat("m", MESSAGES)
+        await client.aclose()
+        return calls
+
+    assert asyncio.run(scenario()) == ["m", "m"]
+
+
+def test_open_primary_is_rerouted_to_alternate():
+    async def scenario():
+        client, calls = offline_client()
+        client.configure_routes({"chat": RoutePolicy(["fast"])})
+        open_breaker(client, "slow")
+        answer = await client._chat_routed("slow", MESSAGES, "chat")
+        await client.aclose()
+        return answer, calls, client.hedges
+
+    answer, calls, hedges = asyncio.run(scenario())
+    assert answer == ("answer from fast", "fast")
+    assert calls == ["fast"]
+    assert hedges["rerouted"] == 1
+
+
+def test_all_breakers_open_raise_without_network():
+    async def scenario():
+        client, calls = offline_client()
+        client.configure_routes({"chat": RoutePolicy(["fast"])})
+        open_breaker(client, "slow")
+        open_breaker(client, "fast")
+        with pytest.raises(CircuitOpenError):
+            await client._chat_routed("slow", MESSAGES, "chat")
+        await client.aclose()
+        return calls
+
+    assert asyncio.run(scenario()) == []
+
+
+def test_open_breaker_returns_helper_fallback_without_network(monkeypatch):
+    async def scenario():
+        client, calls = offline_client()
+        client.configure_routes(backend.LLM_ROUTES)
+        open_breaker(client, backend.MODEL_TASK)
+        open_breaker(client, backend.MODEL_CHAT)
+        monkeypatch.setattr(backend, "llm", client)
+        result = await backend.check_ai_generated("def solution(a):\n    return a\n")
+        await client.aclose()
+        return result, calls
+
+    result, calls = asyncio.run(scenario())
+    assert result == {"is_ai_generated": False, "confidence_score": 0}
+    assert calls == []
@@ -0,0 +1,54 @@
+import math
+import random
+
+import pytest
+
+import backend
+from backend import fit_complexity, COMPLEXITY_MIN_CONFIDENCE
+
+SIZES = [2 ** k for k in range(4, 15)]
+# Накладные расходы вызова: постоянная добавка, которая на малых n больше самой работы
+OVERHEAD = 2e-7
+
+
+def points(cost, noise=0.02, seed=0):
+    rng = random.Random(seed)
+    return [(n, (OVERHEAD + cost(n)) * (1 + rng.uniform(-noise, noise))) for n in SIZES]
+
+
+@pytest.mark.parametrize("expected, cost", [
+    ("O(1)", lambda n: 5e-8),
+    ("O(log n)", lambda n: 1e-7 * math.log2(n)),
+    ("O(n)", lambda n: 2e-8 * n),
+    ("O(n log n)", lambda n: 1e-8 * n * math.log2(n)),
+    ("O(n^2)", lambda n: 1e-9 * n * n),
+])
+def test_fit_recognizes_clean_growth(expected, cost):
+    complexity, confidence = fit_complexity(points(cost))
+    assert complexity == expected
+    assert confidence >= COMPLEXITY_MIN_CONFIDENCE
+
+
+def test_noisy_constant_time_is_not_mistaken_for_log_n():
+    # Шум в 20% поверх постоянного времени регрессия натягивала на log n
+    for seed in range(10):
+        assert fit_complexity(points(lambda n: 5e-8, noise=0.2, seed=seed))[0] == "O(1)"
+
+
+def test_between_neighbor_classes_confidence_is_low():
+    # Рост между n и n log n (как у суммы длинных чисел) — решать LLM, а не замерам
+    for seed in range(5):
+        complexity, confidence = fit_complexity(points(lambda n: 2e-8 * n ** 1.08, seed=seed))
+        assert complexity in ("O(n)", "O(n log n)")
+        assert confidence < COMPLEXITY_MIN_CONFIDENCE
+
+
+def test_sorting_input_is_shuffled_not_repeated():
+    families = backend.input_families([{"input": "[5, 3, 9, 1, 7]", "expected": "[1, 3, 5, 7, 9]"}])
+    n, fixture = families[-1]
+    (values,) = backend.pickle.loads(fixture)
+    assert len(values) == n
+    # Повтор семени по кругу — это пять отсортированных прогонов, на которых сортировка линейна
+    runs = sum(1 for a, b in zip(values, values[1:]) if b < a)
+    assert runs > n // 3
+    assert len(set(values)) > n // 2
@@ -0,0 +1,34 @@
+import os
+
+import numpy as np
+
+from backend import EmbeddingCache
+
+
+def vectors(path):
+    return os.path.getsize(os.path.join(path, "vectors.f32")) // 12
+
+
+def test_orphan_vector_does_not_shift_rows(tmp_path):
+    cache = EmbeddingCache(cache_dir=str(tmp_path))
+    cache.put("a", [1, 1, 1])
+    # Вектор записан, а строка индекса — нет (упавшая запись или крах процесса)
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        f.write(np.zeros(3, dtype=np.float32).tobytes())
+    cache.put("b", [2, 2, 2])
+
+    reloaded = EmbeddingCache(cache_dir=str(tmp_path))
+    assert reloaded.get("a").tolist() == [1, 1, 1]
+    assert reloaded.get("b").tolist() == [2, 2, 2]
+
+
+def test_load_truncates_vectors_without_index(tmp_path):
+    cache = EmbeddingCache(cache_dir=str(tmp_path))
+    cache.put("a", [1, 1, 1])
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        f.write(np.zeros(3, dtype=np.float32).tobytes() + b"\0\0")
+
+    reloaded = EmbeddingCache(cache_dir=str(tmp_path))
+    assert vectors(tmp_path) == 1
+    reloaded.put("c", [3, 3, 3])
+    assert EmbeddingCache(cache_dir=str(tmp_path)).get("c").tolist() == [3, 3, 3]
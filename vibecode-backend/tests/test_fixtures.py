@@ -0,0 +1,36 @@
+import os
+import pickle
+import time
+
+from fixtures import parse_fixture
+
+
+def parsed(test):
+    return pickle.loads(parse_fixture(test))
+
+
+def test_literals_and_json_names():
+    assert parsed({"input": "[1, 2], 'a', null", "expected": "true"}) == (([1, 2], "a", None), True)
+    assert parsed({"input": "-5", "expected": "{'k': [false]}"}) == ((-5,), {"k": [False]})
+    # Слово null внутри строки остается строкой
+    assert parsed({"input": "'nullable'", "expected": "'true'"}) == (("nullable",), "true")
+
+
+def test_json_fast_path_unpacks_args_like_python_literals():
+    assert parsed({"input": '[1, 2], "a"', "expected": "[true, null]"}) == (([1, 2], "a"), [True, None])
+    assert parsed({"input": "[[1, 2]]", "expected": "1"}) == (([[1, 2]],), 1)
+    assert parsed({"input": "", "expected": "0"}) == ((), 0)
+    # Кортеж в скобках — это JSON не разберет, разбор идет как раньше
+    assert parsed({"input": "(1, 2)", "expected": "(2, 1)"}) == ((1, 2), (2, 1))
+
+
+def test_code_in_input_is_not_executed():
+    result = parsed({"input": "__import__('os').getpid()", "expected": str(os.getpid())})
+    assert isinstance(result, Exception)
+
+
+def test_expensive_expression_is_rejected_without_running():
+    started = time.perf_counter()
+    result = parsed({"input": "sum(range(3*10**8))", "expected": "0"})
+    assert isinstance(result, Exception)
+    assert time.perf_counter() - started < 0.5
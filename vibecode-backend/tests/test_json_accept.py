@@ -0,0 +1,11 @@
+from llm_client import json_with_keys
+
+
+def test_only_complete_json_with_keys_is_cached():
+    accept = json_with_keys("score", "feedback")
+    assert accept('Ответ: {"score": 80, "feedback": "ok"}')
+    assert accept('<think>{"черновик": 1}</think>{"score": 80, "feedback": "ok"}')
+    # Оборванный ответ частично разбирается, но в кэш не попадает
+    assert not accept('{"score": 80, "feedback": "недопис')
+    assert not accept('{"score": 80}')
+    assert not accept("нет JSON")
@@ -0,0 +1,51 @@
+import asyncio
+
+from llm_client import LLMClient, ResponseCache, RoutePolicy
+
+MESSAGES = [{"role": "user", "content": "q"}]
+
+
+def client_with_models(delays):
+    """Клиент без сети: модель отвечает своим именем через delays[model] секунд."""
+    client = LLMClient()
+    calls = []
+
+    async def upstream(model, messages, call_type, **params):
+        calls.append(model)
+        await asyncio.sleep(delays[model])
+        return f"answer from {model}"
+
+    client._chat_upstream = upstream
+    client.hedge_delay = lambda model, call_type, policy: 0.01
+    client.configure_routes({"chat": RoutePolicy(["fast"])})
+    return client, calls
+
+
+def test_hedged_answer_is_not_cached_under_primary_model():
+    async def scenario():
+        client, calls = client_with_models({"slow": 0.2, "fast": 0.0})
+        first = await client.chat_cached("slow", MESSAGES, "v1", "key")
+        client.hedge_delay = lambda model, call_type, policy: 1.0
+        second = await client.chat_cached("slow", MESSAGES, "v1", "key")
+        third = await client.chat_cached("slow", MESSAGES, "v1", "key")
+        await client.aclose()
+        return first, second, third, calls
+
+    first, second, third, calls = asyncio.run(scenario())
+    assert first == "answer from fast"
+    # Ответ запасной модели в кэш не попал: второй вызов снова идет в основную и уже кэшируется
+    assert second == third == "answer from slow"
+    assert calls == ["slow", "fast", "slow"]
+
+
+def test_response_cache_removes_expired_and_evicted_files(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("llm_client.time.time", lambda: now[0])
+    cache = ResponseCache(max_size=2, ttl=10, cache_dir=str(tmp_path))
+    for key in ("a", "b", "c"):
+        cache.put(key, key)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["b.json", "c.json"]
+
+    now[0] += 11
+    assert cache.get("b") is None
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["c.json"]
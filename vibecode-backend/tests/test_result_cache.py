@@ -0,0 +1,38 @@
+from result_cache import ResultCache, code_hash, is_stable_result
+
+TESTS = [{"input": "1", "expected": "1"}]
+
+
+def test_code_hash_ignores_comments_and_blank_lines():
+    plain = "def solve(a):\n    return a\n"
+    noisy = "# решение\ndef solve(a):\n\n        return a  # ответ\n"
+    assert code_hash(plain) == code_hash(noisy)
+    assert code_hash(plain) != code_hash("def solve(a):\n    return -a\n")
+
+
+def test_key_depends_on_mode_and_round_trips_to_disk(tmp_path):
+    cache = ResultCache(cache_dir=str(tmp_path))
+    key = ResultCache.make_key("x = 1", TESTS, "suite")
+    assert key != ResultCache.make_key("x = 1", TESTS, "parallel:False")
+
+    cache.put(key, {"status": "success", "tests": []})
+    assert ResultCache(cache_dir=str(tmp_path)).get(key) == {"status": "success", "tests": []}
+
+
+def test_limit_results_are_unstable():
+    assert is_stable_result({"tests": [{"status": "passed"}, {"status": "failed"}]})
+    assert not is_stable_result({"tests": [{"status": "passed"}, {"status": "time_limit"}]})
+    assert not is_stable_result({"traceback": "Time Limit Exceeded"}, {"Time Limit Exceeded"})
+
+
+def test_evicted_results_are_removed_from_disk(tmp_path):
+    cache = ResultCache(max_size=2, cache_dir=str(tmp_path))
+    for key in ("a", "b", "c"):
+        cache.put(key, {"status": "success", "key": key})
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["b.json", "c.json"]
+    assert cache.get("a") is None
+
+    # Файлы прошлого запуска тоже в LRU: новый кэш поменьше подрезает каталог
+    restarted = ResultCache(max_size=1, cache_dir=str(tmp_path))
+    assert [p.name for p in tmp_path.iterdir()] == ["c.json"]
+    assert restarted.get("c") == {"status": "success", "key": "c"}
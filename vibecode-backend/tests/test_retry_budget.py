@@ -0,0 +1,12 @@
+from llm_client import RetryBudget
+
+
+def test_requests_outside_window_are_dropped(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("llm_client.time.monotonic", lambda: now[0])
+    budget = RetryBudget(ratio=0.1, minimum=1, window=10)
+    for _ in range(1000):
+        budget.record_request()
+        now[0] += 1
+    # Ни одного ретрая, но в очереди только запросы последнего окна
+    assert len(budget._requests) <= 11
@@ -0,0 +1,67 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import interview_engine
+import api_server
+
+HANGING = "def solution(x):\n    while True:\n        pass\n"
+TASK = {
+    "title": "Hang",
+    "description": "",
+    "public_tests": [{"input": "1", "expected": "1"}],
+    "hidden_tests": [{"input": "2", "expected": "2"}, {"input": "3", "expected": "3"}],
+}
+
+
+@pytest.fixture(autouse=True)
+def short_time_limit(monkeypatch):
+    monkeypatch.setattr(interview_engine, "TIME_LIMIT_SECONDS", 1.0)
+
+
+def test_hanging_solution_fail_fast_reports_time_limit():
+    engine = interview_engine.InterviewEngine(sandbox_pool_size=0)
+    result = engine.run_tests_parallel(HANGING, TASK["public_tests"] + TASK["hidden_tests"], fail_fast=True)
+    assert result["passed"] == 0
+    assert result["tests"][0]["status"] == "time_limit"
+
+
+def test_submit_run_with_hanging_solution_fails_instead_of_500(monkeypatch):
+    monkeypatch.setattr(api_server, "engine", interview_engine.InterviewEngine(sandbox_pool_size=0))
+    resp = TestClient(api_server.app).post("/submit-run", json={"task": TASK, "code": HANGING})
+    assert resp.status_code == 200
+    assert resp.json()["status"] == "fail"
+
+
+def test_pooled_job_cannot_affect_next_candidate():
+    engine = interview_engine.InterviewEngine(sandbox_pool_size=1)
+    tests = [{"input": "1", "expected": "1"}]
+    try:
+        engine.run_code_safely("import builtins\nbuiltins.str = lambda x: 'same'\n"
+                               "def solution(x):\n    return x\n", tests)
+        result = engine.run_code_safely("def solution(x):\n    return 42\n", tests)
+        assert result["passed"] == 0
+        assert result["tests"][0]["status"] == "failed"
+    finally:
+        engine.sandbox_pool.shutdown()
+
+
+def test_pooled_hanging_job_does_not_block_the_pool():
+    engine = interview_engine.InterviewEngine(sandbox_pool_size=1)
+    try:
+        assert engine.run_code_safely(HANGING, TASK["public_tests"])["traceback"] == "Time Limit Exceeded"
+        assert engine.run_code_safely("def solution(x):\n    return x\n", TASK["public_tests"])["passed"] == 1
+    finally:
+        engine.sandbox_pool.shutdown()
+
+
+def test_cached_parallel_run_replays_test_logs():
+    engine = interview_engine.InterviewEngine(sandbox_pool_size=0)
+    tests = [{"input": "1", "expected": "1"}, {"input": "2", "expected": "3"}]
+    code = "def solution(x):\n    print(x)\n    return x\n"
+    live = list(engine.iter_tests_parallel(code, tests))
+    replayed = list(engine.iter_tests_parallel(code, tests))
+    assert replayed[-1]["result"]["cached"]
+    assert "replay" not in replayed[-1]["result"]
+    by_test = lambda events: sorted((e["test"], e["log"], e["output"]) for e in events if e["event"] == "test")
+    assert by_test(replayed) == by_test(live)
+    assert by_test(live)[1][1].startswith("❌ Test 2")
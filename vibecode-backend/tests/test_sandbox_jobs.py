@@ -0,0 +1,34 @@
+import asyncio
+import threading
+
+from backend import SandboxJobService
+
+
+def test_slot_is_held_until_stuck_runner_returns():
+    release = threading.Event()
+    closed = threading.Event()
+
+    def events():
+        try:
+            release.wait(5)
+            yield {"event": "test"}
+        finally:
+            closed.set()
+
+    async def scenario():
+        jobs = SandboxJobService(max_concurrency=1, queue_size=0, deadline=0.2)
+        got = [event async for event in jobs.stream(events())]
+        assert got[-1]["event"] == "error"
+        # Дедлайн истек, но поток песочницы еще внутри next(): слот занят, генератор открыт
+        assert jobs.stats()["running_or_queued"] == 1
+        assert not closed.is_set()
+
+        release.set()
+        for _ in range(100):
+            if jobs.stats()["running_or_queued"] == 0:
+                break
+            await asyncio.sleep(0.02)
+        assert jobs.stats()["running_or_queued"] == 0
+        assert closed.is_set()
+
+    asyncio.run(scenario())
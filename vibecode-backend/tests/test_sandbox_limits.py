@@ -0,0 +1,23 @@
+import os
+import signal
+
+import sandbox_limits
+from sandbox_limits import exit_code_status, TIME_LIMIT, MEMORY_LIMIT, CRASHED
+
+
+def test_exit_status_without_cgroup_comes_from_signal(monkeypatch, tmp_path):
+    monkeypatch.setattr(sandbox_limits, "SANDBOX_CGROUP_ROOT", str(tmp_path))
+    assert exit_code_status(-signal.SIGXCPU, 1) == TIME_LIMIT
+    assert exit_code_status(-signal.SIGKILL, 1) == MEMORY_LIMIT
+    assert exit_code_status(-signal.SIGSEGV, 1) == CRASHED
+
+
+def test_cgroup_oom_counter_decides_memory_limit(monkeypatch, tmp_path):
+    monkeypatch.setattr(sandbox_limits, "SANDBOX_CGROUP_ROOT", str(tmp_path))
+    for pid, oom_kills in ((1, 0), (2, 1)):
+        os.makedirs(tmp_path / f"sandbox-{pid}")
+        (tmp_path / f"sandbox-{pid}" / "memory.events").write_text(f"oom 0\noom_kill {oom_kills}\n")
+    # SIGKILL без OOM в cgroup — это не память
+    assert exit_code_status(-signal.SIGKILL, 1) == CRASHED
+    assert exit_code_status(-signal.SIGKILL, 2) == MEMORY_LIMIT
+    assert exit_code_status(-signal.SIGXCPU, 2) == TIME_LIMIT
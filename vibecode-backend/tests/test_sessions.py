@@ -0,0 +1,22 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import backend
+
+
+def test_session_store_is_abstract():
+    with pytest.raises(TypeError):
+        backend.SessionStore()
+
+
+def test_report_is_read_by_round_query_param(tmp_path, monkeypatch):
+    monkeypatch.setattr(backend, "report_log", backend.ReportLog(str(tmp_path / "reports.jsonl")))
+    client = TestClient(backend.app)
+    sid = client.post("/api/start", json={"level": "Junior", "topic": "Arrays"}).json()["session_id"]
+    sess = backend.get_session(sid)
+    backend.record_round(sid, sess, {"title": "Sum Array"}, 80, {"level_update": "Junior", "score": 80})
+
+    resp = client.get("/api/session/report", params={"session_id": sid, "round": 1})
+    assert resp.status_code == 200
+    assert resp.json()["score"] == 80
+    assert client.get("/api/session/report", params={"session_id": sid, "round": 2}).status_code == 404
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from stream_json import StreamingJSONExtractor, repair_json, parse_partial_json
+
+TASK = {
+    "title": "Скобки {и} [кавычки]",
+    "description": 'Строка "в кавычках", с \\ и запятыми, }',
+    "public_tests": [{"input": "[1, 2]", "expected": "3"}],
+    "score": 80,
+}
+
+
+def feed_all(chunks):
+    extractor = StreamingJSONExtractor()
+    events = []
+    for chunk in chunks:
+        events.extend(extractor.feed(chunk))
+    return extractor, events
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7])
+def test_fields_survive_any_chunking(size):
+    text = "Вот задача:\n```json\n" + json.dumps(TASK, ensure_ascii=False) + "\n```"
+    extractor, events = feed_all(text[i:i + size] for i in range(0, len(text), size))
+    assert extractor.done
+    assert events == list(TASK.items())
+    assert extractor.fields == TASK
+
+
+def test_field_is_emitted_as_soon_as_it_closes():
+    extractor = StreamingJSONExtractor()
+    assert extractor.feed('{"ti') == []
+    assert extractor.feed('tle": "a, \\"b\\"", "sc') == [("title", 'a, "b"')]
+    assert extractor.feed('ore": 5') == []
+    assert extractor.feed("}") == [("score", 5)]
+    # После закрывающей скобки хвост ответа игнорируется
+    assert extractor.feed(', "extra": 1}') == []
+
+
+def test_truncated_value_is_repaired():
+    extractor, _ = feed_all(['{"title": "T", "public_tests": [{"input": "1", "expected": "2"}, {"input": "3'])
+    assert not extractor.done
+    assert extractor.partial() == {"title": "T", "public_tests": [{"input": "1", "expected": "2"}]}
+
+
+def test_truncated_string_is_dropped():
+    # Недописанную строку не достраиваем: обрывок кода хуже, чем его отсутствие
+    assert parse_partial_json('{"title": "T", "reference_solution": "def solution(a):\\n    ret') == {"title": "T"}
+
+
+@pytest.mark.parametrize("fragment, expected", [
+    ('[1, 2, 3', [1, 2, 3]),
+    ('[1, 2, ', [1, 2]),
+    ('{"a": [1, {"b": 2}], "c": "x', {"a": [1, {"b": 2}]}),
+    ('{"a": "}]\\"", "b": [', {"a": '}]"', "b": []}),
+    ('"незакрытая', None),
+])
+def test_repair_json(fragment, expected):
+    assert repair_json(fragment) == expected
+
+
+def test_no_object_gives_empty_dict():
+    assert parse_partial_json("модель ответила текстом") == {}
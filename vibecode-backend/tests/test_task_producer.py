@@ -0,0 +1,103 @@
+import asyncio
+
+from task_bank import TaskBank
+from task_pool import TaskPool
+from task_producer import TaskProducer
+
+TASK = {
+    "title": "Sum Array",
+    "description": "Calculate sum of array elements.",
+    "initial_code": "def solution(arr): pass",
+    "reference_solution": "def solution(arr):\n    return sum(arr)",
+    "public_tests": [{"input": "[1, 2, 3]", "expected": "6"}],
+    "hidden_tests": [],
+}
+
+
+def stream_of(task):
+    async def generate_stream(level, topic):
+        yield {"event": "field", "key": "title", "value": "Sum Array"}
+        yield {"event": "field", "key": "reference_solution", "value": "..."}
+        yield {"event": "task", "task": task}
+    return generate_stream
+
+
+def test_stream_banks_fresh_task_and_falls_back_to_bank(tmp_path):
+    bank = TaskBank(str(tmp_path / "bank.sqlite3"))
+
+    async def scenario():
+        producer = TaskProducer(stream_of(dict(TASK)), bank)
+        events = [e async for e in producer.stream(TaskPool(producer.produce, depth=0), "Junior", "Arrays")]
+        # Эталон кандидату до сдачи не показываем
+        assert [e.get("key") for e in events[:-1]] == ["title"]
+        assert events[-1]["task"]["title"] == "Sum Array"
+
+        down = TaskProducer(stream_of(None), bank)
+        return await down.produce("Junior", "Arrays")
+
+    assert asyncio.run(scenario())["title"] == "Sum Array"
+
+
+def slow_stream_of(task, delay):
+    async def generate_stream(level, topic):
+        await asyncio.sleep(delay)
+        yield {"event": "task", "task": task}
+    return generate_stream
+
+
+def test_slow_llm_is_not_cut_off_when_bank_is_empty(tmp_path, monkeypatch):
+    monkeypatch.setattr("task_producer.TASK_BANK_LLM_TIMEOUT", 0.05)
+    bank = TaskBank(str(tmp_path / "bank.sqlite3"))
+    producer = TaskProducer(slow_stream_of(dict(TASK), 0.2), bank)
+    assert asyncio.run(producer.produce("Junior", "Arrays"))["title"] == "Sum Array"
+
+
+def test_slow_llm_falls_back_to_bank_and_banks_result_later(tmp_path, monkeypatch):
+    monkeypatch.setattr("task_producer.TASK_BANK_LLM_TIMEOUT", 0.05)
+    bank = TaskBank(str(tmp_path / "bank.sqlite3"))
+    bank.add("Junior", "Arrays", dict(TASK))
+    fresh = dict(TASK, title="Reverse String", description="Return the string reversed, character by character.")
+
+    async def scenario():
+        producer = TaskProducer(slow_stream_of(fresh, 0.2), bank)
+        task = await producer.produce("Junior", "Arrays")
+        assert task["title"] == "Sum Array"
+        await asyncio.gather(*producer._background)
+
+    asyncio.run(scenario())
+    assert bank.stats()["by_pair"]["Junior:Arrays"] == 2
+
+
+def test_repeat_of_task_banked_for_another_pair_is_still_served(tmp_path):
+    bank = TaskBank(str(tmp_path / "bank.sqlite3"))
+    bank.add("Junior", "Strings", dict(TASK))
+
+    async def scenario():
+        producer = TaskProducer(stream_of(dict(TASK)), bank)
+        # У пары Junior:Arrays в банке пусто: повтор нельзя отбросить, иначе выдавать нечего
+        produced = await producer.produce("Junior", "Arrays")
+        events = [e async for e in producer.stream(TaskPool(producer.produce, depth=0), "Junior", "Arrays")]
+        return produced, events[-1]["task"]
+
+    produced, streamed = asyncio.run(scenario())
+    assert produced["title"] == streamed["title"] == "Sum Array"
+    assert bank.stats()["by_pair"] == {"Junior:Strings": 1}
+
+
+def test_task_with_unparsable_or_wrong_tests_is_rejected(tmp_path):
+    bank = TaskBank(str(tmp_path / "bank.sqlite3"))
+    expression = dict(TASK, hidden_tests=[{"input": "[10**9, 1]", "expected": "1000000001"}])
+    wrong = dict(TASK, hidden_tests=[{"input": "[1, 1]", "expected": "3"}])
+
+    def run_tests(code, tests):
+        namespace = {}
+        exec(code, namespace)
+        passed = sum(namespace["solution"](*eval(f"({t['input']},)")) == eval(t["expected"]) for t in tests)
+        return {"passed": passed, "total": len(tests)}
+
+    async def scenario():
+        producer = TaskProducer(stream_of(None), bank, run_tests=run_tests)
+        return [await producer.finalize("Junior", "Arrays", task) for task in (expression, wrong, dict(TASK))]
+
+    assert [task and task["title"] for task in asyncio.run(scenario())] == [None, None, "Sum Array"]
+    assert bank.stats()["tasks"] == 1
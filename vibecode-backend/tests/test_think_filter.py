@@ -0,0 +1,46 @@
+import pytest
+
+from llm_client import ThinkFilter
+
+TEXT = "<think>план: сначала <b>, потом x < y</think>\n\nОтвет: a < b и <thin>k</thin>"
+VISIBLE = "Ответ: a < b и <thin>k</thin>"
+
+
+def run(chunks):
+    f = ThinkFilter()
+    out = [f.feed(chunk) for chunk in chunks]
+    return "".join(out) + f.flush(), out
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, len(TEXT)])
+def test_tags_split_across_chunks_are_removed(size):
+    text, _ = run(TEXT[i:i + size] for i in range(0, len(TEXT), size))
+    assert text == VISIBLE
+
+
+def test_partial_open_tag_is_held_back_until_resolved():
+    f = ThinkFilter()
+    assert f.feed("Итог <thi") == "Итог "
+    # Не тег: придержанный хвост уходит вместе со следующим чанком
+    assert f.feed("s>") == "<this>"
+    assert f.feed("<th") == ""
+    assert f.feed("ink>скрыто</thi") == ""
+    assert f.feed("nk> конец") == " конец"
+
+
+def test_several_think_blocks():
+    text, _ = run(["<think>a</think>Раз <think>b</think>два"])
+    assert text == "Раз два"
+
+
+def test_unclosed_think_stays_hidden():
+    text, out = run(["<think>рассуждения", " без конца </thi"])
+    assert text == ""
+    assert out == ["", ""]
+
+
+def test_text_without_tags_passes_through():
+    text, out = run(["  def f():", "\n    return 1 < 2"])
+    assert text == "def f():\n    return 1 < 2"
+    # Ведущие пробелы срезаются только до первого видимого символа
+    assert out[1].startswith("\n    ")
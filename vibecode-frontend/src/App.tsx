@@ -3,9 +3,9 @@ import { InterviewLayout } from './components/layout/InterviewLayout';
 import { MonacoCodeEditor } from './features/editor/MonacoCodeEditor';
 import { ChatPanel, type ChatMessage } from './features/chat/ChatPanel';
 import { useAntiCheat } from './features/antiCheat/useAntiCheat';
-import { startSession, getNextTask } from './api/sessionApi';
-import { runCode } from './api/runCodeApi';
-import { getHelp } from './api/helpApi';
+import { startSession, getNextTaskStream } from './api/sessionApi';
+import { runCodeStream } from './api/runCodeApi';
+import { getHelpStream } from './api/helpApi';
 import { apiClient } from './api/client';
 
 type Stage = 'coding' | 'complexity' | 'explanation' | 'ai_detector' | 'similarity' | 'interview' | 'done';
@@ -36,7 +36,13 @@ const App: React.FC = () => {
     const isInitialized = useRef(false);
 
     const addMsg = (sender: 'ai' | 'user', text: string) => {
-        setChatMessages(prev => [...prev, { id: `${Date.now()}-${Math.random()}`, sender, text }]);
+        const id = `${Date.now()}-${Math.random()}`;
+        setChatMessages(prev => [...prev, { id, sender, text }]);
+        return id;
+    };
+
+    const appendToMsg = (id: string, text: string) => {
+        setChatMessages(prev => prev.map(m => (m.id === id ? { ...m, text: m.text + text } : m)));
     };
 
     useEffect(() => {
@@ -59,7 +65,16 @@ const App: React.FC = () => {
     const loadTask = async (sid: string) => {
         addMsg('ai', '📝 Генерирую задачу...');
         try {
-            const task = await getNextTask(sid);
+            // Условие показываем, как только модель его дописала; тесты и эталон догенерируются следом
+            const preview: Record<string, any> = {};
+            let shownTitle = '';
+            const task = await getNextTaskStream(sid, (key, value) => {
+                preview[key] = value;
+                if (!shownTitle && preview.title && preview.description) {
+                    shownTitle = preview.title;
+                    addMsg('ai', `**Задача: ${preview.title}**\n\n${preview.description}`);
+                }
+            });
             setCurrentTask(task);
             setCode(task.initial_code || '');
             setConsoleText('> Новая задача загружена.\n');
@@ -67,24 +82,36 @@ const App: React.FC = () => {
             setAttempts(0);
             setValidCode('');
 
-            addMsg('ai', `**Задача: ${task.title}**\n\n${task.description}`);
+            if (task.title !== shownTitle) addMsg('ai', `**Задача: ${task.title}**\n\n${task.description}`);
             addMsg('ai', '💡 Напиши код и нажми **Start** для проверки Public тестов.\n💡 Подсказка: напиши **HELP** + вопрос для помощи.');
         } catch (e) {
             addMsg('ai', 'Не удалось загрузить задачу.');
         }
     };
 
+    // Логи тестов выводятся по мере завершения, долгий прогон не упирается в таймаут axios
+    const runTestsLive = async (type: 'public' | 'hidden', header: string) => {
+        let text = header;
+        setConsoleText(text);
+        const res = await runCodeStream({ session_id: sessionId!, code, type }, (event) => {
+            if (event.event === 'test' && event.log) {
+                text += event.log + '\n';
+                setConsoleText(text);
+            }
+        });
+        if (!res) throw new Error('Поток запуска оборвался');
+        setConsoleText(res.logs.join('\n') + `\n\nПройдено: ${res.passed}/${res.total}`);
+        return res;
+    };
+
     // КНОПКА START (Public тесты)
     const handleStartClick = async () => {
         if (!sessionId || !currentTask || stage !== 'coding') return;
 
-        setConsoleText('> 🧪 Запуск открытых тестов...\n');
         setAttempts(prev => prev + 1);
 
         try {
-            const res = await runCode({ session_id: sessionId, code, type: 'public' });
-            const logs = res.logs.join('\n');
-            setConsoleText(logs + `\n\nПройдено: ${res.passed}/${res.total}`);
+            const res = await runTestsLive('public', '> 🧪 Запуск открытых тестов...\n');
 
             if (res.passed === res.total) {
                 addMsg('ai', '🔓 Открытые тесты пройдены! Запускаю скрытые тесты...');
@@ -115,11 +142,12 @@ const App: React.FC = () => {
                 return;
             }
             if (upper.startsWith('HELP')) {
+                // Подсказка печатается по мере генерации, а не после полного ответа
+                const msgId = addMsg('ai', '');
                 try {
-                    const { hint } = await getHelp({ session_id: sessionId!, question: text });
-                    addMsg('ai', hint);
+                    await getHelpStream({ session_id: sessionId!, question: text }, (token) => appendToMsg(msgId, token));
                 } catch {
-                    addMsg('ai', 'AI не ответил (таймаут).');
+                    appendToMsg(msgId, 'AI не ответил (таймаут).');
                 }
                 return;
             }
@@ -130,7 +158,7 @@ const App: React.FC = () => {
         // ЭТАП 2: COMPLEXITY
         if (stage === 'complexity') {
             try {
-                const res = await apiClient.post('/complexity/check', { code: validCode, user_estimate: text });
+                const res = await apiClient.post('/complexity/check', { session_id: sessionId, code: validCode, user_estimate: text });
                 if (res.data.is_correct) {
                     addMsg('ai', `✅ Верно! Сложность: ${res.data.real_complexity}`);
                     setComplexityOk(true);
@@ -200,12 +228,8 @@ const App: React.FC = () => {
     };
 
     const runHiddenTests = async () => {
-        setConsoleText('> 🔓 Запуск скрытых тестов...\n');
-
         try {
-            const res = await runCode({ session_id: sessionId!, code, type: 'hidden' });
-            const logs = res.logs.join('\n');
-            setConsoleText(logs + `\n\nПройдено: ${res.passed}/${res.total}`);
+            const res = await runTestsLive('hidden', '> 🔓 Запуск скрытых тестов...\n');
 
             const ratio = res.total > 0 ? res.passed / res.total : 1.0;
             setTestRatio(ratio);
@@ -7,3 +7,26 @@ export const apiClient = axios.create({
         'Content-Type': 'application/json',
     },
 });
+
+// Читает ответ Server-Sent Events: onEvent получает JSON из строки data: каждого события
+export async function readSse<T>(res: Response, onEvent: (event: T) => void): Promise<void> {
+    if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    for (;;) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let sep;
+        while ((sep = buffer.indexOf('\n\n')) !== -1) {
+            const chunk = buffer.slice(0, sep);
+            buffer = buffer.slice(sep + 2);
+            const data = chunk.split('\n').find((line) => line.startsWith('data: '));
+            if (data) onEvent(JSON.parse(data.slice(6)) as T);
+        }
+    }
+}
@@ -1,4 +1,4 @@
-import { apiClient } from './client';
+import { apiClient, readSse } from './client';
 
 export type HelpRequest = {
     session_id: string;
@@ -9,3 +9,26 @@ export async function getHelp(req: HelpRequest): Promise<{ hint: string }> {
     const res = await apiClient.post('/help', req);
     return res.data;
 }
+
+export type HelpStreamEvent =
+    | { event: 'token'; text: string }
+    | { event: 'done'; hint: string };
+
+// Потоковая подсказка: onToken получает видимый текст по мере генерации
+export async function getHelpStream(req: HelpRequest, onToken: (text: string) => void): Promise<string> {
+    const res = await fetch(`${apiClient.defaults.baseURL}/help/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(req),
+    });
+    let hint = '';
+    await readSse<HelpStreamEvent>(res, (event) => {
+        if (event.event === 'token') {
+            hint += event.text;
+            onToken(event.text);
+        } else {
+            hint = event.hint;
+        }
+    });
+    return hint;
+}
@@ -1,4 +1,4 @@
-import { apiClient } from './client';
+import { apiClient, readSse } from './client';
 
 export type RunCodeRequest = {
     session_id: string;
@@ -17,3 +17,27 @@ export async function runCode(req: RunCodeRequest): Promise<RunCodeResponse> {
     const res = await apiClient.post<RunCodeResponse>('/code/run', req);
     return res.data;
 }
+
+export type RunCodeStreamEvent =
+    | { event: 'test'; test: number; status: string; log?: string | null; wall_ms?: number; diff?: { expected: string; actual: string } }
+    | { event: 'summary'; result: RunCodeResponse }
+    | { event: 'error'; message: string };
+
+// Потоковый запуск: onEvent вызывается на каждый завершенный тест, без таймаута axios
+export async function runCodeStream(
+    req: RunCodeRequest,
+    onEvent: (event: RunCodeStreamEvent) => void,
+): Promise<RunCodeResponse | null> {
+    const res = await fetch(`${apiClient.defaults.baseURL}/code/run/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(req),
+    });
+    let summary: RunCodeResponse | null = null;
+    await readSse<RunCodeStreamEvent>(res, (event) => {
+        if (event.event === 'error') throw new Error(event.message);
+        if (event.event === 'summary') summary = event.result;
+        onEvent(event);
+    });
+    return summary;
+}
@@ -1,4 +1,4 @@
-import { apiClient } from './client';
+import { apiClient, readSse } from './client';
 
 export type StartSessionRequest = {
     level: string;
@@ -19,3 +19,21 @@ export async function getNextTask(sessionId: string) {
     const res = await apiClient.get(`/task/next?session_id=${sessionId}`);
     return res.data;
 }
+
+export type TaskStreamEvent =
+    | { event: 'field'; key: string; value: any }
+    | { event: 'task'; task: any }
+    | { event: 'error'; message: string };
+
+// Потоковая выдача задачи: onField получает поля превью (title, description...) по мере генерации
+export async function getNextTaskStream(sessionId: string, onField: (key: string, value: any) => void) {
+    const res = await fetch(`${apiClient.defaults.baseURL}/task/next/stream?session_id=${sessionId}`);
+    let task: any = null;
+    await readSse<TaskStreamEvent>(res, (event) => {
+        if (event.event === 'field') onField(event.key, event.value);
+        else if (event.event === 'task') task = event.task;
+        else throw new Error(event.message);
+    });
+    if (task) return task;
+    throw new Error('Поток задачи оборвался');
+}